@@ -0,0 +1,155 @@
+"""Minimal HTTP/1.1 server on asyncio streams, for the bot's own endpoints.
+
+Runs on the bot's event loop (no thread, no WSGI stack), so handlers read
+live in-memory state directly. Only what the health / status / metrics
+endpoints need:
+
+  - GET and HEAD; other methods get 405
+  - exact routes ("/health") and prefix routes ("/api/flow/" matches
+    "/api/flow/<rest>", the rest is passed as req.tail)
+  - keep-alive (HTTP/1.1 default, "Connection: close" honoured), an idle
+    timeout and a cap on the request head size
+  - handlers are plain or async functions returning (status, body) or
+    (status, body, content_type); dict / list bodies are sent as JSON
+
+Request bodies are read and ignored; a bad Content-Length gets 400 and one
+over MAX_HEAD gets 413, both closing the connection.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, unquote, urlsplit
+import asyncio
+import inspect
+import logging
+
+from jsoncodec import json_dumps
+
+log = logging.getLogger("spyton.web")
+
+MAX_HEAD = 16 * 1024
+IDLE_TIMEOUT = 15.0
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+Handler = Callable[["Request"], Union[Tuple, Awaitable[Tuple]]]
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "tail")
+
+    def __init__(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str]):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.tail = ""
+
+
+class WebApp:
+    def __init__(self):
+        self._exact: Dict[str, Handler] = {}
+        self._prefix: List[Tuple[str, Handler]] = []
+        self.requests = 0
+
+    def get(self, path: str):
+        """Register a GET / HEAD handler; a path ending in "/" followed by "*" is a prefix route."""
+        def deco(fn: Handler) -> Handler:
+            if path.endswith("/*"):
+                self._prefix.append((path[:-1], fn))
+            else:
+                self._exact[path] = fn
+            return fn
+        return deco
+
+    def _route(self, req: Request) -> Optional[Handler]:
+        fn = self._exact.get(req.path)
+        if fn is not None:
+            return fn
+        for prefix, fn in self._prefix:
+            if req.path.startswith(prefix) and len(req.path) > len(prefix):
+                req.tail = req.path[len(prefix):]
+                return fn
+        return None
+
+    async def _dispatch(self, req: Request) -> Tuple[int, bytes, str]:
+        if req.method not in ("GET", "HEAD"):
+            return 405, b"method not allowed", "text/plain; charset=utf-8"
+        fn = self._route(req)
+        if fn is None:
+            return 404, b"not found", "text/plain; charset=utf-8"
+        try:
+            out = fn(req)
+            if inspect.isawaitable(out):
+                out = await out
+        except Exception as e:
+            log.exception("web handler %s failed: %s", req.path, e)
+            return 500, b"internal error", "text/plain; charset=utf-8"
+        status, body = out[0], out[1]
+        ctype = out[2] if len(out) > 2 else None
+        if isinstance(body, (dict, list)):
+            return status, json_dumps(body, default=str), ctype or "application/json"
+        if isinstance(body, str):
+            return status, body.encode("utf-8"), ctype or "text/plain; charset=utf-8"
+        return status, bytes(body or b""), ctype or "application/octet-stream"
+
+    async def _conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                parts = lines[0].split(" ")
+                if len(parts) != 3:
+                    writer.write(_response(400, b"bad request", "text/plain; charset=utf-8", False))
+                    return
+                method, target, version = parts
+                headers = {}
+                for line in lines[1:]:
+                    k, sep, v = line.partition(":")
+                    if sep:
+                        headers[k.strip().lower()] = v.strip()
+                try:
+                    n = int(headers.get("content-length") or 0)
+                except ValueError:
+                    n = -1
+                if n < 0 or n > MAX_HEAD:
+                    status = 400 if n < 0 else 413
+                    writer.write(_response(status, _REASONS[status].lower().encode(), "text/plain; charset=utf-8", False))
+                    return
+                if n:
+                    try:
+                        await asyncio.wait_for(reader.readexactly(n), IDLE_TIMEOUT)
+                    except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                        return
+
+                url = urlsplit(target)
+                req = Request(method.upper(), unquote(url.path), dict(parse_qsl(url.query)), headers)
+                self.requests += 1
+                status, body, ctype = await self._dispatch(req)
+
+                conn = headers.get("connection", "").lower()
+                keep = conn == "keep-alive" if version == "HTTP/1.0" else conn != "close"
+                writer.write(_response(status, b"" if req.method == "HEAD" else body, ctype, keep, len(body)))
+                await writer.drain()
+                if not keep:
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._conn, host, port, limit=MAX_HEAD)
+
+
+def _response(status: int, body: bytes, ctype: str, keep: bool, length: Optional[int] = None) -> bytes:
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+        f"Content-Type: {ctype}\r\n"
+        f"Content-Length: {len(body) if length is None else length}\r\n"
+        f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
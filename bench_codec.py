@@ -0,0 +1,136 @@
+"""Before / after benchmark for the JSON codec layer (jsoncodec.py).
+
+"before" is what the bot did until the codec layer: `requests.Response.json()`
+for upstream bodies and `json.dumps(..., ensure_ascii=False, indent=2)` /
+`json.load` for data.json and state.json. "after" is jsoncodec with the
+active backend (orjson if installed, else stdlib): `response_json(res)`,
+indented data.json and compact state.json, `json_loads` on bytes.
+
+Documents:
+  data.json / state.json    the files in the working directory, as they are
+  data.json @N              N tracked pairs, each with --buyers buyer entries
+  state.json @N             per-pool cursors for N pools + --seen dedust hashes
+  tonapi page / ston events / dex tokens
+                            upstream bodies from upstream_sim.Market
+
+Reported: size before / after (bytes), encode and decode time (best of
+--repeat, ms) and the decode+encode speedup.
+
+Usage:
+  python bench_codec.py [--pools 1000,10000] [--buyers 50] [--seen 5000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import requests
+
+from jsoncodec import BACKEND, json_dumps, json_dumps_pretty, json_loads, response_json
+from upstream_sim import Market
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def _data_doc(m: Market, buyers: int):
+    doc = m.data_json()
+    now = int(time.time())
+    for i, rec in enumerate(doc["pairs"].values()):
+        rec["buyers"] = {m.buyers[(i + j) % len(m.buyers)]: now - j for j in range(buyers)}
+        rec["last_buy_ts"] = now
+    return doc
+
+
+def _state_doc(m: Market, seen: int):
+    lts = {p: m.newest_lt(p) for p in m.pools}
+    return {
+        "leaderboard_msg_id": 1234,
+        "ston_last_block": m.block,
+        "ston_last_lt_map": {p: lt for p, lt in lts.items() if m.pools[p] == "stonfi"},
+        "dedust_last_lt": {p: lt for p, lt in lts.items() if m.pools[p] == "dedust"},
+        "dedust_last_id": {},
+        "dedust_last_ts": {p: int(time.time()) for p in m.pools if m.pools[p] == "dedust"},
+        "dedust_seen": {f"{i:064x}": int(time.time()) for i in range(seen)},
+        "blum_last_lt": {},
+    }
+
+
+def _response(body) -> requests.Response:
+    res = requests.Response()
+    res.status_code = 200
+    res._content = json.dumps(body).encode()
+    res.headers["Content-Type"] = "application/json"
+    return res
+
+
+def _row(name, obj, repeat, pretty):
+    before = json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    after = json_dumps_pretty(obj) if pretty else json_dumps(obj)
+    enc_b = _best(lambda: json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8"), repeat)
+    enc_a = _best(lambda: json_dumps_pretty(obj) if pretty else json_dumps(obj), repeat)
+    dec_b = _best(lambda: json.loads(before.decode("utf-8")), repeat)
+    dec_a = _best(lambda: json_loads(after), repeat)
+    return name, len(before), len(after), enc_b, enc_a, dec_b, dec_a
+
+
+def _http_row(name, body, repeat):
+    res = _response(body)
+    raw = res.content
+    dec_b = _best(lambda: res.json(), repeat)
+    dec_a = _best(lambda: response_json(res), repeat)
+    return name, len(raw), len(raw), None, None, dec_b, dec_a
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--pools", default="1000,10000")
+    ap.add_argument("--buyers", type=int, default=50, help="buyer entries per pair in data.json")
+    ap.add_argument("--seen", type=int, default=5000, help="dedust_seen entries in state.json")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rows = []
+    for path, pretty in (("data.json", True), ("state.json", False)):
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                rows.append(_row(path, json.loads(f.read()), args.repeat, pretty))
+    for n in [int(x) for x in args.pools.split(",") if x.strip()]:
+        m = Market(n)
+        rows.append(_row(f"data.json @{n}", _data_doc(m, args.buyers), args.repeat, True))
+        rows.append(_row(f"state.json @{n}", _state_doc(m, args.seen), args.repeat, False))
+
+    m = Market(200)
+    for p in list(m.pools)[:1]:
+        for _ in range(100):
+            m.trade(p)
+    pool = list(m.pools)[0]
+    rows.append(_http_row("tonapi page", m.route(f"/v2/blockchain/accounts/{pool}/transactions", {"limit": 100})[1],
+                          args.repeat * 20))
+    for p in list(m.pools)[100:]:
+        for _ in range(5):
+            m.trade(p)
+    rows.append(_http_row("ston events", m.route("/export/dexscreener/v1/events",
+                                                 {"fromBlock": m.block - 1, "toBlock": m.block})[1], args.repeat * 20))
+    toks = ",".join(list(m.tokens.values())[:30])
+    rows.append(_http_row("dex tokens", m.route(f"/latest/dex/tokens/{toks}", {})[1], args.repeat * 20))
+
+    print(f"backend: {BACKEND}   (before = stdlib json / requests .json())")
+    print(f"{'document':<18}{'bytes':>11}{'-> after':>11}{'enc ms':>9}{'-> after':>9}"
+          f"{'dec ms':>9}{'-> after':>9}{'speedup':>9}")
+    for name, sb, sa, eb, ea, db, da in rows:
+        total_b = (eb or 0.0) + db
+        total_a = (ea or 0.0) + da
+        enc = f"{eb:>9.3f}{ea:>9.3f}" if eb is not None else f"{'—':>9}{'—':>9}"
+        print(f"{name:<18}{sb:>11}{sa:>11}{enc}{db:>9.3f}{da:>9.3f}{total_b / max(total_a, 1e-9):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Event-loop blocking benchmark for DeDust polling.
+
+Runs one DeDust poll over N synthetic pools with a fake TonAPI that blocks for
+a fixed latency (like `requests.get` does), and measures how long the event
+loop was stalled while the poll ran.
+
+  legacy     - the old pattern: sync TonAPI call per pool inside the coroutine
+  concurrent - the current `dedust_tracker_job` (worker threads + semaphore)
+
+No network is used. Usage:
+  python bench_dedust_loop.py [pools] [latency_ms]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import main
+
+HEARTBEAT = 0.005  # seconds
+
+
+def fake_account_transactions(address: str, limit: int = 10):
+    time.sleep(LATENCY)
+    return [{"hash": f"{address}-h", "lt": int(time.time() * 1000), "actions": []}]
+
+
+async def _heartbeat(stop: asyncio.Event, stalls: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(HEARTBEAT)
+        stalls.append(max(0.0, loop.time() - t0 - HEARTBEAT))
+
+
+async def _legacy_poll(pools):
+    for pool in pools:
+        main.tonapi_account_transactions(pool, limit=main.DEDUST_POLL_LIMIT)
+
+
+async def _measure(name: str, coro_fn):
+    stalls: list = []
+    stop = asyncio.Event()
+    hb = asyncio.create_task(_heartbeat(stop, stalls))
+    await asyncio.sleep(HEARTBEAT * 2)
+    t0 = time.perf_counter()
+    await coro_fn()
+    wall = time.perf_counter() - t0
+    stop.set()
+    await hb
+    print(
+        f"{name:<11} wall={wall * 1000:8.1f} ms  "
+        f"loop blocked total={sum(stalls) * 1000:8.1f} ms  max={max(stalls or [0]) * 1000:7.1f} ms"
+    )
+
+
+async def _run(pools):
+    class _Ctx:
+        bot = None
+
+    await _measure("legacy", lambda: _legacy_poll(pools))
+    await _measure("concurrent", lambda: main.dedust_tracker_job(_Ctx()))
+
+
+if __name__ == "__main__":
+    n_pools = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    LATENCY = (float(sys.argv[2]) if len(sys.argv) > 2 else 80.0) / 1000.0
+
+    main.STATE_FILE = os.path.join(tempfile.mkdtemp(), "state.json")
+    main.tonapi_account_transactions = fake_account_transactions
+    pools = [f"EQpool{i:04d}" for i in range(n_pools)]
+    main.DATA = {"pairs": {p: {"dex": "dedust", "symbol": "BENCH"} for p in pools}, "watch": {}}
+
+    print(f"pools={n_pools} latency={LATENCY * 1000:.0f} ms concurrency={main.DEDUST_CONCURRENCY}")
+    asyncio.run(_run(pools))
@@ -0,0 +1,186 @@
+"""Posting-path benchmark against the local fake Bot API (fake_telegram.py).
+
+Starts FakeTelegramServer in-process, builds a real PTB Bot pointed at it
+via base_url, configures 1 master channel + N group mirrors for one token
+and calls main.post_buy_message for a few buys. Every request goes through
+PTB's HTTPXRequest over loopback, so the numbers include JSON encoding,
+keyboard serialization, the HTTP client and the server's flood control.
+Upstream HTTP (enrichment) is answered with an instant 404; no network.
+
+Reported per run:
+  targets       buys x (1 + groups)
+  delivered     sends that returned a message
+  dropped       targets - delivered (429s are not retried by the posting path)
+  drop %        dropped / targets
+  sends/s       delivered / wall time of post_buy_message (send loop only)
+  p50 / p99     client-side latency per send call, ms
+  429           RetryAfter answers seen by the bot (main.M_TG_RETRY_AFTER)
+  edits ok/429  enrichment edits (FAST_POST_MODE)
+
+Usage:
+  python bench_dispatch.py [--groups 5000] [--buys 3] [--global-rate 30]
+                           [--group-per-min 20] [--latency-ms 0] [--pool 8]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+_TMP = tempfile.mkdtemp(prefix="spyton-dispatch-")
+os.environ["TRADES_DIR"] = os.path.join(_TMP, "trades")
+os.environ["CANDLES_DIR"] = os.path.join(_TMP, "candles")
+os.environ["HEADER_IMAGE_PATH"] = ""
+
+from telegram import Bot  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+
+import main  # noqa: E402
+from fake_telegram import FakeTelegram, FakeTelegramServer  # noqa: E402
+
+TOKEN = "EQBench000000000000000000000000000000000000000000"
+PAIR = "EQBenchPair0000000000000000000000000000000000000"
+BOT_TOKEN = "123456:bench"
+
+
+class _Miss:
+    status_code = 404
+    content = b"{}"
+    text = "{}"
+
+    def json(self):
+        return {}
+
+
+class TimedBot:
+    """Proxy over a PTB Bot that records per-call latency of sends."""
+
+    def __init__(self, bot: Bot):
+        self._bot = bot
+        self.send_ms = []
+
+    async def send_message(self, **kw):
+        t0 = time.perf_counter()
+        try:
+            return await self._bot.send_message(**kw)
+        finally:
+            self.send_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    async def send_photo(self, **kw):
+        t0 = time.perf_counter()
+        try:
+            return await self._bot.send_photo(**kw)
+        finally:
+            self.send_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    def __getattr__(self, name):
+        return getattr(self._bot, name)
+
+
+class FakeContext:
+    def __init__(self, bot):
+        self.bot = bot
+
+
+def _setup_data(groups: int):
+    main.DATA = {
+        "pairs": {PAIR: {"dex": "stonfi", "symbol": "BNCH", "token_address": TOKEN, "token": TOKEN}},
+        "watch": {},
+        "forced_ranks": {},
+        "group_mirrors": {},
+    }
+    # per-group defaults as /settings would have left them
+    template = dict(main._ensure_group_cfg(0, reload=False))
+    template.update({"symbol": "BNCH", "token_address": TOKEN, "pair_id": PAIR, "dex": "stonfi"})
+    main.DATA["group_mirrors"] = {str(-1001000000000 - i): dict(template) for i in range(groups)}
+    main.save_data()
+
+
+async def _drain():
+    me = asyncio.current_task()
+    pending = [t for t in asyncio.all_tasks() if t is not me]
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _pct(vals, p):
+    if not vals:
+        return float("nan")
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(p / 100.0 * (len(vals) - 1))))]
+
+
+async def _main(args):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    main.DATA_FILE = os.path.join(_TMP, "data.json")
+    main.STATE_FILE = os.path.join(_TMP, "state.json")
+    main.FAST_POST_MODE = True
+    main.FAST_HOLDERS_ENABLED = False
+    main.requests.get = lambda *a, **k: _Miss()
+    main._TON_PRICE_CACHE["v"] = 5.0
+    main._TON_PRICE_CACHE["ts"] = time.time()
+
+    fake = FakeTelegram(args.global_rate, args.group_per_min, args.private_rate, args.latency_ms)
+    srv = FakeTelegramServer(("127.0.0.1", 0), fake)
+    srv.start()
+
+    t0 = time.perf_counter()
+    _setup_data(args.groups)
+    setup_s = time.perf_counter() - t0
+
+    req = HTTPXRequest(connection_pool_size=args.pool)
+    bot = TimedBot(Bot(BOT_TOKEN, base_url=srv.base_url, request=req))
+    await bot.initialize()
+    ctx = FakeContext(bot)
+
+    print(f"fake Bot API {srv.base_url}  groups={args.groups} buys={args.buys} "
+          f"limits: {args.global_rate:g}/s global, {args.group_per_min:g}/min per group  "
+          f"(setup {setup_s:.1f}s)")
+
+    retry0 = sum(main.M_TG_RETRY_AFTER.values.values())
+    wall = 0.0
+    for i in range(args.buys):
+        t0 = time.perf_counter()
+        await main.post_buy_message(
+            ctx, "BNCH", TOKEN, PAIR, f"EQBuyer{i:04d}", f"benchtx{i}",
+            12.5, 1000.0, "New Holder", source_label="DEX",
+        )
+        wall += time.perf_counter() - t0
+        await _drain()
+        if args.gap:
+            await asyncio.sleep(args.gap)
+
+    st = fake.stats()["methods"]
+    sends_ok = st.get("sendMessage", {}).get("ok", 0) + st.get("sendPhoto", {}).get("ok", 0)
+    sends_429 = st.get("sendMessage", {}).get("429", 0) + st.get("sendPhoto", {}).get("429", 0)
+    edits_ok = st.get("editMessageText", {}).get("ok", 0) + st.get("editMessageCaption", {}).get("ok", 0)
+    edits_429 = st.get("editMessageText", {}).get("429", 0) + st.get("editMessageCaption", {}).get("429", 0)
+    targets = args.buys * (1 + args.groups)
+    dropped = targets - sends_ok
+    retries = sum(main.M_TG_RETRY_AFTER.values.values()) - retry0
+
+    print(f"{'targets':>9}{'deliv':>8}{'dropped':>9}{'drop %':>8}{'wall s':>8}{'sends/s':>9}"
+          f"{'p50 ms':>8}{'p99 ms':>8}{'429':>7}{'edit ok':>9}{'edit 429':>9}")
+    print(f"{targets:>9}{sends_ok:>8}{dropped:>9}{100.0 * dropped / max(1, targets):>8.1f}{wall:>8.2f}"
+          f"{sends_ok / wall if wall else 0.0:>9.1f}{_pct(bot.send_ms, 50):>8.2f}{_pct(bot.send_ms, 99):>8.2f}"
+          f"{retries:>7.0f}{edits_ok:>9}{edits_429:>9}")
+    if sends_429 + edits_429 and not retries:
+        print("note: server answered 429 but the bot counted no RetryAfter")
+
+    await bot.shutdown()
+    srv.shutdown()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--groups", type=int, default=5000)
+    ap.add_argument("--buys", type=int, default=3)
+    ap.add_argument("--gap", type=float, default=0.0, help="seconds to wait between buys")
+    ap.add_argument("--global-rate", type=float, default=30.0)
+    ap.add_argument("--group-per-min", type=float, default=20.0)
+    ap.add_argument("--private-rate", type=float, default=1.0)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="fake server delay per call")
+    ap.add_argument("--pool", type=int, default=8, help="HTTPXRequest connection pool size")
+    asyncio.run(_main(ap.parse_args()))
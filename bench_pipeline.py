@@ -0,0 +1,264 @@
+"""Offline replay benchmark for the full buy pipeline.
+
+Serves upstream payloads (TonAPI account transaction pages + jetton info,
+STON export latest-block / events, DexScreener pairs / tokens, TON price)
+from an in-process upstream_sim.Market through the real HTTP layer
+(`main.http_get` -> `requests.get` is swapped for a fake), then runs the
+real trackers end to end:
+
+  fetch -> parse -> dedupe -> post_buy_message (_compose + send) -> enrich/edit
+
+with a fake `context.bot` that records sends/edits instantly. No network.
+The outbox is switched off, so trackers deliver inline and the timed tick
+includes the sends.
+
+Every tracked pool gets a history; each tick a fraction of pools trade
+(`--active`), and one tracker tick is timed. Cursors are primed and one
+warm-up tick runs before measuring, so the numbers are steady state.
+
+Reported per tracker and pool count:
+  buys/s        buys posted / wall time of the measured ticks
+  p50 / p99     per-buy latency fetch -> first send ack (from the 034 traces)
+  KiB/buy       tracemalloc peak during one extra tick / buys   (--alloc)
+  blocks/buy    net allocated blocks retained per buy           (--alloc)
+
+Usage:
+  python bench_pipeline.py [--pools 10,1000,10000] [--ticks 3] [--active 0.02]
+                           [--jobs ston_fast,dedust,ston_export] [--alloc]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+_TMP = tempfile.mkdtemp(prefix="spyton-bench-")
+os.environ.setdefault("TONAPI_KEY", "bench")
+os.environ["TRADES_DIR"] = os.path.join(_TMP, "trades")
+os.environ["CANDLES_DIR"] = os.path.join(_TMP, "candles")
+os.environ["HEADER_IMAGE_PATH"] = ""
+
+import main  # noqa: E402
+from upstream_sim import Market  # noqa: E402
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: bytes):
+        self.status_code = status_code
+        self.content = body
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class Recording(Market):
+    """Market with manual ticks, answering the bot's requests.get in-process."""
+
+    def __init__(self, dex: str, n_pools: int, active: float, seed: int = 7):
+        super().__init__(n_pools, dedust_share=1.0 if dex == "dedust" else 0.0, seed=seed)
+        self.dex = dex
+        self.active = max(1, int(round(n_pools * active)))
+        self.pool_names = list(self.pools)
+
+    def tick(self) -> int:
+        """One block: a random subset of pools gets one buy each. Returns buys made."""
+        self.next_block()
+        now = int(time.time())
+        for pool in self.rng.sample(self.pool_names, self.active):
+            self.trade(pool, now)
+        return self.active
+
+    def get(self, url, params=None, headers=None, timeout=None, **_kw):
+        if main.TON_PRICE_API and url == main.TON_PRICE_API:
+            url = "/ton-price"
+        status, body = self.route(urlsplit(url).path.rstrip("/"), params or {})
+        return FakeResponse(status, json.dumps(body).encode())
+
+
+class _Msg:
+    __slots__ = ("message_id",)
+
+    def __init__(self, mid: int):
+        self.message_id = mid
+
+
+class FakeBot:
+    """Instant Telegram: every send/edit succeeds and is counted."""
+
+    def __init__(self):
+        self.sends = 0
+        self.edits = 0
+
+    async def send_message(self, **_kw):
+        self.sends += 1
+        return _Msg(self.sends)
+
+    send_photo = send_message
+
+    async def edit_message_text(self, **_kw):
+        self.edits += 1
+        return True
+
+    edit_message_caption = edit_message_text
+
+
+class FakeContext:
+    def __init__(self, bot):
+        self.bot = bot
+
+
+def _reset_main(rec: Recording):
+    """Fresh DATA / STATE / caches for one run; cursors primed at the tip."""
+    for d in (main.SEEN_TX_STON, main.SEEN_TX_DEDUST, main.SEEN_TX_BLUM, main.PAIR_CACHE,
+              main.TOKEN_STATS_CACHE, main.PAIR_META_CACHE, main.JETTON_DECIMALS_CACHE,
+              main.LATENCY_SAMPLES, main.SWAP_FLOW.tokens, main.CANDLES.pools):
+        d.clear()
+    main.HOLDERS = main.HolderBook(main.HOLDERS_RECONCILE_INTERVAL)
+
+    dex = "dedust" if rec.dex == "dedust" else "stonfi"
+    main.DATA = {
+        "pairs": {
+            p: {"dex": dex, "symbol": "BNCH", "token_address": t, "token": t, "telegram": "https://t.me/bench"}
+            for p, t in rec.tokens.items()
+        },
+        "watch": {},
+        "forced_ranks": {},
+        "group_mirrors": {},
+    }
+    main.save_data()
+    main.STATE.clear()
+    main.STATE.update({
+        "leaderboard_msg_id": None,
+        "ston_last_block": rec.block,
+        "ston_last_lt_map": {p: rec.newest_lt(p) for p in rec.pools},
+        "dedust_last_lt": {p: rec.newest_lt(p) for p in rec.pools},
+        "dedust_last_id": {},
+        "dedust_seen": {},
+        "blum_last_lt": {},
+    })
+    main.save_state()
+    main.OUTBOX_ENABLED = False  # trackers deliver inline, so a tick's time includes the sends
+
+
+JOBS = {
+    "ston_fast": ("stonfi", lambda: main.ston_tracker_job_fast),
+    "dedust": ("dedust", lambda: main.dedust_tracker_job),
+    "ston_export": ("stonfi", lambda: main.ston_tracker_job),
+}
+
+
+async def _drain():
+    me = asyncio.current_task()
+    pending = [t for t in asyncio.all_tasks() if t is not me]
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _pct(vals, p):
+    if not vals:
+        return float("nan")
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(p / 100.0 * (len(vals) - 1))))]
+
+
+async def run_one(job: str, n_pools: int, ticks: int, active: float, alloc: bool):
+    dex, job_fn = JOBS[job]
+    rec = Recording(dex, n_pools, active)
+    for _ in range(3):  # some more history so paging has something to walk
+        rec.tick()
+    _reset_main(rec)
+    main.requests.get = rec.get
+
+    traces = []
+    real_post = main.post_buy_message
+
+    async def traced_post(*args, **kwargs):
+        if kwargs.get("trace") is not None:
+            traces.append(kwargs["trace"])
+        return await real_post(*args, **kwargs)
+
+    main.post_buy_message = traced_post
+    bot = FakeBot()
+    ctx = FakeContext(bot)
+    fn = job_fn()
+    try:
+        rec.tick()  # warm-up (decimals, ton legs, thread pool)
+        await fn(ctx)
+        await _drain()
+        traces.clear()
+
+        wall = 0.0
+        for _ in range(ticks):
+            rec.tick()
+            t0 = time.perf_counter()
+            await fn(ctx)
+            wall += time.perf_counter() - t0
+            await _drain()
+
+        lat = [(t["send"] - t["fetch"]) * 1000.0 for t in traces if "send" in t and "fetch" in t]
+        buys = len(traces)
+        row = {
+            "job": job,
+            "pools": n_pools,
+            "buys": buys,
+            "buys_s": buys / wall if wall else 0.0,
+            "p50": _pct(lat, 50),
+            "p99": _pct(lat, 99),
+            "kib": None,
+            "blocks": None,
+        }
+
+        if alloc:
+            rec.tick()
+            traces.clear()
+            blocks0 = sys.getallocatedblocks()
+            tracemalloc.start()
+            await fn(ctx)
+            await _drain()
+            _cur, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            n = max(1, len(traces))
+            row["kib"] = peak / 1024.0 / n
+            row["blocks"] = (sys.getallocatedblocks() - blocks0) / n
+        return row
+    finally:
+        main.post_buy_message = real_post
+
+
+def _fmt(v, spec):
+    if isinstance(v, (int, float)) and v == v:
+        return format(v, spec)
+    return "-".rjust(int(spec.split(".")[0]))
+
+
+async def _main(args):
+    pools = [int(x) for x in args.pools.split(",") if x.strip()]
+    jobs = [j.strip() for j in args.jobs.split(",") if j.strip()]
+    main.DATA_FILE = os.path.join(_TMP, "data.json")
+    main.STATE_FILE = os.path.join(_TMP, "state.json")
+    main.FAST_POST_MODE = True
+
+    print(f"ticks={args.ticks} active={args.active:.3f} tmp={_TMP}")
+    print(f"{'job':<12}{'pools':>7}{'buys':>7}{'buys/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'KiB/buy':>9}{'blk/buy':>9}")
+    for job in jobs:
+        for n in pools:
+            r = await run_one(job, n, args.ticks, args.active, args.alloc)
+            print(
+                f"{r['job']:<12}{r['pools']:>7}{r['buys']:>7}{_fmt(r['buys_s'], '10.1f')}"
+                f"{_fmt(r['p50'], '9.2f')}{_fmt(r['p99'], '9.2f')}{_fmt(r['kib'], '9.1f')}{_fmt(r['blocks'], '9.1f')}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--pools", default="10,1000,10000")
+    ap.add_argument("--ticks", type=int, default=3)
+    ap.add_argument("--active", type=float, default=0.02, help="fraction of pools that trade per tick")
+    ap.add_argument("--jobs", default=",".join(JOBS))
+    ap.add_argument("--alloc", action="store_true", help="extra tick under tracemalloc")
+    asyncio.run(_main(ap.parse_args()))
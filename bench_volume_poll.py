@@ -0,0 +1,117 @@
+"""Before / after benchmark for the DexScreener volume-trigger poll (dexscreener.py + storage.py).
+
+"before" is the per-token loop the module used to support: one tokens call
+per token (requests.get, no session), max() over its pairs, then
+is_new_buy() reading and rewriting seen.json for every token that passed
+the volume gate. "after" is dexscreener.poll_volume_buys(): BATCH tokens
+per call through httpclient.http_get (answers truncated at the pair cap are
+asked again in halves), with storage.SEEN kept in memory and written at
+most every SEEN_FLUSH_INTERVAL seconds.
+
+Both run against an in-process upstream_sim server (loopback HTTP, tokens
+answers capped at 30 pairs like DexScreener's), over N tokens, with
+--swaps random buys between polls so some volumes move.
+
+Reported per poll: upstream requests, seen.json writes, wall time (ms)
+and new-volume items (must match between before and after).
+
+Usage:
+  python bench_volume_poll.py [--tokens 30,300,1000] [--polls 5] [--swaps 50] [--latency-ms 0]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+import dexscreener
+import storage
+from upstream_sim import Faults, Market, SimServer
+
+
+def _before_poll(base: str, tokens, min_usd: float, seen_path: str, writes: list):
+    out = []
+    for addr, sym in tokens.items():
+        try:
+            r = requests.get(f"{base}/latest/dex/tokens/{addr}", timeout=10)
+            pairs = r.json().get("pairs") or []
+        except Exception:
+            continue
+        if not pairs:
+            continue
+        best = max(pairs, key=lambda p: float((p.get("liquidity") or {}).get("usd", 0) or 0))
+        vol = float((best.get("volume") or {}).get("h24", 0) or 0)
+        if vol < min_usd:
+            continue
+        with open(seen_path) as f:
+            seen = json.load(f)
+        key = f"{vol:.6f}"
+        if seen.get(sym) == key:
+            continue
+        seen[sym] = key
+        with open(seen_path, "w") as f:
+            json.dump(seen, f, indent=2)
+        writes[0] += 1
+        out.append(addr)
+    return out
+
+
+def _requests(srv: SimServer) -> int:
+    with srv._stats_lock:
+        return sum(n for k, n in srv.stats.items() if k.startswith("dex_tokens"))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--tokens", default="30,300,1000")
+    ap.add_argument("--polls", type=int, default=5)
+    ap.add_argument("--swaps", type=int, default=50, help="buys between polls")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated upstream latency")
+    ap.add_argument("--min-usd", type=float, default=1.0)
+    args = ap.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="spyton-volpoll-"))
+    print(f"{'tokens':>7}{'mode':>8}{'req/poll':>10}{'writes/poll':>13}{'ms/poll':>10}{'items':>8}")
+    for n in [int(x) for x in args.tokens.split(",") if x.strip()]:
+        m = Market(n, dedust_share=0.0)
+        srv = SimServer(("127.0.0.1", 0), m, Faults(latency_ms=args.latency_ms))
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{srv.server_address[1]}"
+        dexscreener.DEX_URL = base + "/latest/dex/tokens/{}"
+        tokens = {t: f"SIM{i}" for i, t in enumerate(m.tokens.values())}
+        pools = list(m.pools)
+
+        for mode in ("before", "after"):
+            with open("seen.json", "w") as f:
+                json.dump({}, f)
+            storage.SEEN = storage.KVFile("seen.json", storage.SEEN_FLUSH_INTERVAL)
+            writes = [0]
+            reqs = items = 0
+            took = 0.0
+            m.rng.seed(5)
+            for _ in range(args.polls):
+                for _ in range(args.swaps):
+                    m.trade(m.rng.choice(pools))
+                r0 = _requests(srv)
+                t0 = time.perf_counter()
+                if mode == "before":
+                    got = _before_poll(base, tokens, args.min_usd, "seen.json", writes)
+                else:
+                    got = dexscreener.poll_volume_buys(tokens, args.min_usd, storage.is_new_buy)
+                took += time.perf_counter() - t0
+                reqs += _requests(srv) - r0
+                items += len(got)
+            if mode == "after":
+                storage.SEEN.flush()
+                writes[0] = storage.SEEN.writes
+            p = args.polls
+            print(f"{n:>7}{mode:>8}{reqs / p:>10.1f}{writes[0] / p:>13.1f}{took / p * 1000:>10.1f}{items / p:>8.1f}")
+        srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
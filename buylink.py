@@ -0,0 +1,215 @@
+"""Local IPC link between the ingestion worker and the Telegram process.
+
+Two-process mode (PROCESS_ROLE=ingest / post in main.py): the worker runs
+the trackers and, instead of posting, sends one compact record per buy
+over a unix stream socket; the PTB process renders and dispatches them.
+
+Wire format: one JSON array per line, fields in BUY_FIELDS order
+(the post_buy_message arguments), e.g.
+
+  ["SYM","EQ..token","EQ..pool","EQ..buyer","txhash",12.5,1000.0,"","DeDust",{trace}]
+
+The sender buffers up to `max_pending` records while the receiver is down
+and reconnects on the next send; a record leaves the buffer only once the
+socket write has drained, so a connection lost mid-write resends it. The
+receiver hands records to an async handler through a bounded queue, so a
+slow Telegram send never stalls the socket reader (and a full queue pushes
+back on the worker).
+
+Delivery is acknowledged per record: once the handler has taken a batch
+and `await commit()` has made it durable (the post process journals its
+outbox and fsyncs the journal), the receiver writes one JSON string per record back, its key
+(`key(rec)`), and the sender passes it to `on_ack`. Until then the
+worker keeps the buy pending in its own outbox and resends it; the
+receiver absorbs the duplicates by key.
+"""
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+
+from jsoncodec import json_dumps, json_loads
+
+log = logging.getLogger("spyton.buylink")
+
+BUY_FIELDS = (
+    "sym",
+    "token_addr",
+    "pair_id",
+    "buyer",
+    "tx_hash",
+    "ton_amt",
+    "token_amt",
+    "pos_txt",
+    "source_label",
+    "trace",
+)
+
+
+def encode_buy(rec: Dict[str, Any]) -> bytes:
+    return json_dumps([rec.get(f) for f in BUY_FIELDS], default=str) + b"\n"
+
+
+def decode_buy(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        vals = json_loads(line)
+    except ValueError:
+        return None
+    if not isinstance(vals, list) or len(vals) != len(BUY_FIELDS):
+        return None
+    return dict(zip(BUY_FIELDS, vals))
+
+
+class BuySender:
+    """Worker side. send() never raises; records wait in memory until the receiver is up."""
+
+    def __init__(self, path: str, max_pending: int = 10000, on_ack: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self.on_ack = on_ack
+        self.pending: Deque[Tuple[int, bytes]] = deque()  # (seq, line), oldest first
+        self.max_pending = int(max_pending)
+        self._seq = 0
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self._acks: Optional[asyncio.Task] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()  # trackers run concurrently; one connect / drain at a time
+
+    async def send(self, rec: Dict[str, Any]):
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft()
+            self.dropped += 1
+        self._seq += 1
+        self.pending.append((self._seq, encode_buy(rec)))
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self):
+        if self._writer is not None and (self._reader.at_eof() or self._writer.is_closing()):
+            self._writer.close()  # receiver went away (restart); reconnect below
+            self._writer = None
+        if self._writer is None:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                return  # receiver not up yet; keep buffering
+            self._acks = asyncio.get_running_loop().create_task(self._read_acks(self._reader))
+        if not self.pending:
+            return
+        try:
+            for _seq, line in self.pending:
+                self._writer.write(line)
+            last = self.pending[-1][0]
+            await self._writer.drain()
+        except (ConnectionError, OSError) as e:
+            log.warning("buy link to %s lost: %s", self.path, e)
+            self._writer.close()
+            self._writer = None
+            return  # everything stays buffered and is resent on reconnect
+        # send() may have appended (or overflow dropped) while we were draining
+        while self.pending and self.pending[0][0] <= last:
+            self.pending.popleft()
+            self.sent += 1
+
+    async def _read_acks(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                try:
+                    key = json_loads(line)
+                except ValueError:
+                    continue
+                if isinstance(key, str):
+                    self.acked += 1
+                    if self.on_ack:
+                        self.on_ack(key)
+        except (ConnectionError, OSError):
+            pass
+
+    async def close(self):
+        if self._acks is not None:
+            self._acks.cancel()
+            self._acks = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+async def serve_buys(
+    path: str,
+    handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+    queue_max: int = 10000,
+    on_depth: Optional[Callable[[int], None]] = None,
+    key: Optional[Callable[[Dict[str, Any]], str]] = None,
+    commit: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> List[Any]:
+    """PTB side: accept worker connections on `path`, call `handler(rec)` for
+    each record in arrival order, then `await commit()` once per batch and ack each
+    handled record with `key(rec)` (no acks without `key`).
+    Returns [server, consumer_task]."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max)
+
+    async def _conn(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                rec = decode_buy(line)
+                if rec is None:
+                    log.warning("buy link: dropped malformed record")
+                    continue
+                await queue.put((rec, writer))
+                if on_depth:
+                    on_depth(queue.qsize())
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def _consume():
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty() and len(batch) < 256:
+                batch.append(queue.get_nowait())
+            if on_depth:
+                on_depth(queue.qsize())
+            handled = []
+            for rec, writer in batch:
+                try:
+                    await handler(rec)
+                    handled.append((rec, writer))
+                except Exception as e:
+                    log.exception("buy link handler failed: %s", e)
+            if not handled or key is None:
+                continue
+            if commit is not None:
+                try:
+                    await commit()
+                except Exception as e:
+                    log.exception("buy link commit failed, not acking: %s", e)
+                    continue
+            for rec, writer in handled:
+                if not writer.is_closing():
+                    writer.write(json_dumps(key(rec)) + b"\n")
+            for writer in {w for _rec, w in handled}:
+                try:
+                    await writer.drain()
+                except (ConnectionError, OSError):
+                    pass  # worker went away; it resends what wasn't acked
+
+    try:
+        os.unlink(path)  # stale socket from a previous run
+    except FileNotFoundError:
+        pass
+    server = await asyncio.start_unix_server(_conn, path=path, limit=1 << 20)
+    return [server, asyncio.get_running_loop().create_task(_consume())]
@@ -0,0 +1,240 @@
+"""Per-pool OHLCV candles built from the swaps the trackers detect.
+
+Price is the exact execution price of each buy: TON in / tokens out
+(so prices are in TON per token). Every pool gets one ring per timeframe
+(1m / 5m / 1h) of fixed-size typed arrays; the slot for a bar is
+(bar_start // tf) % size, so looking up "the bar N periods ago" is O(1).
+
+Closed bars are appended to candles/<tf>/<pool>.bin (fixed-size records,
+in bar order) and the ring is warmed from the tail of that file the first
+time a pool is seen after a restart. A bar that is already in the file (a
+late trade, or the open bar flush() wrote at shutdown) is rewritten in place,
+never appended twice.
+"""
+
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+import os
+import struct
+import threading
+
+TIMEFRAMES: Dict[str, int] = {"1m": 60, "5m": 300, "1h": 3600}
+
+# t, open, high, low, close, volume_ton, trades
+_REC = struct.Struct("<qdddddI")
+
+
+class CandleRing:
+    __slots__ = ("tf", "size", "t", "o", "h", "l", "c", "v", "n", "head")
+
+    def __init__(self, tf: int, size: int):
+        self.tf = int(tf)
+        self.size = int(size)
+        self.t = array("q", [0]) * self.size
+        self.o = array("d", [0.0]) * self.size
+        self.h = array("d", [0.0]) * self.size
+        self.l = array("d", [0.0]) * self.size
+        self.c = array("d", [0.0]) * self.size
+        self.v = array("d", [0.0]) * self.size
+        self.n = array("I", [0]) * self.size
+        self.head = 0  # start time of the newest (open) bar
+
+    def bar(self, start: int) -> Optional[Tuple[int, float, float, float, float, float, int]]:
+        i = (start // self.tf) % self.size
+        if self.t[i] != start or not self.n[i]:
+            return None
+        return (self.t[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i], self.n[i])
+
+    def put(self, rec: Tuple[int, float, float, float, float, float, int]):
+        start = int(rec[0])
+        i = (start // self.tf) % self.size
+        self.t[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i], self.n[i] = (
+            start, rec[1], rec[2], rec[3], rec[4], rec[5], int(rec[6]),
+        )
+        if start > self.head:
+            self.head = start
+
+    def add(self, ts: float, price: float, ton: float) -> Optional[Tuple]:
+        """Add one trade. Returns the bar that just closed (if this trade opened a new one)."""
+        start = int(ts) - int(ts) % self.tf
+        if self.head and start <= self.head - self.tf * self.size:
+            return None  # older than the ring
+        closed = None
+        if start > self.head and self.head:
+            closed = self.bar(self.head)
+        i = (start // self.tf) % self.size
+        if self.t[i] != start:
+            self.t[i] = start
+            self.o[i] = self.h[i] = self.l[i] = self.c[i] = price
+            self.v[i] = 0.0
+            self.n[i] = 0
+        else:
+            if price > self.h[i]:
+                self.h[i] = price
+            if price < self.l[i]:
+                self.l[i] = price
+            self.c[i] = price
+        self.v[i] += ton
+        self.n[i] += 1
+        if start > self.head:
+            self.head = start
+        return closed
+
+    def last(self, count: int) -> List[Tuple]:
+        """Up to `count` most recent non-empty bars, oldest first."""
+        out = []
+        start = self.head
+        for _ in range(min(int(count), self.size)):
+            b = self.bar(start)
+            if b:
+                out.append(b)
+            start -= self.tf
+        out.reverse()
+        return out
+
+    def close_before(self, start: int, max_back: int) -> Optional[float]:
+        """Close of the latest non-empty bar at or before `start` (looking back max_back bars)."""
+        for _ in range(max(1, min(int(max_back), self.size))):
+            b = self.bar(start)
+            if b:
+                return b[4]
+            start -= self.tf
+        return None
+
+
+class CandleBook:
+    """All pools x timeframes, with closed-bar persistence."""
+
+    def __init__(self, root: str = "candles", size: int = 720, persist: bool = True):
+        self.root = root
+        self.size = int(size)
+        self.persist = persist
+        self.pools: Dict[str, Dict[str, CandleRing]] = {}
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._saved: Dict[Tuple[str, str], int] = {}  # (tf, pool) -> start of the last bar on disk
+        self._dirty: Set[str] = set()  # pools traded since the last flush()
+
+    def _path(self, tf_name: str, pool: str) -> str:
+        return os.path.join(self.root, tf_name, f"{pool}.bin")
+
+    def _load(self, tf_name: str, ring: CandleRing, pool: str):
+        fp = self._path(tf_name, pool)
+        try:
+            size = os.path.getsize(fp)
+        except OSError:
+            return
+        n = min(size // _REC.size, ring.size)
+        if not n:
+            return
+        with open(fp, "rb") as f:
+            f.seek((size // _REC.size - n) * _REC.size)
+            data = f.read(n * _REC.size)
+        for rec in _REC.iter_unpack(data):
+            ring.put(rec)
+        self._saved[(tf_name, pool)] = int(rec[0])
+
+    def _save(self, tf_name: str, pool: str, bar: Tuple, tf: int):
+        """Append `bar`, or overwrite its record if that bar is already on disk."""
+        fp = self._path(tf_name, pool)
+        key = (tf_name, pool)
+        start = int(bar[0])
+        with self._io_lock:
+            last = self._saved.get(key, 0)
+            if start > last:
+                os.makedirs(os.path.dirname(fp), exist_ok=True)
+                with open(fp, "ab") as f:
+                    f.write(_REC.pack(*bar))
+                self._saved[key] = start
+                return
+            # records are in bar order with gaps, so it's at most this many back
+            back = (last - start) // tf + 1
+            with open(fp, "r+b") as f:
+                end = f.seek(0, os.SEEK_END) // _REC.size
+                n = min(back, end)
+                f.seek((end - n) * _REC.size)
+                data = f.read(n * _REC.size)
+                for j, rec in enumerate(_REC.iter_unpack(data)):
+                    if rec[0] == start:
+                        f.seek((end - n + j) * _REC.size)
+                        f.write(_REC.pack(*bar))
+                        return
+
+    def rings(self, pool: str) -> Dict[str, CandleRing]:
+        r = self.pools.get(pool)
+        if r is None:
+            with self._lock:
+                r = self.pools.get(pool)
+                if r is None:
+                    r = {name: CandleRing(tf, self.size) for name, tf in TIMEFRAMES.items()}
+                    if self.persist:
+                        for name, ring in r.items():
+                            self._load(name, ring, pool)
+                    self.pools[pool] = r
+        return r
+
+    def _peek(self, pool: str) -> Optional[Dict[str, CandleRing]]:
+        """Rings for reads: in memory, or warmed from disk if the pool has history there.
+
+        Unlike rings(), a pool with no candles anywhere is not added to the book.
+        """
+        r = self.pools.get(pool)
+        if r is None and self.persist and pool and os.sep not in pool and not pool.startswith("."):
+            if any(os.path.isfile(self._path(name, pool)) for name in TIMEFRAMES):
+                r = self.rings(pool)
+        return r
+
+    def on_swap(self, pool: str, ts: float, ton: float, token_amt: float):
+        if not pool or not ton or not token_amt or ton <= 0 or token_amt <= 0:
+            return
+        price = float(ton) / float(token_amt)
+        for name, ring in self.rings(pool).items():
+            closed = ring.add(ts, price, float(ton))
+            if not self.persist:
+                continue
+            start = int(ts) - int(ts) % ring.tf
+            if not closed and start < ring.head and start <= self._saved.get((name, pool), 0):
+                closed = ring.bar(start)  # late trade into a bar that's already on disk
+            if closed:
+                try:
+                    self._save(name, pool, closed, ring.tf)
+                except OSError:
+                    pass
+        if self.persist:
+            self._dirty.add(pool)
+
+    def flush(self):
+        """Write the open bar of every pool traded since the last flush (shutdown / snapshot)."""
+        if not self.persist:
+            return
+        dirty, self._dirty = self._dirty, set()
+        for pool in dirty:
+            for name, ring in (self.pools.get(pool) or {}).items():
+                bar = ring.bar(ring.head)
+                if bar:
+                    try:
+                        self._save(name, pool, bar, ring.tf)
+                    except OSError:
+                        pass
+
+    def last(self, pool: str, tf_name: str = "1m", count: int = 60) -> List[Tuple]:
+        r = self._peek(pool)
+        if r is None or tf_name not in r:
+            return []
+        return r[tf_name].last(count)
+
+    def change_pct(self, pool: str, tf_name: str, bars: int, now: Optional[float] = None) -> Optional[float]:
+        """% change of the latest close vs the close `bars` periods earlier.
+
+        Periods count back from the newest bar, or from `now` if given.
+        """
+        r = self._peek(pool)
+        if r is None or tf_name not in r:
+            return None
+        ring = r[tf_name]
+        end = ring.head if now is None else int(now) - int(now) % ring.tf
+        now_c = ring.close_before(ring.head, 1)
+        then_c = ring.close_before(end - ring.tf * int(bars), ring.size - int(bars))
+        if not now_c or not then_c:
+            return None
+        return (now_c / then_c - 1.0) * 100.0
@@ -0,0 +1,173 @@
+"""Append-only journal for the tracker cursors kept in state.json.
+
+The trackers move their cursors (per-pool newest lt, STON export block)
+every few seconds. Rewriting all of state.json for that re-serializes
+everything else in it as well (dedust_seen, leaderboard id, ...); instead
+each move is appended here as one small record and state.json is only
+rewritten when the journal is compacted.
+
+File layout: one JSON array per line.
+
+  {"gen": 7}                            header: state.json generation it extends
+  ["ston_last_lt_map","EQ..pool",4711]  map entry set
+  ["dedust_last_lt","EQ..pool",null]    map entry removed
+  ["ston_last_block",null,123456]       scalar set
+
+Compaction writes state.json with the generation bumped, then starts a new
+journal with the new header. A journal whose header does not match the
+generation in state.json was already folded in (crash between the two
+steps) and is ignored on load. A torn last line (crash mid-append) ends
+the replay.
+
+Appends reach the OS on every call; fsync is left to the caller (sync()),
+so it can be batched.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import os
+
+from jsoncodec import json_dumps, json_loads
+
+
+def cursor_baseline(state: Dict[str, Any], kinds: Iterable[str]) -> Dict[str, Any]:
+    """Copy of the cursor entries in `state`, to diff later moves against."""
+    return {k: dict(state[k]) if isinstance(state.get(k), dict) else state.get(k) for k in kinds}
+
+
+def cursor_diff(state: Dict[str, Any], kinds: Iterable[str], baseline: Dict[str, Any]) -> List[list]:
+    """Records for everything that changed since `baseline`; updates `baseline` in place."""
+    out: List[list] = []
+    for kind in kinds:
+        cur, old = state.get(kind), baseline.get(kind)
+        if not isinstance(cur, dict):
+            if cur != old:
+                out.append([kind, None, cur])
+                baseline[kind] = cur
+            continue
+        if not isinstance(old, dict):
+            old = baseline[kind] = {}
+        for key, val in cur.items():
+            if old.get(key) != val:
+                out.append([kind, key, val])
+                old[key] = val
+        if len(old) > len(cur):  # old holds every key of cur by now
+            for key in [k for k in old if k not in cur]:
+                out.append([kind, key, None])
+                del old[key]
+    return out
+
+
+def apply_records(state: Dict[str, Any], records: Iterable[list]):
+    for kind, key, val in records:
+        if key is None:
+            state[kind] = val
+            continue
+        m = state.get(kind)
+        if not isinstance(m, dict):
+            m = state[kind] = {}
+        if val is None:
+            m.pop(key, None)
+        else:
+            m[key] = val
+
+
+def replay(path: str, gen: int) -> List[list]:
+    """Records of the journal at `path` if it extends state generation `gen`, else []."""
+    try:
+        with open(path, "rb") as f:
+            lines = f.read().split(b"\n")
+    except FileNotFoundError:
+        return []
+    try:
+        head = json_loads(lines[0])
+    except ValueError:
+        return []
+    if not isinstance(head, dict) or head.get("gen") != gen:
+        return []
+    out: List[list] = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        try:
+            rec = json_loads(line)
+        except ValueError:
+            break  # torn append; everything after it is garbage too
+        if isinstance(rec, list) and len(rec) == 3:
+            out.append(rec)
+    return out
+
+
+class CursorJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self.gen: Optional[int] = None
+        self.size = 0      # bytes in the current file
+        self.records = 0   # records appended since the last reset
+        self._f = None
+        self._unsynced = False
+
+    def _open(self, gen: int):
+        # Continue a journal that extends this generation (the one load replayed), else start over
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            head = json_loads(data.split(b"\n", 1)[0])
+        except (OSError, ValueError):
+            data, head = b"", None
+        if isinstance(head, dict) and head.get("gen") == gen:
+            self._f = open(self.path, "ab")
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                self._f.truncate(end)  # torn last append; replay stopped there too
+            self.gen = gen
+            self.size = end
+        else:
+            self.reset(gen)
+
+    def reset(self, gen: int):
+        """Start an empty journal for state generation `gen` (after state.json was written)."""
+        if self._f is not None:
+            self._f.close()
+        self._f = open(self.path, "wb")
+        head = json_dumps({"gen": gen}) + b"\n"
+        self._f.write(head)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self.gen = gen
+        self.size = len(head)
+        self.records = 0
+        self._unsynced = False
+
+    def append(self, gen: int, records: List[list]) -> int:
+        """Write `records` (one write call); returns the bytes written."""
+        if self._f is None or self.gen != gen:
+            self._open(gen)
+        data = b"".join(json_dumps(r, default=str) + b"\n" for r in records)
+        self._f.write(data)
+        self._f.flush()
+        self.size += len(data)
+        self.records += len(records)
+        self._unsynced = True
+        return len(data)
+
+    def sync(self):
+        """fsync pending appends. Safe from a worker thread while the loop appends / resets:
+        it syncs a dup of the descriptor, and a reset in between fsyncs the new file itself."""
+        f = self._f
+        if f is None or not self._unsynced:
+            return
+        self._unsynced = False
+        try:
+            fd = os.dup(f.fileno())
+        except (ValueError, OSError):
+            return  # closed by reset() / close() meanwhile
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        if self._f is not None:
+            self.sync()
+            self._f.close()
+            self._f = None
@@ -1,46 +1,121 @@
-import requests
+"""DexScreener volume-trigger mode: a 'buy' is a rise in a token's 24h volume.
 
-DEX_URL = "https://api.dexscreener.com/latest/dex/tokens/{}"
+DexScreener's tokens endpoint takes up to BATCH comma-separated addresses, so
+a poll over N tokens is about ceil(N / BATCH) requests. A response holds at
+most PAIR_CAP pairs, though, so a batch whose answer hits the cap is asked
+again in halves. Requests go through httpclient.http_get (upstream metrics
+and HTTP_CAPTURE_MODE record / replay). Addresses match in any form (raw or
+user-friendly, tonaddr.normalize_address).
 
+Each token is summarized by its most liquid TON pair; the caller diffs the
+volume against the last snapshot (storage.is_new_buy) to decide what's new.
+"""
 
-def check_token_buys(token_address: str, min_usd: float):
-    """
-    Returns list of buy-like items from DexScreener token endpoint.
-    We keep it conservative: we just pull pair metrics and simulate a 'buy'
-    based on latest volume changes.
-    If your current version already works, keep yours.
-    """
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import os
+
+from httpclient import http_get, init_http_capture
+from jsoncodec import response_json
+from tonaddr import normalize_address
+
+DEX_BASE = os.getenv("DEXSCREENER_BASE", "https://api.dexscreener.com").rstrip("/")
+DEX_URL = DEX_BASE + "/latest/dex/tokens/{}"
+BATCH = 30     # addresses per tokens call (DexScreener's limit)
+PAIR_CAP = 30  # pairs per response; an answer this long may be truncated
+
+
+def _get(url: str):
+    init_http_capture()
+    return http_get("dexscreener", url, timeout=10)
+
+
+def _f(v: Any) -> float:
     try:
-        r = requests.get(DEX_URL.format(token_address), timeout=10)
-        if r.status_code != 200:
-            return []
-
-        data = r.json()
-        pairs = data.get("pairs") or []
-        if not pairs:
-            return []
-
-        # choose best TON pair by liquidity
-        best = max(pairs, key=lambda p: float((p.get("liquidity") or {}).get("usd", 0) or 0))
-
-        # DexS doesn't give exact tx here; your old logic uses volumeUsd as a trigger.
-        volume_usd = float((best.get("volume") or {}).get("h24", 0) or 0)
-        price_usd = float(best.get("priceUsd") or 0)
-        liquidity = float((best.get("liquidity") or {}).get("usd", 0) or 0)
-        fdv = float(best.get("fdv") or 0)
-        url = best.get("url") or ""
-
-        # basic spam gate
-        if volume_usd < float(min_usd):
-            return []
-
-        return [{
-            "volumeUsd": volume_usd,
-            "priceUsd": price_usd,
-            "liquidity": liquidity,
-            "fdv": fdv,
-            "url": url
-        }]
+        return float(v or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
 
+def _fetch_chunk(chunk: List[str], out: Dict[str, List[Dict[str, Any]]]):
+    try:
+        r = _get(DEX_URL.format(",".join(chunk)))
+        if r.status_code != 200:
+            return
+        pairs = (response_json(r) or {}).get("pairs") or []
     except Exception:
-        return []
\ No newline at end of file
+        return
+    if len(pairs) >= PAIR_CAP and len(chunk) > 1:
+        half = len(chunk) // 2  # truncated: an absent token isn't a miss
+        _fetch_chunk(chunk[:half], out)
+        _fetch_chunk(chunk[half:], out)
+        return
+    wanted = {normalize_address(a): a for a in chunk}
+    for a in chunk:
+        out[a] = []
+    for p in pairs:
+        if not isinstance(p, dict):
+            continue
+        for side in ("baseToken", "quoteToken"):
+            addr = wanted.get(normalize_address((p.get(side) or {}).get("address") or ""))
+            if addr is not None:
+                out[addr].append(p)
+
+
+def fetch_token_pairs(addresses: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """{address: [pair, ...]} keyed by the addresses as given; addresses of a failed call are left out."""
+    addrs = list(dict.fromkeys(a.strip() for a in addresses if a and a.strip()))
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for i in range(0, len(addrs), BATCH):
+        _fetch_chunk(addrs[i:i + BATCH], out)
+    return out
+
+
+def summarize(pairs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Metrics of the most liquid TON pair, or None if there is none."""
+    best, best_liq = None, -1.0
+    for p in pairs:
+        if not isinstance(p, dict) or (p.get("chainId") or "").lower() != "ton":
+            continue
+        liq = _f((p.get("liquidity") or {}).get("usd"))
+        if liq > best_liq:
+            best, best_liq = p, liq
+    if best is None:
+        return None
+    return {
+        "volumeUsd": _f((best.get("volume") or {}).get("h24")),
+        "priceUsd": _f(best.get("priceUsd")),
+        "liquidity": max(best_liq, 0.0),
+        "fdv": _f(best.get("fdv")),
+        "url": best.get("url") or "",
+    }
+
+
+def poll_volume_buys(
+    tokens: Dict[str, str],
+    min_usd: float,
+    is_new: Callable[[str, float], bool],
+) -> List[Dict[str, Any]]:
+    """One poll over `tokens` ({address: symbol}).
+
+    Returns one item per token whose 24h volume is at least `min_usd` and
+    changed since the last poll (`is_new(symbol, volume)`, e.g.
+    storage.is_new_buy), with "address" and "symbol" added.
+    """
+    syms = {a.strip(): s for a, s in tokens.items() if a and a.strip()}
+    out = []
+    for addr, pairs in fetch_token_pairs(syms).items():
+        item = summarize(pairs)
+        if item is None or item["volumeUsd"] < float(min_usd):
+            continue
+        sym = syms[addr]
+        if is_new(sym, item["volumeUsd"]):
+            out.append({"address": addr, "symbol": sym, **item})
+    return out
+
+
+def check_token_buys(token_address: str, min_usd: float):
+    """Single-token form: [metrics] if the token's 24h volume passes `min_usd`, else []."""
+    item = summarize(fetch_token_pairs([token_address]).get(token_address.strip()) or [])
+    if item is None or item["volumeUsd"] < float(min_usd):
+        return []
+    return [item]
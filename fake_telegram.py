@@ -0,0 +1,313 @@
+"""Local fake Telegram Bot API for load testing the posting path.
+
+Serves POST/GET /bot<token>/<method> like api.telegram.org, so the bot can
+be pointed at it with TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot (PTB
+base_url). Implemented methods:
+
+  getMe, getChat, getChatMember, sendMessage, sendPhoto,
+  editMessageText, editMessageCaption, deleteWebhook, getUpdates
+  (long poll that never has updates, so run_polling works as-is)
+
+Flood limits follow the documented Bot API guidance, enforced with token
+buckets and answered the way Telegram does (HTTP 429 + retry_after):
+
+  global      30 msg/s across all chats           (--global-rate)
+  group       20 msg/min per group / channel      (--group-per-min)
+  private      1 msg/s per private chat            (--private-rate)
+
+Sends and edits both count against the limits. Optional --latency-ms adds
+a fixed server-side delay per call. Counters are served as JSON at
+/_fake/stats (and returned by FakeTelegram.stats()).
+
+Usage:
+  python fake_telegram.py [--port 8081] [--global-rate 30] [--group-per-min 20]
+"""
+
+from email.parser import BytesParser
+from email.policy import default as email_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import json
+import math
+import threading
+import time
+
+SEND_METHODS = ("sendMessage", "sendPhoto")
+EDIT_METHODS = ("editMessageText", "editMessageCaption")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "ts")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.ts = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def wait(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1.0
+
+
+def _parse_body(ctype: str, body: bytes) -> Dict[str, Any]:
+    ctype = ctype or ""
+    if not body:
+        return {}
+    if ctype.startswith("application/json"):
+        try:
+            out = json.loads(body)
+            return out if isinstance(out, dict) else {}
+        except ValueError:
+            return {}
+    if ctype.startswith("multipart/form-data"):
+        msg = BytesParser(policy=email_policy).parsebytes(
+            b"Content-Type: " + ctype.encode("latin-1") + b"\r\n\r\n" + body
+        )
+        out: Dict[str, Any] = {}
+        for part in msg.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if not name:
+                continue
+            if part.get_filename():
+                out[name] = "<file>"
+            else:
+                out[name] = part.get_payload(decode=True).decode("utf-8", "replace")
+        return out
+    return {k: v[-1] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+
+
+class FakeTelegram:
+    """Bot API state + flood control; thread-safe, independent of the HTTP layer."""
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        group_per_min: float = 20.0,
+        private_rate: float = 1.0,
+        latency_ms: float = 0.0,
+    ):
+        self.global_rate = float(global_rate)
+        self.group_rate = float(group_per_min) / 60.0
+        self.group_burst = max(1.0, float(group_per_min))
+        self.private_rate = float(private_rate)
+        self.latency_s = max(0.0, float(latency_ms)) / 1000.0
+        self._lock = threading.Lock()
+        self._global = TokenBucket(self.global_rate, max(1.0, self.global_rate), time.monotonic())
+        self._chats: Dict[int, TokenBucket] = {}
+        self._next_id: Dict[int, int] = {}
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.retry_after_s = 0
+        self.started = time.time()
+
+    def _count(self, method: str, outcome: str):
+        row = self.counts.setdefault(method, {})
+        row[outcome] = row.get(outcome, 0) + 1
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        b = self._chats.get(chat_id)
+        if b is None:
+            if chat_id < 0:
+                b = TokenBucket(self.group_rate, self.group_burst, now)
+            else:
+                b = TokenBucket(self.private_rate, 1.0, now)
+            self._chats[chat_id] = b
+        return b
+
+    def _admit(self, chat_id: int) -> int:
+        """0 if the message may go out now, else retry_after seconds (caller holds lock)."""
+        now = time.monotonic()
+        chat = self._chat_bucket(chat_id, now)
+        wait = max(self._global.wait(now), chat.wait(now))
+        if wait > 0:
+            return max(1, int(math.ceil(wait)))
+        self._global.take()
+        chat.take()
+        return 0
+
+    def call(self, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if method == "getUpdates":
+            try:
+                time.sleep(min(max(0.0, float(params.get("timeout") or 0)), 30.0))
+            except (TypeError, ValueError):
+                pass
+            with self._lock:
+                self._count(method, "ok")
+            return 200, {"ok": True, "result": []}
+        with self._lock:
+            return self._call(method, params)
+
+    def _call(self, method: str, p: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if method == "deleteWebhook":
+            self._count(method, "ok")
+            return 200, {"ok": True, "result": True}
+
+        if method == "getMe":
+            self._count(method, "ok")
+            return 200, {"ok": True, "result": {
+                "id": 1000001, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot",
+                "can_join_groups": True, "can_read_all_group_messages": False,
+                "supports_inline_queries": False,
+            }}
+
+        try:
+            chat_id = int(p.get("chat_id"))
+        except (TypeError, ValueError):
+            self._count(method, "error")
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"}
+        chat = {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private"}
+        if chat_id < 0:
+            chat["title"] = f"chat {chat_id}"
+
+        if method == "getChat":
+            self._count(method, "ok")
+            return 200, {"ok": True, "result": chat}
+
+        if method == "getChatMember":
+            self._count(method, "ok")
+            uid = int(p.get("user_id") or 0)
+            return 200, {"ok": True, "result": {
+                "status": "administrator",
+                "user": {"id": uid, "is_bot": False, "first_name": "user"},
+                "can_be_edited": False, "is_anonymous": False, "can_manage_chat": True,
+                "can_delete_messages": True, "can_manage_video_chats": True,
+                "can_restrict_members": True, "can_promote_members": False,
+                "can_change_info": True, "can_invite_users": True,
+            }}
+
+        if method not in SEND_METHODS and method not in EDIT_METHODS:
+            self._count(method, "error")
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+        if method in EDIT_METHODS:
+            mid = int(p.get("message_id") or 0)
+            if not mid or mid >= self._next_id.get(chat_id, 1):
+                self._count(method, "error")
+                return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message to edit not found"}
+
+        retry = self._admit(chat_id)
+        if retry:
+            self._count(method, "429")
+            self.retry_after_s += retry
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry}",
+                "parameters": {"retry_after": retry},
+            }
+
+        self._count(method, "ok")
+        if method in SEND_METHODS:
+            mid = self._next_id.get(chat_id, 1)
+            self._next_id[chat_id] = mid + 1
+
+        msg: Dict[str, Any] = {"message_id": mid, "date": int(time.time()), "chat": chat}
+        if method in ("sendMessage", "editMessageText"):
+            msg["text"] = p.get("text") or ""
+        else:
+            msg["caption"] = p.get("caption") or ""
+        if method == "sendPhoto":
+            msg["photo"] = [{"file_id": "fake-photo", "file_unique_id": "fake", "width": 1, "height": 1}]
+        if method in EDIT_METHODS:
+            msg["edit_date"] = int(time.time())
+        return 200, {"ok": True, "result": msg}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "chats": len(self._chats),
+                "retry_after_s": self.retry_after_s,
+                "methods": {m: dict(c) for m, c in self.counts.items()},
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeTelegramServer"
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers + body are two writes; avoid the 40ms delayed-ACK stall
+
+    def log_message(self, *_a):
+        pass
+
+    def _reply(self, status: int, body: Dict[str, Any]):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _handle(self, body: bytes):
+        parts = urlsplit(self.path)
+        if parts.path == "/_fake/stats":
+            return self._reply(200, self.server.fake.stats())
+        segs = parts.path.strip("/").split("/")
+        if len(segs) != 2 or not segs[0].startswith("bot"):
+            return self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        params.update(_parse_body(self.headers.get("Content-Type", ""), body))
+        status, out = self.server.fake.call(segs[1], params)
+        self._reply(status, out)
+
+    def do_GET(self):
+        self._handle(b"")
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        self._handle(self.rfile.read(n) if n else b"")
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr: Tuple[str, int], fake: Optional[FakeTelegram] = None):
+        super().__init__(addr, _Handler)
+        self.fake = fake or FakeTelegram()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> threading.Thread:
+        t = threading.Thread(target=self.serve_forever, daemon=True)
+        t.start()
+        return t
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--global-rate", type=float, default=30.0, help="messages/s across all chats")
+    ap.add_argument("--group-per-min", type=float, default=20.0, help="messages/min per group")
+    ap.add_argument("--private-rate", type=float, default=1.0, help="messages/s per private chat")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    args = ap.parse_args()
+    srv = FakeTelegramServer(
+        (args.host, args.port),
+        FakeTelegram(args.global_rate, args.group_per_min, args.private_rate, args.latency_ms),
+    )
+    print(f"fake Bot API on {srv.base_url}  (TELEGRAM_BASE_URL={srv.base_url})", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(srv.fake.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
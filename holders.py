@@ -0,0 +1,107 @@
+"""Holder counts per jetton: a reconciled baseline plus the new holders seen since.
+
+TonAPI's holder count costs one or two requests per token, too slow and too
+rate-limit hungry to fetch per buy. A background job looks the count up
+once, then again after `interval` seconds if the token traded since (a few
+tokens per tick); between lookups the estimate is that baseline plus the
+distinct buyers first seen after it.
+
+"First seen" is per token, across all its pools: the book keeps the set of
+buyers it has observed for each token, and only counts new ones once that
+set was already being kept when the baseline was taken (a buyer missing
+from it then was not a buyer since the watch began). Wallets emptied by
+sells and wallets that held before the watch began and buy again are still
+counted, so the estimate runs high by those until the next lookup.
+
+Buys are observed with their chain time; a buy at or before the baseline's
+timestamp is already part of the baseline and is not added again.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import time
+
+
+class HolderBook:
+    def __init__(self, interval: float = 900.0, retry: float = 300.0):
+        self.interval = float(interval)  # reconcile a baseline once it is this old
+        self.retry = float(retry)        # back-off after a failed first lookup
+        self.baselines: Dict[str, Tuple[int, float]] = {}  # token -> (holders, ts of the lookup)
+        self.new: Dict[str, Dict[str, float]] = {}         # token -> {buyer: ts} new holders after it
+        self.buyers: Dict[str, set] = {}                   # token -> every buyer observed
+        self.since: Dict[str, float] = {}                  # token -> when `buyers` started
+        self.failed: Dict[str, float] = {}                 # token -> ts of the last failed lookup
+        self.active: Dict[str, float] = {}                 # token -> last observed buy
+        self.reconciles = 0
+
+    def observe(self, token: str, buyer: str, ts: Optional[float] = None):
+        if not token:
+            return
+        ts = float(ts) if ts else time.time()
+        self.active[token] = max(ts, self.active.get(token, 0.0))
+        if not buyer:
+            return
+        seen = self.buyers.get(token)
+        if seen is None:
+            seen = self.buyers[token] = set()
+            self.since[token] = time.time()
+        if buyer in seen:
+            return
+        seen.add(buyer)
+        base = self.baselines.get(token)
+        if base is None or ts <= base[1] or self.since[token] > base[1]:
+            return  # part of the baseline, or the set is younger than it (can't tell new from old)
+        self.new.setdefault(token, {}).setdefault(buyer, ts)
+
+    def get(self, token: str) -> Optional[int]:
+        """Current estimate, or None until the token has been counted once."""
+        base = self.baselines.get(token)
+        if base is None:
+            return None
+        return base[0] + len(self.new.get(token) or ())
+
+    def reconcile(self, token: str, holders: int, ts: float):
+        """Exact count from a lookup started at `ts`; buys after `ts` stay on top of it."""
+        self.baselines[token] = (int(holders), float(ts))
+        self.failed.pop(token, None)
+        self.reconciles += 1
+        new = self.new.pop(token, None)
+        if new:
+            kept = {b: t for b, t in new.items() if t > ts}
+            if kept:
+                self.new[token] = kept
+
+    def fail(self, token: str, ts: float):
+        self.failed[token] = float(ts)
+
+    def due(self, tokens: Iterable[str], now: float, limit: int) -> List[str]:
+        """Up to `limit` of `tokens` to look up: never counted first, then the oldest
+        baselines of tokens bought since their lookup."""
+        never: List[str] = []
+        stale: List[Tuple[float, str]] = []
+        for t in tokens:
+            base = self.baselines.get(t)
+            if base is None:
+                if now - self.failed.get(t, 0.0) >= self.retry:
+                    never.append(t)
+            elif (now - base[1] >= self.interval and self.active.get(t, 0.0) > base[1]
+                  and now - self.failed.get(t, 0.0) >= self.retry):
+                stale.append((base[1], t))
+        never.sort(key=lambda t: -self.active.get(t, 0.0))  # tokens being bought first
+        stale.sort()
+        return (never + [t for _ts, t in stale])[:max(0, limit)]
+
+    def prune(self, keep: Iterable[str], now: float, idle: float = 86400.0):
+        """Forget tokens not in `keep` without a buy for `idle` seconds."""
+        keep = set(keep)
+        for t in [t for t in set(self.baselines) | set(self.new) | set(self.failed) | set(self.active)
+                  if t not in keep and now - self.active.get(t, 0.0) > idle]:
+            for d in (self.baselines, self.new, self.failed, self.active, self.buyers, self.since):
+                d.pop(t, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tokens": len(self.baselines),
+            "pending_new": sum(len(v) for v in self.new.values()),
+            "buyers": sum(len(v) for v in self.buyers.values()),
+            "reconciles": self.reconciles,
+        }
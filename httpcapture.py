@@ -0,0 +1,213 @@
+"""Record / replay of upstream HTTP traffic (TonAPI, STON, DeDust, DexScreener).
+
+Record: every response that goes through httpclient.http_get is appended as one
+JSON line to a gzip file in the capture directory:
+
+  {"t": unix_ts, "upstream": "tonapi", "url": ..., "params": {...},
+   "status": 200, "elapsed_ms": 81.2, "body": "..."}     (or "body_b64")
+
+Files roll by size / age (capture-YYYYmmdd-HHMMSS.jsonl.gz) and only the
+newest `keep` files are kept. Request headers are never written (API keys).
+
+Replay: all files in the directory are loaded and requests are answered
+from them, keyed by URL + params:
+
+  speed == 0  sequential - each key returns its recorded responses in order
+              (the last one repeats once they run out); fully deterministic
+  speed  > 0  time-indexed - a virtual clock starts at the first request and
+              runs `speed` times faster than wall time; each key returns the
+              latest response recorded at or before the virtual time, so a
+              1h production pump replays in 1h / speed; a request before
+              its key's first recording is a miss
+
+Unknown requests get a 404 with an empty JSON body. Each response carries
+its recorded elapsed_ms, and the replay sleeps that long times `latency`
+(0 = answer at once) so timing-dependent code sees production-like waits.
+"""
+
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import glob
+import gzip
+import os
+import threading
+import time
+
+from jsoncodec import json_dumps, json_loads
+
+
+def _key(url: str, params: Optional[Dict[str, Any]]) -> str:
+    if not params:
+        return url
+    return url + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params, key=str))
+
+
+class CaptureWriter:
+    def __init__(self, root: str, roll_bytes: int = 64 << 20, roll_seconds: int = 3600, keep: int = 48):
+        self.root = root
+        self.roll_bytes = int(roll_bytes)
+        self.roll_seconds = int(roll_seconds)
+        self.keep = max(1, int(keep))
+        self.records = 0
+        self._lock = threading.Lock()
+        self._fh = None
+        self._opened = 0.0
+        self._written = 0
+        self._since_flush = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _roll(self):
+        if self._fh is not None:
+            self._fh.close()
+        name = time.strftime("capture-%Y%m%d-%H%M%S", time.gmtime())
+        path = os.path.join(self.root, f"{name}.jsonl.gz")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.root, f"{name}-{n}.jsonl.gz")
+            n += 1
+        self._fh = gzip.open(path, "wb")
+        self._opened = time.time()
+        self._written = 0
+        files = sorted(glob.glob(os.path.join(self.root, "capture-*.jsonl.gz")))
+        for old in files[: max(0, len(files) - self.keep)]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def write(self, upstream: str, url: str, params: Optional[Dict[str, Any]], status: int, elapsed_s: float, body: bytes):
+        rec: Dict[str, Any] = {
+            "t": round(time.time(), 3),
+            "upstream": upstream,
+            "url": url,
+            "params": params or {},
+            "status": int(status),
+            "elapsed_ms": round(elapsed_s * 1000.0, 1),
+        }
+        try:
+            rec["body"] = (body or b"").decode("utf-8")
+        except UnicodeDecodeError:
+            rec["body_b64"] = base64.b64encode(body).decode("ascii")
+        line = json_dumps(rec, default=str) + b"\n"
+        with self._lock:
+            if (
+                self._fh is None
+                or self._written >= self.roll_bytes
+                or time.time() - self._opened >= self.roll_seconds
+            ):
+                self._roll()
+            self._fh.write(line)
+            self._written += len(line)
+            self.records += 1
+            self._since_flush += 1
+            if self._since_flush >= 100:
+                self._fh.flush()
+                self._since_flush = 0
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+class ReplayResponse:
+    """The subset of requests.Response the bot uses."""
+
+    def __init__(self, status_code: int, content: bytes, elapsed_ms: float = 0.0):
+        self.status_code = status_code
+        self.content = content
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json_loads(self.content)
+
+
+_MISS = ReplayResponse(404, b"{}")
+
+
+class ReplaySource:
+    def __init__(self, root: str, speed: float = 0.0, latency: float = 0.0):
+        self.speed = float(speed)
+        self.latency = max(0.0, float(latency))
+        # key -> (times, records) in recorded order
+        self.by_key: Dict[str, Tuple[List[float], List[Dict[str, Any]]]] = {}
+        self.pos: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.t0_rec = 0.0
+        self._t0_replay: Optional[float] = None
+        self._lock = threading.Lock()
+        self._load(root)
+
+    def _load(self, root: str):
+        recs: List[Dict[str, Any]] = []
+        for path in sorted(glob.glob(os.path.join(root, "capture-*.jsonl.gz"))):
+            try:
+                with gzip.open(path, "rb") as f:
+                    for line in f:
+                        try:
+                            recs.append(json_loads(line))
+                        except ValueError:
+                            continue
+            except (OSError, EOFError):
+                continue  # truncated tail of a file that was still being written
+        recs.sort(key=lambda r: r.get("t", 0.0))
+        for r in recs:
+            k = _key(r.get("url", ""), r.get("params"))
+            times, items = self.by_key.setdefault(k, ([], []))
+            times.append(float(r.get("t", 0.0)))
+            items.append(r)
+        self.records = len(recs)
+        self.t0_rec = recs[0].get("t", 0.0) if recs else 0.0
+
+    def virtual_time(self) -> float:
+        now = time.monotonic()
+        if self._t0_replay is None:
+            self._t0_replay = now
+        return self.t0_rec + (now - self._t0_replay) * self.speed
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> ReplayResponse:
+        k = _key(url, params)
+        entry = self.by_key.get(k)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return _MISS
+            times, items = entry
+            if self.speed > 0:
+                i = bisect_right(times, self.virtual_time()) - 1
+                if i < 0:
+                    self.misses += 1
+                    return _MISS
+            else:
+                i = self.pos.get(k, 0)
+                self.pos[k] = min(i + 1, len(items) - 1)
+            self.hits += 1
+        r = items[i]
+        if "body_b64" in r:
+            body = base64.b64decode(r["body_b64"])
+        else:
+            body = (r.get("body") or "").encode("utf-8")
+        elapsed_ms = float(r.get("elapsed_ms", 0.0) or 0.0)
+        if self.latency > 0 and elapsed_ms > 0:
+            time.sleep(elapsed_ms * self.latency / 1000.0)
+        return ReplayResponse(int(r.get("status", 200)), body, elapsed_ms)
+
+
+if __name__ == "__main__":
+    import sys
+
+    src = ReplaySource(sys.argv[1] if len(sys.argv) > 1 else "captures")
+    per: Dict[str, int] = {}
+    for _times, items in src.by_key.values():
+        for r in items:
+            per[r.get("upstream", "?")] = per.get(r.get("upstream", "?"), 0) + 1
+    print(f"{src.records} responses, {len(src.by_key)} distinct requests")
+    for up, n in sorted(per.items(), key=lambda x: -x[1]):
+        print(f"  {up:<12}{n:>8}")
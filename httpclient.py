@@ -0,0 +1,88 @@
+"""Upstream HTTP layer shared by main.py and the helper modules (dexscreener.py).
+
+http_get() is requests.get with per-upstream latency / status / size
+metrics (served with the rest at /metrics), and the single record / replay
+point for HTTP_CAPTURE_MODE (see httpcapture.py). Importing this module
+does not pull in the bot.
+"""
+
+from typing import Optional
+import atexit
+import logging
+import os
+import time
+
+import requests
+
+from httpcapture import CaptureWriter, ReplaySource
+from metrics import Counter, Histogram, SIZE_BUCKETS
+
+log = logging.getLogger("spyton.http")
+
+# "" = off, "record" or "replay"
+HTTP_CAPTURE_MODE = os.getenv("HTTP_CAPTURE_MODE", "").strip().lower()
+HTTP_CAPTURE_DIR = os.getenv("HTTP_CAPTURE_DIR", "captures")
+HTTP_CAPTURE_ROLL_MB = int(os.getenv("HTTP_CAPTURE_ROLL_MB", "64"))
+HTTP_CAPTURE_ROLL_SECONDS = int(os.getenv("HTTP_CAPTURE_ROLL_SECONDS", "3600"))
+HTTP_CAPTURE_KEEP = int(os.getenv("HTTP_CAPTURE_KEEP", "48"))  # newest files kept
+# Replay: 0 = each request gets its recorded responses in order; >0 = time
+# compression factor (10 replays a recorded hour in 6 minutes)
+HTTP_REPLAY_SPEED = float(os.getenv("HTTP_REPLAY_SPEED", "0"))
+# Replayed responses wait their recorded latency times this (0 = no wait)
+HTTP_REPLAY_LATENCY = float(os.getenv("HTTP_REPLAY_LATENCY", "0"))
+
+M_HTTP_SECONDS = Histogram("spyton_upstream_request_seconds", "Upstream HTTP request latency.")
+M_HTTP_RESPONSES = Counter("spyton_upstream_responses_total", "Upstream HTTP responses by status (status=error on exceptions).")
+M_HTTP_BYTES = Histogram("spyton_upstream_response_bytes", "Upstream HTTP response body size.", SIZE_BUCKETS)
+
+HTTP_CAPTURE: Optional[CaptureWriter] = None
+HTTP_REPLAY: Optional[ReplaySource] = None
+
+
+def init_http_capture():
+    """Set up record / replay from HTTP_CAPTURE_MODE (no-op when off or already set up)."""
+    global HTTP_CAPTURE, HTTP_REPLAY
+    if HTTP_CAPTURE_MODE == "record" and HTTP_CAPTURE is None:
+        HTTP_CAPTURE = CaptureWriter(
+            HTTP_CAPTURE_DIR,
+            roll_bytes=HTTP_CAPTURE_ROLL_MB << 20,
+            roll_seconds=HTTP_CAPTURE_ROLL_SECONDS,
+            keep=HTTP_CAPTURE_KEEP,
+        )
+        atexit.register(HTTP_CAPTURE.close)
+        log.warning("HTTP capture: recording upstream responses to %s/", HTTP_CAPTURE_DIR)
+    elif HTTP_CAPTURE_MODE == "replay" and HTTP_REPLAY is None:
+        HTTP_REPLAY = ReplaySource(HTTP_CAPTURE_DIR, speed=HTTP_REPLAY_SPEED, latency=HTTP_REPLAY_LATENCY)
+        log.warning(
+            "HTTP capture: replaying %d responses from %s/ (speed=%s)",
+            HTTP_REPLAY.records, HTTP_CAPTURE_DIR, HTTP_REPLAY_SPEED or "sequential",
+        )
+
+
+def http_get(upstream: str, url: str, **kwargs) -> requests.Response:
+    """requests.get with per-upstream latency / status / size metrics.
+
+    Also the record / replay point for HTTP_CAPTURE_MODE.
+    """
+    t0 = time.perf_counter()
+    if HTTP_REPLAY is not None:
+        res = HTTP_REPLAY.get(url, kwargs.get("params"))
+    else:
+        try:
+            res = requests.get(url, **kwargs)
+        except Exception:
+            M_HTTP_RESPONSES.inc(upstream=upstream, status="error")
+            M_HTTP_SECONDS.observe(time.perf_counter() - t0, upstream=upstream)
+            raise
+    elapsed = time.perf_counter() - t0
+    if HTTP_REPLAY is not None:
+        elapsed = res.elapsed_ms / 1000.0  # the upstream latency being replayed
+    M_HTTP_SECONDS.observe(elapsed, upstream=upstream)
+    M_HTTP_RESPONSES.inc(upstream=upstream, status=str(res.status_code))
+    M_HTTP_BYTES.observe(len(res.content or b""), upstream=upstream)
+    if HTTP_CAPTURE is not None:
+        try:
+            HTTP_CAPTURE.write(upstream, url, kwargs.get("params"), res.status_code, elapsed, res.content or b"")
+        except Exception as e:
+            log.debug("http capture write failed: %s", e)
+    return res
@@ -0,0 +1,72 @@
+"""JSON codec used for upstream HTTP bodies, IPC records and the state files.
+
+orjson when it is installed (several times faster on both decode and
+encode), otherwise the stdlib `json` module; callers do not care which.
+Everything works on bytes: HTTP bodies are decoded straight from
+`res.content` without requests' charset detection, and files are read /
+written in binary mode.
+
+Differences between the two backends are folded away here:
+
+  - orjson rejects NaN / Infinity literals and integers beyond 64 bits
+    on input (the stdlib accepts and writes them); loads() retries such
+    documents with the stdlib so old files keep loading
+  - orjson refuses non-str dict keys by default; OPT_NON_STR_KEYS turns
+    them into strings the way the stdlib does
+  - anything orjson cannot serialize falls back to the stdlib encoder
+"""
+
+from typing import Any, Callable, Optional, Union
+import json
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def json_loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)  # NaN / big ints from older stdlib-written files
+
+    def json_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+        try:
+            return orjson.dumps(obj, default=default, option=_OPTS)
+        except TypeError:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+
+    def json_dumps_pretty(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=_OPTS | orjson.OPT_INDENT_2)
+        except TypeError:
+            return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+else:
+
+    def json_loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return json.loads(data)
+
+    def json_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+
+    def json_dumps_pretty(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def read_json(path: str) -> Any:
+    """Parse a JSON file. Raises OSError / ValueError like json.load."""
+    with open(path, "rb") as f:
+        return json_loads(f.read())
+
+
+def response_json(res: Any) -> Any:
+    """Drop-in for `res.json()` on requests / replay responses (UTF-8 bodies)."""
+    return json_loads(res.content)
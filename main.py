@@ -1,21 +1,45 @@
 
+import time
+_BOOT_T0 = time.perf_counter()  # origin of the boot timeline (boot_mark / --profile-startup)
 import os
+import sys
 import json
-import time
 import asyncio
+import atexit
 import base64
 import re
 import threading
+import socket
+import random
+from types import SimpleNamespace
+import functools
+from collections import deque
 import logging
 import requests
 import html
 from urllib.parse import urlparse, parse_qs
 from typing import Any, Dict, Optional, List, Tuple
 
-from flask import Flask
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, NetworkError, RetryAfter
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
 
+from swapflow import SwapFlow
+from tradestore import TradeStore
+from candles import CandleBook, TIMEFRAMES
+from httpclient import http_get, init_http_capture  # upstream metrics + HTTP_CAPTURE_MODE
+from sharding import Coordinator
+from asyncweb import WebApp
+from buylink import BuySender, serve_buys
+from cursorjournal import CursorJournal, apply_records, cursor_baseline, cursor_diff, replay as replay_journal
+from jsoncodec import BACKEND as JSON_BACKEND, json_dumps, json_dumps_pretty, read_json, response_json
+from metrics import Counter, Gauge, Histogram, render as render_metrics
+from tonprice import PriceBook
+from holders import HolderBook
+from tonaddr import normalize_address
+
+_BOOT_IMPORTS = time.perf_counter() - _BOOT_T0
+
 # -------------------- LOGGING --------------------
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO").upper(),
@@ -23,6 +47,59 @@ logging.basicConfig(
 )
 log = logging.getLogger("spyton")
 
+# -------------------- BOOT TIMELINE --------------------
+# First time each boot phase happened, in seconds since main.py started importing.
+# A Fly machine cold-starts on every wake-up; everything before the first poll is missed buys.
+PROFILE_STARTUP = "--profile-startup" in sys.argv or os.getenv("PROFILE_STARTUP", "") == "1"
+PROFILE_STARTUP_TIMEOUT = float(os.getenv("PROFILE_STARTUP_TIMEOUT", "120"))  # report even if no buy comes
+BOOT_MARKS: Dict[str, float] = {"imports": _BOOT_IMPORTS}
+_BOOT_REPORTED = False
+
+def boot_mark(name: str):
+    if name in BOOT_MARKS:
+        return
+    BOOT_MARKS[name] = time.perf_counter() - _BOOT_T0
+    if PROFILE_STARTUP:
+        log.warning("boot: %s at %.3fs", name, BOOT_MARKS[name])
+        if name == "first_alert":
+            print_boot_report()
+
+def _interpreter_start() -> Optional[float]:
+    """Seconds the process ran before main.py started (Linux only)."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - started
+        return max(0.0, age - (time.perf_counter() - _BOOT_T0))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def boot_summary() -> Dict[str, Optional[float]]:
+    polls = [t for n, t in BOOT_MARKS.items() if n.startswith("tick:") and n[5:] in TRACKER_JOBS]
+    return {
+        "first_poll": min(polls) if polls else None,
+        "first_buy": BOOT_MARKS.get("first_buy"),
+        "first_alert": BOOT_MARKS.get("first_alert"),
+    }
+
+def print_boot_report():
+    global _BOOT_REPORTED
+    if _BOOT_REPORTED:
+        return
+    _BOOT_REPORTED = True
+    fmt = lambda v: "—" if v is None else f"{v:.3f}s"
+    lines = [f"Startup profile (role={PROCESS_ROLE}, seconds since main.py started importing)"]
+    pre = _interpreter_start()
+    if pre is not None:
+        lines.append(f"  {-pre:9.3f}  process start (interpreter, site-packages)")
+    lines += [f"  {t:9.3f}  {n}" for n, t in sorted(BOOT_MARKS.items(), key=lambda kv: kv[1])]
+    s = boot_summary()
+    lines.append(f"  time-to-first-poll  {fmt(s['first_poll'])}")
+    lines.append(f"  time-to-first-buy   {fmt(s['first_buy'])}")
+    lines.append(f"  time-to-first-alert {fmt(s['first_alert'])}")
+    print("\n".join(lines), flush=True)
+
 # ============================================================
 # SpyTON Detector
 # - STON.fi buy detection via STON exported events feed (unchanged)
@@ -37,11 +114,13 @@ log = logging.getLogger("spyton")
 #     • /setaddr <WATCH_ID or blum:slug> <JETTON_ADDRESS>
 #
 # Leaderboard:
-# - 6H movers (DexScreener priceChange.h6) + clickable TG + no preview
+# - 6H movers (local candles / swap flow, see candles.py) + clickable TG + no preview
 # ============================================================
 
 # -------------------- ENV --------------------
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
+# Bot API endpoint; point at fake_telegram.py for load tests (e.g. http://127.0.0.1:8081/bot)
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
 # MASTER SpyTON channel (hard-coded)
 MASTER_CHANNEL_ID = -1002379265999
 # CHANNEL_ID is kept for backward compatibility but master always receives posts.
@@ -100,6 +179,8 @@ DEDUST_ENABLED = os.getenv("DEDUST_ENABLED", "1") == "1"
 DEDUST_POLL_LIMIT = int(os.getenv("DEDUST_POLL_LIMIT", "50"))
 DEDUST_DEBUG = os.getenv("DEDUST_DEBUG", "0") == "1"
 DEDUST_API_BASE = os.getenv("DEDUST_API_BASE", "https://api.dedust.io").rstrip("/")
+# Max TonAPI requests in flight per DeDust poll (pools are fetched concurrently)
+DEDUST_CONCURRENCY = int(os.getenv("DEDUST_CONCURRENCY", "16" if TONAPI_KEY else "6"))
 
 # Poll intervals (seconds)
 STON_POLL_INTERVAL = int(os.getenv("STON_POLL_INTERVAL", "2"))
@@ -120,6 +201,7 @@ BLUM_EARLY_ENABLED = os.getenv("BLUM_EARLY_ENABLED", "1") == "1"
 BLUM_POLL_LIMIT = int(os.getenv("BLUM_POLL_LIMIT", "12"))  # txs pulled per jetton per poll
 BLUM_POLL_INTERVAL = int(os.getenv("BLUM_POLL_INTERVAL", "14"))  # seconds
 BLUM_DEBUG = os.getenv("BLUM_DEBUG", "0") == "1"
+BLUM_CONCURRENCY = int(os.getenv("BLUM_CONCURRENCY", "8" if TONAPI_KEY else "4"))
 
 # -------------------- LEADERBOARD FILTERS / MODES --------------------
 LB_MIN_LIQ_USD = float(os.getenv("LB_MIN_LIQ_USD", "0"))
@@ -130,6 +212,8 @@ LB_SHOW_WHALES = os.getenv("LB_SHOW_WHALES", "1") == "1"
 LB_MAX_GAINERS = int(os.getenv("LB_MAX_GAINERS", "10"))
 LB_MAX_LOSERS = int(os.getenv("LB_MAX_LOSERS", "10"))
 LB_MAX_WHALES = int(os.getenv("LB_MAX_WHALES", "10"))
+# Leaderboard / auto ranks window, computed from swaps the trackers see (minutes)
+LB_WINDOW_MINUTES = int(os.getenv("LB_WINDOW_MINUTES", "360"))
 
 # -------------------- SPEED / POSTING --------------------
 # FAST_POST_MODE posts immediately with minimal info, then edits the message
@@ -137,14 +221,22 @@ LB_MAX_WHALES = int(os.getenv("LB_MAX_WHALES", "10"))
 FAST_POST_MODE = os.getenv("FAST_POST_MODE", "1") == "1"
 # In FAST_POST_MODE, these expensive lookups are moved to the background.
 FAST_STATS_TIMEOUT = float(os.getenv("FAST_STATS_TIMEOUT", "3"))
-# Holders are shown in the premium template. We fetch them in the background and edit the message.
-# Default ON so you don't get "Holders: N/A".
+# Holders are shown in the premium template, estimated from baselines holders_job reconciles
+# in the background (holders.py). Default ON so you don't get "Holders: N/A".
 FAST_HOLDERS_ENABLED = os.getenv("FAST_HOLDERS_ENABLED", "1") == "1"
+# Detection latency (on-chain utime -> Telegram). Admin gets a DM when the p95
+# chain->send latency of a source goes above this many seconds (0 = off).
+LATENCY_P95_ALERT_SECONDS = float(os.getenv("LATENCY_P95_ALERT_SECONDS", "60"))
+LATENCY_ALERT_MIN_SAMPLES = int(os.getenv("LATENCY_ALERT_MIN_SAMPLES", "20"))
+LATENCY_ALERT_COOLDOWN = int(os.getenv("LATENCY_ALERT_COOLDOWN", "1800"))
+LATENCY_SAMPLES_MAX = int(os.getenv("LATENCY_SAMPLES_MAX", "500"))  # recent buys kept per source
 
 # -------------------- STON API --------------------
-STON_BASE = "https://api.ston.fi"
+STON_BASE = os.getenv("STON_BASE", "https://api.ston.fi").rstrip("/")
 LATEST_BLOCK_URL = f"{STON_BASE}/export/dexscreener/v1/latest-block"
 EVENTS_URL = f"{STON_BASE}/export/dexscreener/v1/events"
+STON_EVENTS_CHUNK = int(os.getenv("STON_EVENTS_CHUNK", "50"))  # blocks per events request
+STON_CATCHUP_MAX_BLOCKS = int(os.getenv("STON_CATCHUP_MAX_BLOCKS", "600"))  # furthest a resumed cursor is replayed
 STON_HEADERS = {
     "User-Agent": "Mozilla/5.0",
     "Accept": "application/json,text/plain,*/*",
@@ -152,12 +244,41 @@ STON_HEADERS = {
 }
 
 # -------------------- DEXSCREENER --------------------
-DEX_PAIR_URL = "https://api.dexscreener.com/latest/dex/pairs/ton"
-DEX_TOKEN_URL = "https://api.dexscreener.com/latest/dex/tokens"
+DEXSCREENER_BASE = os.getenv("DEXSCREENER_BASE", "https://api.dexscreener.com").rstrip("/")
+DEX_PAIR_URL = f"{DEXSCREENER_BASE}/latest/dex/pairs/ton"
+DEX_TOKEN_URL = f"{DEXSCREENER_BASE}/latest/dex/tokens"
 
 # -------------------- FILES --------------------
 DATA_FILE = "data.json"
 STATE_FILE = "state.json"
+# data.json is written indented (hand-edited config); 0 writes it compact like state.json
+DATA_JSON_PRETTY = os.getenv("DATA_JSON_PRETTY", "1") == "1"
+# Append-only columnar history of every detected buy (see tradestore.py)
+TRADE_STORE_ENABLED = os.getenv("TRADE_STORE_ENABLED", "1") == "1"
+TRADES_DIR = os.getenv("TRADES_DIR", "trades")
+# Per-pool OHLCV candles from detected swaps (see candles.py); closed bars persisted here
+CANDLES_ENABLED = os.getenv("CANDLES_ENABLED", "1") == "1"
+CANDLES_DIR = os.getenv("CANDLES_DIR", "candles")
+CANDLE_BARS = int(os.getenv("CANDLE_BARS", "720"))  # bars kept in memory per timeframe
+
+# -------------------- SHARDING --------------------
+# Set SHARD_DB (a SQLite file every instance can reach) to run several instances
+# that split the tracked pools; see sharding.py. Empty = single instance.
+SHARD_DB = os.getenv("SHARD_DB", "").strip()
+# Stable per instance (state file + ownership survive restarts); set it explicitly
+# when running several instances on one host
+SHARD_ID = os.getenv("SHARD_ID", "").strip() or socket.gethostname()
+SHARD_HEARTBEAT_INTERVAL = float(os.getenv("SHARD_HEARTBEAT_INTERVAL", "5"))
+SHARD_TTL = float(os.getenv("SHARD_TTL", "20"))  # silent this long = gone, pools move
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+
+# -------------------- PROCESS ROLE --------------------
+# "all" = one process (default). Two-process mode: PROCESS_ROLE=ingest runs the trackers and
+# ships each buy over BUY_LINK_SOCKET (see buylink.py); PROCESS_ROLE=post runs PTB (commands,
+# jobs, rendering, sending). Give the two processes different PORTs.
+PROCESS_ROLE = os.getenv("PROCESS_ROLE", "all").strip().lower()
+BUY_LINK_SOCKET = os.getenv("BUY_LINK_SOCKET", "/tmp/spyton-buys.sock")
+BUY_LINK_QUEUE_MAX = int(os.getenv("BUY_LINK_QUEUE_MAX", "10000"))
 
 # -------------------- RUNTIME --------------------
 LAST_HTTP_INFO: str = "No requests yet"
@@ -168,8 +289,47 @@ SEEN_TX_DEDUST: Dict[str, float] = {}
 SEEN_TX_BLUM: Dict[str, float] = {}
 SEEN_TTL_SECONDS = 3600
 
+# Prometheus metrics (served at /metrics; see metrics.py)
+M_JOB_SECONDS = Histogram("spyton_job_duration_seconds", "Job tick duration.")
+M_JOB_ERRORS = Counter("spyton_job_errors_total", "Job ticks that raised.")
+M_JOB_SKIPS = Counter("spyton_job_overlap_skips_total", "Job ticks skipped because the previous tick was still running.")
+M_JOB_TIMEOUTS = Counter("spyton_job_deadline_exceeded_total", "Job ticks cancelled for running past their deadline.")
+M_JOB_DRIFT = Histogram(
+    "spyton_job_start_drift_seconds",
+    "Seconds between a tick's intended start (incl. jitter) and when it actually ran.",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+M_CACHE = Counter("spyton_cache_lookups_total", "Cache lookups by result (hit/miss).")
+M_DEDUPE = Counter("spyton_dedupe_suppressed_total", "Transactions dropped as already posted.")
+M_OUTBOX = Counter("spyton_outbox_total", "Outbox delivery attempts by result (delivered / retry / expired / unacked).")
+M_MIN_BUY_UNPRICED = Counter("spyton_min_buy_unpriced_total", "Group posts whose USD min-buy was not checked (no TON price yet).")
+M_STALE = Counter("spyton_stale_buys_total", "Buys older than CATCHUP_MAX_SECONDS at post time (aggregated, not posted).")
+M_TG_SECONDS = Histogram("spyton_telegram_request_seconds", "Telegram Bot API call latency.")
+M_TG_RETRY_AFTER = Counter("spyton_telegram_retry_after_total", "Telegram RetryAfter (flood control) responses.")
+M_TG_ERRORS = Counter("spyton_telegram_errors_total", "Telegram Bot API call failures.")
+M_QUEUE = Gauge("spyton_queue_depth", "Work waiting or in flight.")
+M_LOOP_LAG = Histogram("spyton_event_loop_lag_seconds", "Event loop scheduling lag.", (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+M_LOOP_LAG_LAST = Gauge("spyton_event_loop_lag_last_seconds", "Most recent event loop lag sample.")
+M_DETECT_LATENCY = Histogram(
+    "spyton_detection_latency_seconds",
+    "Seconds from on-chain utime to each pipeline stage, per source.",
+    (1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 300, 600),
+)
+M_CACHE_SIZE = Gauge("spyton_cache_entries", "Entries held per in-memory cache.")
+M_STATE_WRITES = Counter("spyton_state_writes_total", "State persistence writes (kind=full: state.json rewrite, kind=journal: cursor append).")
+M_STATE_BYTES = Counter("spyton_state_write_bytes_total", "Bytes written persisting state, by kind.")
+M_TON_PRICE = Gauge("spyton_ton_price_usd", "TON/USD median over fresh sources (0 while none is fresh).")
+M_TON_PRICE_AGE = Gauge("spyton_ton_price_age_seconds", "Age of the newest sample behind the TON/USD price.")
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+# Job supervisor: a tick is cancelled after max(JOB_DEADLINE_MIN, interval * JOB_DEADLINE_FACTOR)
+# seconds; starts are jittered by up to JOB_JITTER * interval so jobs don't fire in lockstep.
+JOB_DEADLINE_FACTOR = float(os.getenv("JOB_DEADLINE_FACTOR", "10"))
+JOB_DEADLINE_MIN = float(os.getenv("JOB_DEADLINE_MIN", "30"))
+JOB_JITTER = float(os.getenv("JOB_JITTER", "0.1"))
 
-# Prevent overlapping polls (can cause duplicates/spam)
+
+# Prevent overlapping polls (can cause duplicates/spam); held by supervised_job
 DEDUST_POLL_LOCK = asyncio.Lock()
 STON_POLL_LOCK = asyncio.Lock()
 BLUM_POLL_LOCK = asyncio.Lock()
@@ -185,41 +345,108 @@ STATE: Dict[str, Any] = {
     "blum_last_lt": {},     # { jetton_master: last_lt_int }  (NEW)
 }
 
-# ===================== UPTIMEROBOT WEB SERVER =====================
-app_web = Flask(__name__)
-
-@app_web.get("/")
-def home():
-    return "SpyTON detector alive", 200
-
-@app_web.get("/uptimerobot")
-def uptimerobot():
-    return "ok", 200
-
-@app_web.get("/health")
-def health():
-    return "healthy", 200
-
-def run_web():
-    port = int(os.getenv("PORT", "8080"))
-    app_web.run(host="0.0.0.0", port=port, debug=False)
+# ===================== WEB (UptimeRobot / health / status / metrics) =====================
+# Served from the bot's own event loop (asyncweb.py): handlers read DATA / STATE / metrics
+# in place, and /health reflects whether the trackers are actually ticking.
+WEB = WebApp()
+WEB_SERVER: Optional[asyncio.AbstractServer] = None
+PORT = int(os.getenv("PORT", "8080"))
+INGEST_WEB_PORT = int(os.getenv("INGEST_WEB_PORT", "0"))  # PROCESS_ROLE=ingest: 0 = no web port
+
+@WEB.get("/")
+def web_home(req):
+    return 200, "SpyTON detector alive"
+
+@WEB.get("/uptimerobot")
+def web_uptimerobot(req):
+    return 200, "ok"
+
+@WEB.get("/health")
+def web_health(req):
+    stale = {name: st["since_ok"] for name, st in tracker_liveness().items() if st["stale"]}
+    if stale:
+        return 503, "stale: " + ", ".join(f"{n} ({s:.0f}s)" for n, s in sorted(stale.items()))
+    return 200, "healthy"
+
+@WEB.get("/status")
+def web_status(req):
+    pairs = DATA.get("pairs", {})
+    watch = DATA.get("watch", {})
+    return 200, {
+        "role": PROCESS_ROLE,
+        "uptime": round(time.perf_counter() - _BOOT_T0, 1),
+        "shard": None if SHARD is None else {
+            "id": SHARD_ID, "leader": is_leader(), "members": len(SHARD.members), "rebalances": SHARD.rebalances,
+        },
+        "boot": boot_summary(),
+        "trackers": tracker_liveness(),
+        "jobs": job_summary(),
+        "latency": latency_summary(),
+        "pairs": len(pairs) if isinstance(pairs, dict) else 0,
+        "watch": len(watch) if isinstance(watch, dict) else 0,
+        "ton_usd": ton_price_cache_value(),
+        "ton_price": TON_PRICE.status(),
+        "holders": HOLDERS.stats(),
+        "ston_last_block": STATE.get("ston_last_block"),
+        "events_pulled_last": LAST_EVENTS_COUNT,
+        "last_http": LAST_HTTP_INFO,
+        "tonapi_paging": TONAPI_PAGING_STATS,
+        "state_writes": {k: M_STATE_WRITES.get(kind=k) for k in ("full", "journal")},
+        "outbox": {"pending": len(STATE.get("outbox") or {}),
+                   **{k: M_OUTBOX.get(result=k) for k in ("delivered", "retry", "expired", "unacked")}},
+        "blum_last_cycle": BLUM_LAST_CYCLE,
+        "web_requests": WEB.requests,
+    }
 
-# --- Start web keep-alive immediately (Replit .replit.app) ---
-_WEB_STARTED = False
+@WEB.get("/api/flow/*")
+async def web_api_flow(req):
+    """Per-token volume + top buyers from the local trade store."""
+    token = req.tail
+    store = get_trade_store()
+    if store is None:
+        return 503, {"error": "trade store disabled"}
+    try:
+        hours = max(0.1, min(float(req.query.get("hours", "6")), 24 * 30))
+    except ValueError:
+        hours = 6.0
+    since = time.time() - hours * 3600
+    volume = await _to_thread(store.token_volume, token, since)
+    top = await _to_thread(store.top_buyers, token, since, None, 10)
+    return 200, {
+        "token": token,
+        "hours": hours,
+        "volume": volume,
+        "top_buyers": [{"buyer": b, "ton": round(t, 4)} for b, t in top],
+    }
 
-def start_web_server_once():
-    global _WEB_STARTED
-    if _WEB_STARTED:
+@WEB.get("/metrics")
+def web_metrics(req):
+    for name, cache in named_caches():
+        M_CACHE_SIZE.set(len(cache), cache=name)
+    price = TON_PRICE.status()
+    M_TON_PRICE.set(0.0 if price["stale"] else price["usd"])
+    M_TON_PRICE_AGE.set(price["age"] or 0.0)
+    return 200, render_metrics(), "text/plain; version=0.0.4; charset=utf-8"
+
+async def start_web(port: int):
+    """Bind the web endpoints on the running loop (no-op if already bound there)."""
+    global WEB_SERVER
+    loop = asyncio.get_running_loop()
+    if WEB_SERVER is not None and WEB_SERVER.get_loop() is loop:
         return
     try:
-        t = threading.Thread(target=run_web, daemon=True)
-        t.start()
-        _WEB_STARTED = True
-    except Exception as e:
-        # Don't crash the bot if web server fails
-        print("⚠️ Failed to start keep-alive web server:", e)
+        WEB_SERVER = await WEB.start("0.0.0.0", port)
+    except OSError as e:
+        # Don't crash the bot if the port is taken
+        log.warning("web server not started on port %s: %s", port, e)
+        return
+    boot_mark("web_ready")
 
-start_web_server_once()
+async def stop_web():
+    global WEB_SERVER
+    if WEB_SERVER is not None:
+        WEB_SERVER.close()
+        WEB_SERVER = None
 
 # --- Optional self-ping keep-warm loop ---
 _PING_STARTED = False
@@ -249,13 +476,296 @@ def start_self_ping_once():
     except Exception as e:
         print("⚠️ Failed to start self-ping loop:", e)
 
-start_self_ping_once()
-
 
 # ===================== ASYNC HELPERS =====================
 async def _to_thread(fn, *args, **kwargs):
     return await asyncio.to_thread(fn, *args, **kwargs)
 
+def timed_job(fn):
+    """Wrap a JobQueue callback so every tick is timed into M_JOB_SECONDS."""
+    @functools.wraps(fn)
+    async def _job(context):
+        t0 = time.perf_counter()
+        try:
+            return await fn(context)
+        except Exception:
+            M_JOB_ERRORS.inc(job=fn.__name__)
+            raise
+        finally:
+            M_JOB_SECONDS.observe(time.perf_counter() - t0, job=fn.__name__)
+    return _job
+
+async def tg_call(method: str, coro):
+    """Await a Telegram Bot API call, recording latency / RetryAfter / errors."""
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    except RetryAfter:
+        M_TG_RETRY_AFTER.inc(method=method)
+        raise
+    except Exception as e:
+        M_TG_ERRORS.inc(method=method, error=type(e).__name__)
+        raise
+    finally:
+        M_TG_SECONDS.observe(time.perf_counter() - t0, method=method)
+
+async def loop_lag_monitor():
+    """Sleep LOOP_LAG_INTERVAL in a loop; the overshoot is how long the loop was busy."""
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, loop.time() - t0 - LOOP_LAG_INTERVAL)
+        M_LOOP_LAG.observe(lag)
+        M_LOOP_LAG_LAST.set(lag)
+
+def _on_job_max_instances(event):
+    # APScheduler skips a tick when the previous run of that job hasn't finished
+    name = event.job_id
+    try:
+        job = _SCHEDULER.get_job(event.job_id) if _SCHEDULER else None
+        name = job.name if job else name
+    except Exception:
+        pass
+    M_JOB_SKIPS.inc(job=name)
+
+def _on_job_submitted(event):
+    # Intended (jittered) fire time, read back by supervised_job for drift
+    if event.scheduled_run_times:
+        JOB_DUE[event.job_id] = event.scheduled_run_times[-1].timestamp()
+
+_SCHEDULER = None
+JOB_DUE: Dict[str, float] = {}          # APScheduler job id -> intended start (unix ts)
+JOB_LOCKS: Dict[str, asyncio.Lock] = {}  # job name -> single-flight lock
+JOB_DEADLINES: Dict[str, float] = {}     # job name -> seconds
+JOB_INTERVALS: Dict[str, float] = {}     # job name -> seconds
+JOB_LAST_OK: Dict[str, float] = {}       # job name -> unix ts the last tick finished within its deadline
+
+def supervised_job(
+    fn,
+    interval: float,
+    lock: Optional[asyncio.Lock] = None,
+    deadline: Optional[float] = None,
+    leader_only: bool = False,
+):
+    """
+    Wrap a JobQueue callback: single-flight on `lock` (jobs sharing state share
+    a lock; skipped ticks count into M_JOB_SKIPS), cancel the tick after
+    `deadline` seconds, record start drift and duration (timed_job).
+    leader_only jobs are no-ops on instances that aren't the shard leader.
+    """
+    name = fn.__name__
+    lock = JOB_LOCKS.setdefault(name, lock or asyncio.Lock())
+    deadline = float(deadline or max(JOB_DEADLINE_MIN, interval * JOB_DEADLINE_FACTOR))
+    JOB_DEADLINES[name] = deadline
+    JOB_INTERVALS[name] = float(interval)
+    timed = timed_job(fn)
+
+    @functools.wraps(fn)
+    async def _job(context):
+        aps_job = getattr(getattr(context, "job", None), "job", None)
+        due = JOB_DUE.pop(getattr(aps_job, "id", None), None)
+        if due is not None:
+            M_JOB_DRIFT.observe(max(0.0, time.time() - due), job=name)
+        if leader_only and not is_leader():
+            return
+        if lock.locked():
+            M_JOB_SKIPS.inc(job=name)
+            return
+        async with lock:
+            boot_mark(f"tick:{name}")
+            try:
+                out = await asyncio.wait_for(timed(context), timeout=deadline)
+                JOB_LAST_OK[name] = time.time()
+                boot_mark(f"tick_done:{name}")
+                return out
+            except asyncio.TimeoutError:
+                # worker threads started by the tick finish on their own; the lock is released now
+                M_JOB_TIMEOUTS.inc(job=name)
+                log.warning("job %s exceeded its %.0fs deadline; tick cancelled", name, deadline)
+    return _job
+
+def schedule_job(
+    job_queue,
+    fn,
+    interval: float,
+    first: float,
+    lock: Optional[asyncio.Lock] = None,
+    deadline: Optional[float] = None,
+    leader_only: bool = False,
+):
+    jitter = interval * JOB_JITTER
+    job_queue.run_repeating(
+        supervised_job(fn, interval, lock, deadline, leader_only),
+        interval=interval,
+        first=first,
+        job_kwargs={"jitter": jitter} if jitter > 0 else None,
+    )
+
+def job_summary() -> Dict[str, Dict[str, float]]:
+    """Per-job drift p95 / duration p95 (bucket bounds) and skip / timeout counts, for /status."""
+    out: Dict[str, Dict[str, float]] = {}
+    for name, deadline in JOB_DEADLINES.items():
+        out[name] = {
+            "drift_p95": M_JOB_DRIFT.quantile(0.95, job=name),
+            "run_p95": M_JOB_SECONDS.quantile(0.95, job=name),
+            "skips": M_JOB_SKIPS.get(job=name),
+            "timeouts": M_JOB_TIMEOUTS.get(job=name),
+            "deadline": deadline,
+        }
+    return out
+
+def tracker_liveness(now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """Trackers scheduled in this process: seconds since the last tick that finished, and
+    whether that is longer than a tick may legitimately take (deadline + one interval)."""
+    now = now or time.time()
+    started = now - (time.perf_counter() - _BOOT_T0)
+    out: Dict[str, Dict[str, Any]] = {}
+    for name in TRACKER_JOBS:
+        if name not in JOB_INTERVALS:
+            continue  # runs in the other process (PROCESS_ROLE=post)
+        since_ok = now - JOB_LAST_OK.get(name, started)
+        out[name] = {
+            "since_ok": round(since_ok, 1),
+            "stale": since_ok > JOB_DEADLINES[name] + JOB_INTERVALS[name],
+        }
+    return out
+
+def _cache_stat(cache: str, hit: bool):
+    M_CACHE.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ===================== SHARDING =====================
+SHARD: Optional[Coordinator] = None
+# Per-pool cursors in STATE that follow a pool to its next owner (blum is keyed by token)
+SHARD_CURSOR_KINDS = ("ston_last_lt_map", "dedust_last_lt", "blum_last_lt")
+SHARD_REMOTE_FLOW: Dict[str, Dict[str, Any]] = {}  # leader: other instances' LB-window swap flow
+_SHARD_PUBLISHED: Dict[str, Dict[str, int]] = {}  # cursors already in the store (diff publishing)
+
+def init_sharding():
+    """Join the shard group from SHARD_DB (no-op when unset). Each instance keeps its own state file."""
+    global SHARD, STATE_FILE
+    if not SHARD_DB or SHARD is not None:
+        return
+    SHARD = Coordinator(SHARD_DB, SHARD_ID, ttl=SHARD_TTL, heartbeat_interval=SHARD_HEARTBEAT_INTERVAL, vnodes=SHARD_VNODES)
+    root, ext = os.path.splitext(STATE_FILE)
+    STATE_FILE = f"{root}.{SHARD_ID}{ext}"
+    SHARD.heartbeat()
+    atexit.register(SHARD.leave)
+    log.warning("Sharded mode: instance %s via %s (%d members, leader=%s)", SHARD_ID, SHARD_DB, len(SHARD.members), SHARD.leader_id)
+
+def shard_owns(pool: str, token_addr: str = "") -> bool:
+    """Pools are placed by token, so every pool of a token (and its swap flow) lives on one instance."""
+    if SHARD is None:
+        return True
+    return SHARD.owns((token_addr or "").strip() or pool)
+
+def is_leader() -> bool:
+    return SHARD is None or SHARD.leader()
+
+def flow_windows(now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """LB-window swap flow per token: local, plus (on the leader) what the other instances published."""
+    local = SWAP_FLOW.windows(LB_WINDOW_MINUTES, now)
+    if not SHARD_REMOTE_FLOW:
+        return local
+    merged = dict(SHARD_REMOTE_FLOW)
+    merged.update({k: w for k, w in local.items() if w.get("buys") or k not in merged})
+    return merged
+
+def _shard_sync(pool_token: Dict[str, str], cursors: Dict[str, Dict[str, int]], flow: Dict[str, Any], lead_out: Dict[str, Any]) -> Dict[str, Any]:
+    """Blocking part of a heartbeat (worker thread): lease, cursors, aggregates."""
+    key_of = lambda kind, k: k if kind == "blum_last_lt" else (pool_token.get(k) or k)
+
+    # Publish cursors that moved since the last heartbeat (before ownership can change)
+    for kind, m in cursors.items():
+        sent = _SHARD_PUBLISHED.setdefault(kind, {})
+        diff = {k: v for k, v in m.items() if v and sent.get(k) != v}
+        if diff:
+            SHARD.put_cursors(kind, diff)
+            sent.update(diff)
+
+    changed = SHARD.heartbeat()
+    out: Dict[str, Any] = {"adopt": {}}
+    if changed:
+        # Resume newly owned pools from the shared cursor (max-merged by the caller)
+        for kind in SHARD_CURSOR_KINDS:
+            keys = [k for k in (lead_out["blum_tokens"] if kind == "blum_last_lt" else pool_token) if SHARD.owns(key_of(kind, k))]
+            out["adopt"][kind] = SHARD.get_cursors(kind, keys)
+        log.warning("Shard rebalance: members=%s leader=%s", SHARD.members, SHARD.leader_id)
+
+    SHARD.put(f"flow:{SHARD.id}", flow)
+    if SHARD.leader():
+        SHARD.put("ton_usd", lead_out["ton_usd"])
+        SHARD.put("auto_ranks", lead_out["auto_ranks"])
+        remote: Dict[str, Any] = {}
+        for m in SHARD.members:
+            if m != SHARD.id:
+                remote.update(SHARD.get(f"flow:{m}", {}) or {})
+        out["flow"] = remote
+    else:
+        out["ton_usd"] = SHARD.get("ton_usd")
+        out["auto_ranks"] = SHARD.get("auto_ranks")
+    return out
+
+async def shard_heartbeat_job(context: ContextTypes.DEFAULT_TYPE):
+    """Keep membership / leadership fresh, move cursors with pools, share leader outputs.
+
+    Also hands Telegram update polling to the leader: one bot token can only
+    have one getUpdates consumer.
+    """
+    global SHARD_REMOTE_FLOW, AUTO_RANKS, AUTO_RANK_TS
+    if SHARD is None:
+        return
+    pool_token = {
+        pid: (rec.get("token_address") or "").strip()
+        for pid, rec in (DATA.get("pairs") or {}).items()
+        if isinstance(rec, dict)
+    }
+    blum_tokens = [
+        (rec.get("token_address") or "").strip()
+        for rec in (DATA.get("watch") or {}).values()
+        if isinstance(rec, dict) and (rec.get("token_address") or "").strip()
+    ]
+    cursors = {
+        kind: {k: safe_int(v) or 0 for k, v in STATE.get(kind).items()}
+        for kind in SHARD_CURSOR_KINDS
+        if isinstance(STATE.get(kind), dict)
+    }
+    flow = {k: w for k, w in SWAP_FLOW.windows(LB_WINDOW_MINUTES).items() if w.get("buys")}
+    lead_out = {"ton_usd": TON_PRICE.value(), "auto_ranks": AUTO_RANKS, "blum_tokens": blum_tokens}
+
+    res = await _to_thread(_shard_sync, pool_token, cursors, flow, lead_out)
+
+    adopted = 0
+    for kind, got in res["adopt"].items():
+        m = STATE.get(kind)
+        if not isinstance(m, dict):
+            m = STATE[kind] = {}
+        for k, lt in got.items():
+            if lt > (safe_int(m.get(k)) or 0):
+                m[k] = lt
+                adopted += 1
+    if adopted:
+        save_cursors()
+
+    if SHARD.leader():
+        SHARD_REMOTE_FLOW = res.get("flow") or {}
+    else:
+        SHARD_REMOTE_FLOW = {}
+        if res.get("ton_usd"):
+            TON_PRICE.observe("shard", res["ton_usd"])
+        if isinstance(res.get("auto_ranks"), dict):
+            AUTO_RANKS = res["auto_ranks"]
+            AUTO_RANK_TS = time.time()
+
+    updater = getattr(context.application, "updater", None)
+    if updater is not None:
+        if SHARD.leader() and not updater.running:
+            await updater.start_polling()
+            log.warning("Shard %s is leader: polling Telegram updates", SHARD_ID)
+        elif not SHARD.leader() and updater.running:
+            await updater.stop()
+            log.warning("Shard %s lost leadership: stopped polling updates", SHARD_ID)
 
 # ===================== UTIL =====================
 def is_admin(uid: int) -> bool:
@@ -468,17 +978,23 @@ def money_fmt(x: Optional[float]) -> str:
         return f"${x/1_000:.2f}K"
     return f"${x:,.0f}"
 
-def _atomic_write(path: str, data: str):
-    tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
+def _atomic_write(path: str, data: bytes, fsync: bool = False):
+    tmp = f"{path}.{os.getpid()}.tmp"  # unique per process (sharded instances share data.json)
+    with open(tmp, "wb") as f:
         f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
     os.replace(tmp, path)
 
+def _dump_data(obj: Dict[str, Any]) -> bytes:
+    # data.json is also edited by hand; state.json is machine-only and always compact
+    return json_dumps_pretty(obj) if DATA_JSON_PRETTY else json_dumps(obj)
+
 def load_data():
     global DATA
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            DATA = json.load(f)
+        DATA = read_json(DATA_FILE)
         if not isinstance(DATA, dict):
             DATA = {"pairs": {}, "watch": {}, "forced_ranks": {}}
         DATA.setdefault("pairs", {})
@@ -496,13 +1012,57 @@ def load_data():
         DATA = {"pairs": {}, "watch": {}, "forced_ranks": {}, "group_mirrors": {}}
 
 def save_data():
-    _atomic_write(DATA_FILE, json.dumps(DATA, ensure_ascii=False, indent=2))
+    if SHARD is not None or PROCESS_ROLE != "all":
+        return _save_data_merged()
+    _atomic_write(DATA_FILE, _dump_data(DATA))
+
+# Written by the trackers per buy. When several processes share data.json, the process that
+# runs a pool's tracker (shard owner / ingest worker) is the writer of these fields; the one
+# handling commands (shard leader / post process) is the writer of everything else.
+SHARD_RUNTIME_FIELDS = ("buyers", "last_buy_ts")
+
+def _save_data_merged():
+    """Read-merge-write data.json under a cross-process lock (see SHARD_RUNTIME_FIELDS)."""
+    import fcntl
+
+    with open(DATA_FILE + ".lock", "a") as lk:
+        fcntl.flock(lk, fcntl.LOCK_EX)
+        try:
+            disk = read_json(DATA_FILE)
+        except Exception:
+            disk = None
+        lead = PROCESS_ROLE != "ingest" and is_leader()
+        if not isinstance(disk, dict):
+            if not lead:
+                return  # nothing to merge into; the leader writes the file
+            disk = {}
+        out, src = (DATA, disk) if lead else (disk, DATA)
+        for section in ("pairs", "watch"):
+            dst_sec, src_sec = out.get(section), src.get(section)
+            if not isinstance(dst_sec, dict) or not isinstance(src_sec, dict):
+                continue
+            for rid, rec in dst_sec.items():
+                other = src_sec.get(rid)
+                if not isinstance(rec, dict) or not isinstance(other, dict):
+                    continue
+                # leader: other instances' runtime fields come from disk;
+                # follower: our runtime fields go onto the disk copy
+                runs_tracker = PROCESS_ROLE != "post" and shard_owns(rid, rec.get("token_address") or "")
+                if runs_tracker != lead:
+                    for fld in SHARD_RUNTIME_FIELDS:
+                        if fld in other:
+                            rec[fld] = other[fld]
+        _atomic_write(DATA_FILE, _dump_data(out))
 
 def load_state():
-    global STATE
+    """(Re)load state.json plus the cursor journal; a no-op while neither changed on disk
+    since this process last read or wrote them (the trackers call this every tick)."""
+    global STATE, _STATE_SIG, _JOURNALED
+    sig = _state_sig()
+    if sig == _STATE_SIG:
+        return
     try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            s = json.load(f)
+        s = read_json(STATE_FILE)
         if isinstance(s, dict):
             STATE.update(s)
         STATE.setdefault("dedust_last_id", {})
@@ -510,6 +1070,8 @@ def load_state():
         STATE.setdefault("dedust_last_ts", {})
         STATE.setdefault("dedust_seen", {})
         STATE.setdefault("blum_last_lt", {})
+        STATE.setdefault("outbox", {})
+        STATE.setdefault("outbox_done", {})
         if not isinstance(STATE["dedust_last_id"], dict):
             STATE["dedust_last_id"] = {}
         if not isinstance(STATE["dedust_last_lt"], dict):
@@ -522,14 +1084,91 @@ def load_state():
             STATE["blum_last_lt"] = {}
     except:
         STATE = {"leaderboard_msg_id": None, "ston_last_block": None, "dedust_last_id": {}, "dedust_last_lt": {}, "blum_last_lt": {}}
+    if JOURNAL_ENABLED:
+        apply_records(STATE, replay_journal(journal_path(), int(STATE.get("journal_gen") or 0)))
+        _JOURNALED = cursor_baseline(STATE, JOURNAL_KINDS)
+    _STATE_SIG = sig
 
 # Auto trend ranks (computed from 6H USD volume)
 AUTO_RANKS: Dict[str, int] = {}
 AUTO_RANK_TS = 0.0
 AUTO_RANK_TTL = int(os.getenv("AUTO_RANK_TTL", "30"))  # seconds
 
+# Cursor journal (cursorjournal.py): tracker cursor moves and outbox changes are appended to <STATE_FILE>.journal
+# by save_cursors(), fsynced every JOURNAL_FSYNC_INTERVAL seconds, and folded into state.json
+# (save_state) once the journal reaches JOURNAL_COMPACT_BYTES or JOURNAL_COMPACT_INTERVAL.
+JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "1") == "1"
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "1"))
+JOURNAL_COMPACT_BYTES = int(os.getenv("JOURNAL_COMPACT_BYTES", str(256 * 1024)))
+JOURNAL_COMPACT_INTERVAL = int(os.getenv("JOURNAL_COMPACT_INTERVAL", "300"))
+# outbox first: an append holding new buys and the cursor moves past them writes the buys first
+JOURNAL_KINDS = ("outbox", "outbox_done") + SHARD_CURSOR_KINDS + ("ston_last_block",)
+CURSOR_JOURNAL: Optional[CursorJournal] = None
+_JOURNALED: Dict[str, Any] = {}  # cursor values already on disk (state.json + journal)
+_JOURNAL_COMPACTED = time.time()
+_STATE_SIG: Any = None           # (mtime, size) of state.json / journal as of our last read or write
+
+def journal_path() -> str:
+    root, _ext = os.path.splitext(STATE_FILE)
+    return f"{root}.journal"
+
+def _state_sig():
+    sig = []
+    for path in (STATE_FILE, journal_path()):
+        try:
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+def _cursor_journal() -> CursorJournal:
+    global CURSOR_JOURNAL
+    if CURSOR_JOURNAL is None:
+        CURSOR_JOURNAL = CursorJournal(journal_path())
+        atexit.register(CURSOR_JOURNAL.close)
+    return CURSOR_JOURNAL
+
 def save_state():
-    _atomic_write(STATE_FILE, json.dumps(STATE, ensure_ascii=False, indent=2))
+    """Rewrite state.json. With the journal on this is also the compaction: the new
+    generation makes the old journal obsolete, so it is started over."""
+    global _STATE_SIG, _JOURNALED, _JOURNAL_COMPACTED
+    if JOURNAL_ENABLED:
+        STATE["journal_gen"] = int(STATE.get("journal_gen") or 0) + 1
+    data = json_dumps(STATE)
+    _atomic_write(STATE_FILE, data, fsync=JOURNAL_ENABLED)
+    M_STATE_WRITES.inc(kind="full")
+    M_STATE_BYTES.inc(len(data), kind="full")
+    if JOURNAL_ENABLED:
+        _cursor_journal().reset(STATE["journal_gen"])
+        _JOURNALED = cursor_baseline(STATE, JOURNAL_KINDS)
+        _JOURNAL_COMPACTED = time.time()
+    _STATE_SIG = _state_sig()
+
+def save_cursors():
+    """Persist tracker cursor moves and outbox changes (JOURNAL_KINDS): only the changed
+    entries, appended to the journal."""
+    global _STATE_SIG
+    if not JOURNAL_ENABLED:
+        return save_state()
+    recs = cursor_diff(STATE, JOURNAL_KINDS, _JOURNALED)
+    if not recs:
+        return
+    n = _cursor_journal().append(int(STATE.get("journal_gen") or 0), recs)
+    M_STATE_WRITES.inc(kind="journal")
+    M_STATE_BYTES.inc(n, kind="journal")
+    _STATE_SIG = _state_sig()
+
+async def journal_job(context: ContextTypes.DEFAULT_TYPE):
+    """Batched fsync of the cursor journal; compacts it into state.json when due."""
+    j = CURSOR_JOURNAL
+    if j is None:
+        return
+    if j.size >= JOURNAL_COMPACT_BYTES or (j.records and time.time() - _JOURNAL_COMPACTED >= JOURNAL_COMPACT_INTERVAL):
+        prune_outbox_done()
+        save_state()
+    else:
+        await _to_thread(j.sync)
 
 def cleanup_seen():
     now = time.time()
@@ -547,33 +1186,109 @@ def buy_badge(ton_amt: float) -> str:
         return "🦐"
     return "🌱"
 
-def ton_price_usd() -> float:
-    if not TON_PRICE_API:
-        return 0.0
-    try:
-        r = requests.get(TON_PRICE_API, timeout=10).json()
-        return float(r["the-open-network"]["usd"])
-    except:
-        return 0.0
+# ===================== TON / USD PRICE =====================
+# Median of several sources (tonprice.py): swaps in stablecoin/TON pools the
+# trackers already see, TON-quoted DexScreener pairs from responses fetched
+# anyway, and the optional HTTP APIs polled by ton_price_cache_job.
+TON_PRICE_MAX_AGE = float(os.getenv("TON_PRICE_MAX_AGE", "300"))  # a source quiet this long is ignored
+TON_PRICE_WINDOW = float(os.getenv("TON_PRICE_WINDOW", "120"))    # per-source median over this window
+# With no fresh source the last good price stands in for this long (alerts mark it "~$"),
+# then the price is 0 and alerts go out unpriced
+TON_PRICE_FALLBACK_MAX_AGE = float(os.getenv("TON_PRICE_FALLBACK_MAX_AGE", "3600"))
+# USD stablecoin jetton masters: a tracked pair of one of these is a price pool (default USD₮)
+TON_PRICE_STABLES = {
+    a.strip() for a in os.getenv("TON_PRICE_STABLES", "EQCxE6mUtQJKFnGfaROTKOt1lZbDiiX1kCixRv7Nw2Id_sDs").split(",")
+    if a.strip()
+}
+# STON stablecoin/TON pools read from the export feed, tracked or not (default: STON.fi TON/USD₮);
+# a pool whose DexScreener pair isn't TON against a USD symbol is ignored
+TON_PRICE_POOLS = {
+    a.strip() for a in os.getenv("TON_PRICE_POOLS", "EQD8TJ8xEWB1SpnRE4d89YO3jl0W0EiBnNS4IBaHaUmdfizE").split(",")
+    if a.strip()
+}
+# HTTP sources: TON_PRICE_API plus a comma-separated TON_PRICE_URLS
+TON_PRICE_URLS = [u.strip() for u in [TON_PRICE_API] + os.getenv("TON_PRICE_URLS", "").split(",") if u.strip()]
+TON_PRICE = PriceBook(TON_PRICE_MAX_AGE, TON_PRICE_WINDOW)
 
-# Simple cache so we don't block every buy on an external price call
+# Last good price, for when no source is fresh (also restored from the snapshot)
 _TON_PRICE_CACHE: Dict[str, float] = {"v": 0.0, "ts": 0.0}
+_TON_PRICE_POOL_LEG: Dict[str, Optional[int]] = {}  # pool -> TON leg (0/1), None: not a price pool
 
-def refresh_ton_price_cache() -> float:
-    """Blocking refresh (call in a thread)."""
-    now = time.time()
-    v = ton_price_usd()
-    _TON_PRICE_CACHE["v"] = float(v or 0.0)
-    _TON_PRICE_CACHE["ts"] = now
-    return float(v or 0.0)
+def _parse_ton_price(js: Any) -> float:
+    """coingecko ({"the-open-network": {"usd": x}}), {"price": x} and {"usd": x} shapes."""
+    if not isinstance(js, dict):
+        return 0.0
+    for k in ("the-open-network", "toncoin", "data"):
+        if isinstance(js.get(k), dict):
+            return _parse_ton_price(js[k])
+    for k in ("usd", "price", "priceUsd"):
+        v = safe_float(js.get(k))
+        if v > 0:
+            return v
+    return 0.0
 
-def ton_price_cache_value() -> float:
-    """Non-blocking getter used during buy posting."""
+def ton_price_usd(url: str) -> float:
     try:
-        return float(_TON_PRICE_CACHE.get("v", 0.0))
+        return _parse_ton_price(response_json(http_get("ton_price", url, timeout=10)))
     except Exception:
         return 0.0
 
+def refresh_ton_price_cache() -> float:
+    """Blocking poll of the HTTP sources (call in a thread)."""
+    for url in TON_PRICE_URLS:
+        v = ton_price_usd(url)
+        if v > 0:
+            TON_PRICE.observe(f"api:{urlparse(url).netloc or url}", v)
+    return ton_price_cache_value()
+
+def ton_price_quote() -> Tuple[float, bool]:
+    """(price, stale): the live median, else the last good price while it is younger than
+    TON_PRICE_FALLBACK_MAX_AGE (stale=True), else (0.0, True)."""
+    v = TON_PRICE.value()
+    if v > 0:
+        _TON_PRICE_CACHE["v"] = v
+        _TON_PRICE_CACHE["ts"] = TON_PRICE.last_ts
+        return v, False
+    if time.time() - safe_float(_TON_PRICE_CACHE.get("ts")) > TON_PRICE_FALLBACK_MAX_AGE:
+        return 0.0, True
+    return safe_float(_TON_PRICE_CACHE.get("v")), True
+
+def ton_price_cache_value() -> float:
+    """Non-blocking getter used during buy posting (see ton_price_quote)."""
+    return ton_price_quote()[0]
+
+def observe_dex_ton_price(pairs: Any):
+    """Feed priceUsd / priceNative of TON-quoted pairs in a DexScreener response into TON_PRICE."""
+    if not isinstance(pairs, list):
+        return
+    for p in pairs:
+        if not isinstance(p, dict) or (p.get("chainId") or "").lower() != "ton":
+            continue
+        if ((p.get("quoteToken") or {}).get("symbol") or "").upper() != "TON":
+            continue
+        usd, native = safe_float(p.get("priceUsd")), safe_float(p.get("priceNative"))
+        if usd > 0 and native > 0:
+            TON_PRICE.observe("dexscreener", usd / native)
+
+def ton_price_pool_leg(pool: str) -> Optional[int]:
+    """TON leg (0=amount0, 1=amount1) of a stablecoin/TON pool, from DexScreener meta. Blocking."""
+    if pool in _TON_PRICE_POOL_LEG:
+        return _TON_PRICE_POOL_LEG[pool]
+    meta = fetch_pair_meta(pool)
+    base, quote = meta.get("base_sym") or "", meta.get("quote_sym") or ""
+    leg = 0 if base == "TON" and "USD" in quote else 1 if quote == "TON" and "USD" in base else None
+    if leg is not None or meta.get("dex_id"):  # a failed lookup is retried after PAIR_CACHE_TTL
+        _TON_PRICE_POOL_LEG[pool] = leg
+    return leg
+
+def observe_ston_price_event(ev: Dict[str, Any], leg: int):
+    """One swap (either direction) in a stablecoin/TON pool: stablecoin amount / TON amount."""
+    a0 = safe_float(ev.get("amount0In")) + safe_float(ev.get("amount0Out"))
+    a1 = safe_float(ev.get("amount1In")) + safe_float(ev.get("amount1Out"))
+    ton, usd = (a0, a1) if leg == 0 else (a1, a0)
+    if ton > 0 and usd > 0:
+        TON_PRICE.observe(f"pool:{ev.get('pairId')}", usd / ton, ston_event_utime(ev) or None)
+
 def to_ton_from_nano(nano: Any) -> float:
     try:
         v = int(str(nano))
@@ -711,11 +1426,11 @@ def parse_addtoken_message_text(msg_text: str) -> Optional[Tuple[str, Optional[s
 def ston_latest_block() -> Optional[int]:
     global LAST_HTTP_INFO
     try:
-        res = requests.get(LATEST_BLOCK_URL, headers=STON_HEADERS, timeout=12)
+        res = http_get("ston", LATEST_BLOCK_URL, headers=STON_HEADERS, timeout=12)
         LAST_HTTP_INFO = f"latest-block status={res.status_code}"
         if res.status_code != 200:
             return None
-        js = res.json()
+        js = response_json(res)
         if isinstance(js, dict) and isinstance(js.get("block"), dict):
             return safe_int(js["block"].get("blockNumber"))
         return None
@@ -727,12 +1442,12 @@ def ston_events(from_block: int, to_block: int) -> List[Dict[str, Any]]:
     global LAST_HTTP_INFO, LAST_EVENTS_COUNT
     params = {"fromBlock": from_block, "toBlock": to_block}
     try:
-        res = requests.get(EVENTS_URL, params=params, headers=STON_HEADERS, timeout=20)
+        res = http_get("ston", EVENTS_URL, params=params, headers=STON_HEADERS, timeout=20)
         LAST_HTTP_INFO = f"events status={res.status_code} params={params}"
         if res.status_code != 200:
             LAST_EVENTS_COUNT = 0
             return []
-        js = res.json()
+        js = response_json(res)
         evs: List[Dict[str, Any]] = []
         if isinstance(js, list):
             evs = [x for x in js if isinstance(x, dict)]
@@ -750,22 +1465,25 @@ def fetch_pair_stats(pair_id: str) -> Dict[str, Any]:
     now = time.time()
     cached = PAIR_CACHE.get(pair_id)
     if cached and (now - cached.get("_ts", 0) < PAIR_CACHE_TTL):
+        _cache_stat("pair_stats", True)
         return cached
+    _cache_stat("pair_stats", False)
 
     out = {"liquidity_usd": None, "marketcap_usd": None, "volume_h6_usd": None, "_ts": now}
     url = f"{DEX_PAIR_URL}/{pair_id}"
     try:
-        res = requests.get(url, timeout=15)
+        res = http_get("dexscreener", url, timeout=15)
         if res.status_code != 200:
             PAIR_CACHE[pair_id] = out
             return out
 
-        js = res.json()
+        js = response_json(res)
         pairs = js.get("pairs") if isinstance(js, dict) else None
         if not isinstance(pairs, list) or not pairs or not isinstance(pairs[0], dict):
             PAIR_CACHE[pair_id] = out
             return out
 
+        observe_dex_ton_price(pairs)
         p0 = pairs[0]
         liq = p0.get("liquidity", {})
         if isinstance(liq, dict):
@@ -793,6 +1511,7 @@ def fetch_pair_stats(pair_id: str) -> Dict[str, Any]:
 
 # ===================== TOKEN STATS FALLBACK =====================
 TOKEN_STATS_CACHE: Dict[str, Dict[str, Any]] = {}
+JETTON_DECIMALS_CACHE: Dict[str, int] = {}
 
 def fetch_token_stats(token_addr: str) -> Dict[str, Any]:
     """Fallback stats using DexScreener token endpoint.
@@ -803,20 +1522,23 @@ def fetch_token_stats(token_addr: str) -> Dict[str, Any]:
     now = time.time()
     cached = TOKEN_STATS_CACHE.get(token_addr)
     if cached and (now - cached.get("_ts", 0) < PAIR_CACHE_TTL):
+        _cache_stat("token_stats", True)
         return cached
+    _cache_stat("token_stats", False)
 
     out = {"liquidity_usd": None, "marketcap_usd": None, "price_usd": None, "_ts": now}
     try:
         url = f"{DEX_TOKEN_URL}/{token_addr}"
-        res = requests.get(url, timeout=15)
+        res = http_get("dexscreener", url, timeout=15)
         if res.status_code != 200:
             TOKEN_STATS_CACHE[token_addr] = out
             return out
-        js = res.json()
+        js = response_json(res)
         pairs = js.get("pairs") if isinstance(js, dict) else None
         if not isinstance(pairs, list) or not pairs:
             TOKEN_STATS_CACHE[token_addr] = out
             return out
+        observe_dex_ton_price(pairs)
 
         best = None
         best_liq = 0.0
@@ -853,15 +1575,17 @@ def fetch_pair_meta(pair_id: str) -> Dict[str, Any]:
     now = time.time()
     cached = PAIR_META_CACHE.get(pair_id)
     if cached and (now - cached.get("_ts", 0) < PAIR_CACHE_TTL):
+        _cache_stat("pair_meta", True)
         return cached
+    _cache_stat("pair_meta", False)
     out = {"base_sym": None, "quote_sym": None, "base_name": None, "quote_name": None, "dex_id": None, "_ts": now}
     try:
         url = f"{DEX_PAIR_URL}/{pair_id}"
-        res = requests.get(url, timeout=15)
+        res = http_get("dexscreener", url, timeout=15)
         if res.status_code != 200:
             PAIR_META_CACHE[pair_id] = out
             return out
-        js = res.json()
+        js = response_json(res)
         pairs = js.get("pairs") if isinstance(js, dict) else None
         if not isinstance(pairs, list) or not pairs or not isinstance(pairs[0], dict):
             PAIR_META_CACHE[pair_id] = out
@@ -927,68 +1651,131 @@ def ensure_pair_ton_leg(pair_id: str) -> Optional[int]:
         except:
             pass
     return ton_leg
-def find_pair_for_token_on_dex(token_address: str, want_dex: str) -> Optional[str]:
-    url = f"{DEX_TOKEN_URL}/{token_address}"
-    try:
-        res = requests.get(url, timeout=20)
-        if res.status_code != 200:
-            return None
-        js = res.json()
-        pairs = js.get("pairs") if isinstance(js, dict) else None
-        if not isinstance(pairs, list):
-            return None
+def _dex_pair_id(p: Dict[str, Any]) -> str:
+    pair_id = (p.get("pairAddress") or p.get("pairId") or p.get("pair") or "").strip()
+    if not pair_id:
+        u = (p.get("url") or "")
+        if "/ton/" in u:
+            pair_id = u.split("/ton/")[-1].split("?")[0].strip()
+    return pair_id
 
-        want = want_dex.lower()
-        best_pair_id = None
-        best_score = -1.0
+def pick_ton_pair(pairs: Any, want_dex: str) -> Optional[Dict[str, Any]]:
+    """Best TON-quoted pair on want_dex ("stonfi"/"dedust") from a DexScreener pairs list.
 
-        for p in pairs:
-            if not isinstance(p, dict):
-                continue
-            dex_id = (p.get("dexId") or "").lower()
-            chain_id = (p.get("chainId") or "").lower()
-            if chain_id != "ton":
-                continue
+    Prefers higher liquidity (USD), then 24h volume.
+    """
+    if not isinstance(pairs, list):
+        return None
 
-            if want == "stonfi" and "ston" not in dex_id:
-                continue
-            if want == "dedust" and "dedust" not in dex_id:
-                continue
+    want = want_dex.lower()
+    best = None
+    best_score = -1.0
 
-            base = p.get("baseToken") or {}
-            quote = p.get("quoteToken") or {}
-            base_sym = (base.get("symbol") or "").upper()
-            quote_sym = (quote.get("symbol") or "").upper()
+    for p in pairs:
+        if not isinstance(p, dict):
+            continue
+        dex_id = (p.get("dexId") or "").lower()
+        chain_id = (p.get("chainId") or "").lower()
+        if chain_id != "ton":
+            continue
 
-            if base_sym == "TON" or quote_sym == "TON":
-                pair_id = (p.get("pairAddress") or p.get("pairId") or p.get("pair") or "").strip()
-                if not pair_id:
-                    u = (p.get("url") or "")
-                    if "/ton/" in u:
-                        pair_id = u.split("/ton/")[-1].split("?")[0].strip()
-                if not pair_id:
-                    continue
+        if want == "stonfi" and "ston" not in dex_id:
+            continue
+        if want == "dedust" and "dedust" not in dex_id:
+            continue
+
+        base = p.get("baseToken") or {}
+        quote = p.get("quoteToken") or {}
+        base_sym = (base.get("symbol") or "").upper()
+        quote_sym = (quote.get("symbol") or "").upper()
 
-                # Choose "best" pool: prefer higher liquidity (USD) then volume (24h)
+        if base_sym == "TON" or quote_sym == "TON":
+            if not _dex_pair_id(p):
+                continue
+
+            # Choose "best" pool: prefer higher liquidity (USD) then volume (24h)
+            liq = 0.0
+            vol = 0.0
+            try:
+                liq = float(((p.get("liquidity") or {}).get("usd") or 0) or 0)
+            except:
                 liq = 0.0
+            try:
+                vol = float(((p.get("volume") or {}).get("h24") or 0) or 0)
+            except:
                 vol = 0.0
-                try:
-                    liq = float(((p.get("liquidity") or {}).get("usd") or 0) or 0)
-                except:
-                    liq = 0.0
-                try:
-                    vol = float(((p.get("volume") or {}).get("h24") or 0) or 0)
-                except:
-                    vol = 0.0
-                score = liq * 1_000_000 + vol
-                if score > best_score:
-                    best_score = score
-                    best_pair_id = pair_id
+            score = liq * 1_000_000 + vol
+            if score > best_score:
+                best_score = score
+                best = p
 
-        return best_pair_id
+    return best
+
+def find_pair_for_token_on_dex(token_address: str, want_dex: str) -> Optional[str]:
+    url = f"{DEX_TOKEN_URL}/{token_address}"
+    try:
+        res = http_get("dexscreener", url, timeout=20)
+        if res.status_code != 200:
+            return None
+        js = response_json(res)
+        pairs = js.get("pairs") if isinstance(js, dict) else None
+        best = pick_ton_pair(pairs, want_dex)
+        return _dex_pair_id(best) if best else None
     except:
         return None
 
+# DexScreener accepts up to 30 comma-separated token addresses per tokens call,
+# and answers with at most ~30 pairs in total; a full answer may leave tokens out
+DEX_TOKENS_BATCH = 30
+DEX_TOKENS_PAIR_CAP = int(os.getenv("DEX_TOKENS_PAIR_CAP", "30"))
+
+def fetch_dex_pairs_for_tokens(token_addresses: List[str]) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """DexScreener tokens lookup for up to DEX_TOKENS_BATCH addresses.
+
+    Returns {token_address: [pair, ...]} (a pair is listed under both its base
+    and quote token; raw and user-friendly forms of an address match). Only
+    answered tokens are keys: when a response hits DEX_TOKENS_PAIR_CAP the
+    batch is split and asked again, and tokens whose request failed are left
+    out. None if nothing was answered.
+    """
+    addrs = list(dict.fromkeys(a for a in token_addresses if a))[:DEX_TOKENS_BATCH]
+    if not addrs:
+        return {}
+    url = f"{DEX_TOKEN_URL}/{','.join(addrs)}"
+    try:
+        res = http_get("dexscreener", url, timeout=20)
+        if res.status_code != 200:
+            return None
+        js = response_json(res)
+    except Exception:
+        return None
+
+    pairs = js.get("pairs") if isinstance(js, dict) else None
+    if not isinstance(pairs, list):
+        pairs = []
+    observe_dex_ton_price(pairs)
+    if len(pairs) >= DEX_TOKENS_PAIR_CAP and len(addrs) > 1:
+        # truncated answer: an absent token isn't a miss, ask again in halves
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        half = len(addrs) // 2
+        for part in (addrs[:half], addrs[half:]):
+            got = fetch_dex_pairs_for_tokens(part)
+            if got:
+                out.update(got)
+        return out or None
+
+    wanted = {normalize_address(a): a for a in addrs}
+    out = {a: [] for a in addrs}
+    for p in pairs:
+        if not isinstance(p, dict):
+            continue
+        for side in ("baseToken", "quoteToken"):
+            tok = p.get(side) or {}
+            addr = wanted.get(normalize_address(tok.get("address") or "")) if isinstance(tok, dict) else None
+            if addr is not None:
+                out[addr].append(p)
+    return out
+
 def find_stonfi_ton_pair_for_token(token_address: str) -> Optional[str]:
     return find_pair_for_token_on_dex(token_address, "stonfi")
 
@@ -1000,10 +1787,10 @@ def fetch_token_telegram_url_from_dexscreener(token_address: str) -> Optional[st
         return None
     url = f"{DEX_TOKEN_URL}/{token_address}"
     try:
-        res = requests.get(url, timeout=20)
+        res = http_get("dexscreener", url, timeout=20)
         if res.status_code != 200:
             return None
-        js = res.json()
+        js = response_json(res)
         pairs = js.get("pairs") if isinstance(js, dict) else None
         if not isinstance(pairs, list):
             return None
@@ -1032,10 +1819,10 @@ def fetch_token_telegram_url_from_dexscreener(token_address: str) -> Optional[st
 def fetch_pair_change(pair_id: str, tf: str = "h6") -> Optional[float]:
     try:
         url = f"{DEX_PAIR_URL}/{pair_id}"
-        res = requests.get(url, timeout=15)
+        res = http_get("dexscreener", url, timeout=15)
         if res.status_code != 200:
             return None
-        js = res.json()
+        js = response_json(res)
         pairs = js.get("pairs") if isinstance(js, dict) else None
         if not isinstance(pairs, list) or not pairs or not isinstance(pairs[0], dict):
             return None
@@ -1066,11 +1853,12 @@ def tonapi_get_raw(url: str, params: Optional[Dict[str, Any]] = None) -> Optiona
     """
     try:
         # 1) Bearer (preferred)
-        res = requests.get(url, headers=tonapi_headers(), params=params, timeout=20)
+        res = http_get("tonapi", url, headers=tonapi_headers(), params=params, timeout=20)
 
         # 2) Some deployments use X-API-Key
         if res.status_code in (401, 403) and TONAPI_KEY:
-            res = requests.get(
+            res = http_get(
+                "tonapi",
                 url,
                 headers={"X-API-Key": TONAPI_KEY, "Accept": "application/json"},
                 params=params,
@@ -1079,7 +1867,7 @@ def tonapi_get_raw(url: str, params: Optional[Dict[str, Any]] = None) -> Optiona
 
         # 3) If key is wrong, TonAPI may still work without auth (rate-limited)
         if res.status_code in (401, 403) and TONAPI_KEY:
-            res = requests.get(url, headers={"Accept": "application/json"}, params=params, timeout=20)
+            res = http_get("tonapi", url, headers={"Accept": "application/json"}, params=params, timeout=20)
 
         # 4) Tiny retry on rate limit
         if res.status_code == 429:
@@ -1087,12 +1875,12 @@ def tonapi_get_raw(url: str, params: Optional[Dict[str, Any]] = None) -> Optiona
                 time.sleep(0.8)
             except:
                 pass
-            res = requests.get(url, headers={"Accept": "application/json"}, params=params, timeout=20)
+            res = http_get("tonapi", url, headers={"Accept": "application/json"}, params=params, timeout=20)
 
         if res.status_code != 200:
             return None
 
-        return res.json()
+        return response_json(res)
     except:
         return None
 
@@ -1106,7 +1894,9 @@ def get_jetton_decimals(jetton_master: str) -> int:
     if not jetton_master:
         return 9
     if jetton_master in JETTON_DECIMALS_CACHE:
+        _cache_stat("jetton_decimals", True)
         return JETTON_DECIMALS_CACHE[jetton_master]
+    _cache_stat("jetton_decimals", False)
     dec = 9
     try:
         js = tonapi_get(f"{TONAPI_BASE.rstrip('/')}/v2/jettons/{jetton_master}")
@@ -1167,10 +1957,10 @@ def dedust_fetch_trades(pool_addr: str, limit: int = 25, after_lt: int = 0) -> L
     if after_lt:
         params["after_lt"] = int(after_lt)
     try:
-        res = requests.get(url, params=params, timeout=20)
+        res = http_get("dedust", url, params=params, timeout=20)
         if res.status_code != 200:
             return []
-        js = res.json()
+        js = response_json(res)
         if isinstance(js, list):
             return [t for t in js if isinstance(t, dict)]
         if isinstance(js, dict):
@@ -1285,49 +2075,40 @@ def _dedust_amount_out(t: Dict[str, Any]) -> float:
     return _parse_float(v)
 
 
+# ===================== HOLDERS =====================
+# Alerts read HOLDERS (holders.py) only; holders_job keeps its baselines
+# reconciled with TonAPI in the background, a few tokens per tick.
+HOLDERS_RECONCILE_INTERVAL = int(os.getenv("HOLDERS_RECONCILE_INTERVAL", "900"))
+HOLDERS_RECONCILE_BATCH = int(os.getenv("HOLDERS_RECONCILE_BATCH", "4"))  # TonAPI lookups per tick
+HOLDERS_JOB_INTERVAL = int(os.getenv("HOLDERS_JOB_INTERVAL", "5"))
+HOLDERS = HolderBook(HOLDERS_RECONCILE_INTERVAL)
+
+def _holders_int(v: Any) -> Optional[int]:
+    if isinstance(v, int):
+        return v
+    if isinstance(v, str) and v.isdigit():
+        return int(v)
+    return None
+
 def fetch_holders_count_tonapi(jetton_address: str) -> Optional[int]:
+    """Exact holder count from TonAPI (blocking; holders_job only)."""
     if not jetton_address:
         return None
 
-    # Cache (avoid rate limits / keep first message non-N/A after we've seen the token once)
-    # {addr: (holders, ts)}
-    global HOLDERS_CACHE
-    try:
-        HOLDERS_CACHE
-    except NameError:
-        HOLDERS_CACHE = {}
-
-    now = time.time()
-    cached = HOLDERS_CACHE.get(jetton_address)
-    if isinstance(cached, tuple) and len(cached) == 2:
-        hv, ts = cached
-        if isinstance(hv, int) and (now - float(ts)) < 10 * 60:
-            return hv
-
     # 1) Primary: jetton details endpoint
     js = tonapi_get_raw(f"{TONAPI_BASE.rstrip('/')}/v2/jettons/{jetton_address}")
     if isinstance(js, dict):
         for k in ("holders_count", "holdersCount", "holders", "holdersCountTotal"):
-            v = js.get(k)
-            if isinstance(v, int):
-                HOLDERS_CACHE[jetton_address] = (v, now)
+            v = _holders_int(js.get(k))
+            if v is not None:
                 return v
-            if isinstance(v, str) and v.isdigit():
-                hv = int(v)
-                HOLDERS_CACHE[jetton_address] = (hv, now)
-                return hv
 
         stats = js.get("stats")
         if isinstance(stats, dict):
             for k in ("holders_count", "holdersCount", "holders"):
-                v = stats.get(k)
-                if isinstance(v, int):
-                    HOLDERS_CACHE[jetton_address] = (v, now)
+                v = _holders_int(stats.get(k))
+                if v is not None:
                     return v
-                if isinstance(v, str) and v.isdigit():
-                    hv = int(v)
-                    HOLDERS_CACHE[jetton_address] = (hv, now)
-                    return hv
 
     # 2) Fallback: holders list endpoint usually returns a total
     js2 = tonapi_get_raw(
@@ -1336,25 +2117,190 @@ def fetch_holders_count_tonapi(jetton_address: str) -> Optional[int]:
     )
     if isinstance(js2, dict):
         for k in ("total", "total_count", "totalCount", "count"):
-            v = js2.get(k)
-            if isinstance(v, int):
-                HOLDERS_CACHE[jetton_address] = (v, now)
+            v = _holders_int(js2.get(k))
+            if v is not None:
                 return v
-            if isinstance(v, str) and v.isdigit():
-                hv = int(v)
-                HOLDERS_CACHE[jetton_address] = (hv, now)
-                return hv
 
     return None
 
-def tonapi_account_transactions(address: str, limit: int = 10) -> List[Dict[str, Any]]:
+def holders_estimate(token_addr: str) -> Optional[int]:
+    """Non-blocking holder count for an alert (None: not counted yet)."""
+    if not FAST_HOLDERS_ENABLED or not token_addr:
+        return None
+    v = HOLDERS.get(token_addr)
+    _cache_stat("holders", v is not None)
+    return v
+
+def tonapi_account_transactions(address: str, limit: int = 10, before_lt: int = 0) -> List[Dict[str, Any]]:
     url = f"{TONAPI_BASE.rstrip('/')}/v2/blockchain/accounts/{address}/transactions"
-    js = tonapi_get(url, params={"limit": limit})
+    params: Dict[str, Any] = {"limit": limit}
+    if before_lt:
+        params["before_lt"] = int(before_lt)
+    js = tonapi_get(url, params=params)
     txs = js.get("transactions") if js else None
     if isinstance(txs, list):
         return [t for t in txs if isinstance(t, dict)]
     return []
 
+# Gap recovery: how many extra (older) pages one account may pull per poll.
+# Keeps a single hot pool from eating the whole rate limit.
+TONAPI_GAP_MAX_PAGES = int(os.getenv("TONAPI_GAP_MAX_PAGES", "4"))
+# Resume catch-up (e.g. after a Fly scale-to-zero stop): the first poll of each account in
+# this process may page this far back, but never past CATCHUP_MAX_SECONDS of history;
+# buys older than that still feed the aggregates but are not posted (see enqueue_buy)
+CATCHUP_MAX_PAGES = int(os.getenv("CATCHUP_MAX_PAGES", "20"))
+CATCHUP_MAX_SECONDS = int(os.getenv("CATCHUP_MAX_SECONDS", "900"))
+_TONAPI_RESUMED: set = set()  # accounts polled at least once since boot
+
+# Counters shown in /status (updated from worker threads)
+TONAPI_PAGING_STATS: Dict[str, int] = {"gaps_detected": 0, "gaps_recovered": 0, "extra_pages": 0, "budget_hit": 0, "page_failed": 0, "catchup_horizon": 0}
+_PAGING_STATS_LOCK = threading.Lock()
+
+def _paging_stat(key: str, n: int = 1):
+    with _PAGING_STATS_LOCK:
+        TONAPI_PAGING_STATS[key] = TONAPI_PAGING_STATS.get(key, 0) + n
+
+# {address: (gap_top, newest, gap_top_utime)}: a gap the page budget (or a failed
+# page) didn't close. Everything from gap_top up to newest was fetched; the caller
+# keeps its cursor below the gap (tonapi_cursor) and the next poll jumps from
+# `newest` straight to gap_top. gap_top_utime lets the catch-up horizon retire it.
+TONAPI_GAPS: Dict[str, Tuple[int, int, int]] = {}
+
+def tonapi_cursor(address: str, newest_lt: int, cursor: int) -> int:
+    """Where address' cursor may move after a poll: newest_lt, unless a gap below it is still open."""
+    return cursor if address in TONAPI_GAPS else newest_lt
+
+def tonapi_account_transactions_since(
+    address: str, limit: int, since_lt: int, max_pages: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Newest-first transactions back to (at least) since_lt.
+
+    Fetches the newest page; if the page is full and its oldest lt is still
+    above the stored cursor, more transactions happened between polls than one
+    page holds, so keep paging backward with before_lt until the cursor is
+    reached, `max_pages` (default TONAPI_GAP_MAX_PAGES) extra pages were spent
+    or the pages are older than CATCHUP_MAX_SECONDS. A gap left open by the
+    page budget or by a failed / empty page (429, timeout) is recorded in
+    TONAPI_GAPS and continued by the next call; it only counts as recovered
+    once paging reaches since_lt or a short page shows the history ended.
+    """
+    max_pages = TONAPI_GAP_MAX_PAGES if max_pages is None else int(max_pages)
+    horizon = time.time() - CATCHUP_MAX_SECONDS
+    txs = tonapi_account_transactions(address, limit)
+    gap = TONAPI_GAPS.get(address)
+    if not since_lt or not txs or len(txs) < limit:
+        TONAPI_GAPS.pop(address, None)
+        return txs
+
+    oldest = min((_tx_lt(t) for t in txs), default=0)
+    if not oldest or oldest <= since_lt:
+        TONAPI_GAPS.pop(address, None)
+        return txs
+
+    if gap is None:
+        _paging_stat("gaps_detected")
+    newest = max(_tx_lt(t) for t in txs)
+    seen_lts = {_tx_lt(t) for t in txs}
+    oldest_ut = min((safe_int(t.get("utime")) or horizon for t in txs), default=horizon)
+    pages = 0
+    def _keep_gap(reason: str) -> List[Dict[str, Any]]:
+        _paging_stat(reason)
+        log.warning("tonapi gap not closed for %s (cursor=%s oldest=%s, %s), continuing next poll",
+                    address, since_lt, oldest, reason)
+        TONAPI_GAPS[address] = (oldest, max(newest, prev_newest), int(oldest_ut))
+        return txs
+
+    prev_newest = gap[1] if gap else 0
+    while oldest > since_lt:
+        if gap is not None and oldest <= gap[1]:
+            oldest = gap[0]  # the previous poll fetched down to here
+            oldest_ut = min(oldest_ut, gap[2] or oldest_ut)
+            gap = None
+            continue
+        if oldest_ut < horizon:
+            _paging_stat("catchup_horizon")
+            TONAPI_GAPS.pop(address, None)
+            return txs  # the rest of the gap is older than the catch-up window
+        if pages >= max_pages:
+            return _keep_gap("budget_hit")
+        page = tonapi_account_transactions(address, limit, before_lt=oldest)
+        pages += 1
+        _paging_stat("extra_pages")
+        fresh = [t for t in page if _tx_lt(t) not in seen_lts]
+        if not fresh:
+            return _keep_gap("page_failed")  # [] is also what a 429 / timeout returns
+        for t in fresh:
+            seen_lts.add(_tx_lt(t))
+        txs.extend(fresh)
+        oldest_ut = min(oldest_ut, min((safe_int(t.get("utime")) or horizon for t in fresh), default=horizon))
+        page_oldest = min(_tx_lt(t) for t in fresh)
+        if not page_oldest or page_oldest >= oldest:
+            return _keep_gap("page_failed")  # no progress
+        oldest = page_oldest
+        if len(page) < limit:
+            break  # short page: nothing older exists
+
+    TONAPI_GAPS.pop(address, None)
+    _paging_stat("gaps_recovered")
+    return txs
+
+# Shared TonAPI budget: caps in-flight account fetches across ALL trackers
+# (STON fast path, DeDust, Blum) and the holder lookups, on top of each job's own concurrency.
+TONAPI_CONCURRENCY = int(os.getenv("TONAPI_CONCURRENCY", "16" if TONAPI_KEY else "6"))
+TONAPI_FETCH_SEM = asyncio.Semaphore(max(1, TONAPI_CONCURRENCY))
+
+async def tonapi_account_transactions_many(
+    addresses: List[str],
+    limit: int,
+    concurrency: int,
+    since_lt: Optional[Dict[str, Any]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetch recent transactions for many accounts concurrently.
+
+    Every blocking HTTP call runs in a worker thread so the event loop stays free
+    for Telegram updates and the other trackers; the semaphores cap how many
+    requests are in flight for this job and across all trackers. Failed
+    fetches are simply left out.
+
+    If since_lt ({address: cursor_lt}) is given, each account is paged back to
+    its cursor (see tonapi_account_transactions_since).
+    """
+    sem = asyncio.Semaphore(max(1, int(concurrency)))
+
+    async def _fetch(addr: str):
+        M_QUEUE.inc(queue="tonapi_waiting")
+        waiting = True
+        try:
+            async with sem, TONAPI_FETCH_SEM:
+                M_QUEUE.dec(queue="tonapi_waiting")
+                waiting = False
+                M_QUEUE.inc(queue="tonapi_inflight")
+                try:
+                    if since_lt is not None:
+                        cursor = safe_int(since_lt.get(addr)) or 0
+                        pages = TONAPI_GAP_MAX_PAGES if addr in _TONAPI_RESUMED else CATCHUP_MAX_PAGES
+                        txs = await _to_thread(tonapi_account_transactions_since, addr, limit, cursor, pages)
+                        _TONAPI_RESUMED.add(addr)
+                    else:
+                        txs = await _to_thread(tonapi_account_transactions, addr, limit)
+                finally:
+                    M_QUEUE.dec(queue="tonapi_inflight")
+                return addr, txs
+        finally:
+            if waiting:
+                M_QUEUE.dec(queue="tonapi_waiting")
+
+    results = await asyncio.gather(*(_fetch(a) for a in addresses), return_exceptions=True)
+
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for r in results:
+        if isinstance(r, Exception):
+            continue
+        addr, txs = r
+        if isinstance(addr, str) and isinstance(txs, list):
+            out[addr] = [t for t in txs if isinstance(t, dict)]
+    return out
+
 # ===================== BUY DETECTION: STON (TONAPI FAST PATH) =====================
 def _tx_lt(tx: Dict[str, Any]) -> int:
     tid = tx.get("transaction_id")
@@ -1485,31 +2431,25 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
             if str(rec.get("dex", "")).lower() != "stonfi":
                 continue
             token_addr = (rec.get("token_address") or "").strip()
-            if not token_addr:
+            if not token_addr or not shard_owns(pool, token_addr):
                 continue
             pools.append((pool, rec, token_addr))
 
         if not pools:
             return
 
-        sem = asyncio.Semaphore(int(os.getenv("STON_CONCURRENCY", "16" if TONAPI_KEY else "6")))
-
-        async def _fetch_pool(pool_addr: str):
-            async with sem:
-                txs = await _to_thread(tonapi_account_transactions, pool_addr, STON_TONAPI_LIMIT)
-                return pool_addr, txs
-
-        fetch_tasks = [asyncio.create_task(_fetch_pool(p[0])) for p in pools]
-        results = await asyncio.gather(*fetch_tasks, return_exceptions=True)
-
-        txs_by_pool: Dict[str, List[Dict[str, Any]]] = {}
-        for r in results:
-            if isinstance(r, Exception):
-                continue
-            pool_addr, txs = r
-            if isinstance(pool_addr, str) and isinstance(txs, list):
-                txs_by_pool[pool_addr] = [t for t in txs if isinstance(t, dict)]
+        txs_by_pool = await tonapi_account_transactions_many(
+            [p[0] for p in pools],
+            STON_TONAPI_LIMIT,
+            int(os.getenv("STON_CONCURRENCY", "16" if TONAPI_KEY else "6")),
+            since_lt=last_lt_map,
+        )
+        fetched_at = time.time()
 
+        # A pool's cursor moves once its buys are in the outbox; everything is persisted
+        # in one journal append at the end of the tick (buys first, then the cursors).
+        work = []
+        cursors_moved = False
         for pool_addr, rec, token_addr in pools:
             txs = txs_by_pool.get(pool_addr) or []
             if not txs:
@@ -1532,13 +2472,16 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
                     continue
                 fresh_txs.append(tx)
 
-            if newest_lt:
-                last_lt_map[pool_addr] = newest_lt
-                save_state()
-
-            if not fresh_txs:
+            if not (newest_lt and newest_lt != last_lt):
                 continue
+            cursors_moved = True
+            newest_lt = tonapi_cursor(pool_addr, newest_lt, last_lt)
+            if fresh_txs:
+                work.append((pool_addr, rec, token_addr, fresh_txs, newest_lt))
+            else:
+                last_lt_map[pool_addr] = newest_lt
 
+        for pool_addr, rec, token_addr, fresh_txs, newest_lt in work:
             # process oldest -> newest
             fresh_txs.sort(key=_tx_lt)
 
@@ -1552,6 +2495,7 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
                 buys = stonfi_extract_buys_from_tonapi_tx(tx, token_addr)
                 if not buys:
                     continue
+                parsed_at = time.time()
                 for buy in buys:
                     txh = (buy.get("tx") or "").strip()
                     if not txh:
@@ -1559,11 +2503,15 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
                     key_pool = f"ston:{pool_addr}:{txh}"
                     key_plain = f"ston:{txh}"
                     if key_pool in SEEN_TX_STON or key_plain in SEEN_TX_STON or txh in SEEN_TX_STON:
+                        M_DEDUPE.inc(source="ston_fast")
                         continue
                     _ts = time.time()
                     SEEN_TX_STON[key_pool] = _ts
                     SEEN_TX_STON[key_plain] = _ts
                     SEEN_TX_STON[txh] = _ts
+                    trace = new_trace("ston_tonapi", tx.get("utime"), fetched_at)
+                    trace["parse"] = parsed_at
+                    trace["dedupe"] = _ts
 
                     buyer = (buy.get("buyer") or "").strip()
                     ton_amt = safe_float(buy.get("ton"))
@@ -1574,7 +2522,7 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
                         buyer_map[buyer] = int(buyer_map.get(buyer, 0)) + 1
                         save_data()
 
-                    await post_buy_message(
+                    await enqueue_buy(
                         context=context,
                         sym=sym,
                         token_addr=token_addr,
@@ -1585,7 +2533,12 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
                         token_amt=token_amt,
                         pos_txt=pos_txt,
                         source_label=(rec.get("dex_label") or "STON.fi"),
+                        trace=trace,
                     )
+            last_lt_map[pool_addr] = newest_lt
+
+        if cursors_moved:
+            save_cursors()
     except Exception as e:
         log.exception("ston_tracker_job_fast error: %s", e)
 
@@ -1593,6 +2546,15 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
 # ===================== BUY DETECTION: STON =====================
 
 # ===================== BUY DETECTION: STON =====================
+def ston_event_utime(ev: Dict[str, Any]) -> int:
+    """Block time of an exported STON event (unix seconds, 0 if unknown)."""
+    blk = ev.get("block")
+    if isinstance(blk, dict):
+        v = safe_int(blk.get("blockTimestamp"))
+        if v:
+            return v
+    return _trade_ts_int(ev)
+
 def extract_buy_from_ston_event(ev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """STON.fi buy-only parser.
     We only post real BUYS: TON -> TOKEN.
@@ -1909,6 +2871,309 @@ def build_strength_bar(ton_amt: float) -> str:
     wall = "\n".join(lines)
     return wall + "\n\n"
 
+# ===================== LOCAL SWAP FLOW =====================
+# Rolling per-token minute buckets (volume, buys, buyers, price) built from
+# every buy the trackers post. Leaderboard + auto ranks read this instead of
+# DexScreener.
+SWAP_FLOW = SwapFlow(size=LB_WINDOW_MINUTES)
+CANDLES = CandleBook(CANDLES_DIR, size=CANDLE_BARS)
+
+_TRADE_STORE: Optional[TradeStore] = None
+_TRADE_STORE_FAILED = False
+
+def get_trade_store() -> Optional[TradeStore]:
+    """Open the trade store on first use (None if disabled or unusable)."""
+    global _TRADE_STORE, _TRADE_STORE_FAILED
+    if _TRADE_STORE is not None or _TRADE_STORE_FAILED or not TRADE_STORE_ENABLED:
+        return _TRADE_STORE
+    try:
+        _TRADE_STORE = TradeStore(TRADES_DIR)
+    except Exception as e:
+        _TRADE_STORE_FAILED = True
+        log.warning("trade store disabled: %s", e)
+    return _TRADE_STORE
+
+def ingest_swap(
+    token_addr: str,
+    pair_id: str,
+    buyer: str,
+    ton_amt: float,
+    token_amt: float,
+    ts: Optional[float] = None,
+    source: str = "",
+):
+    """Feed one detected buy into the local aggregates and the trade history."""
+    ts = ts if ts is not None else time.time()
+    try:
+        SWAP_FLOW.record(
+            (token_addr or pair_id or "").strip(),
+            ts,
+            float(ton_amt or 0.0),
+            float(token_amt or 0.0),
+            (buyer or "").strip(),
+        )
+    except Exception as e:
+        log.debug("ingest_swap failed: %s", e)
+
+    if token_addr in TON_PRICE_STABLES and ton_amt:
+        TON_PRICE.observe(f"pool:{pair_id}", float(token_amt or 0.0) / float(ton_amt), ts)
+
+    if CANDLES_ENABLED:
+        try:
+            CANDLES.on_swap((pair_id or token_addr or "").strip(), ts, float(ton_amt or 0.0), float(token_amt or 0.0))
+        except Exception as e:
+            log.debug("candle update failed: %s", e)
+
+    store = get_trade_store()
+    if store is not None:
+        try:
+            store.append(
+                ts,
+                pair_id or "",
+                token_addr or pair_id or "",
+                buyer or "",
+                int(round(float(ton_amt or 0.0) * 1e9)),
+                float(token_amt or 0.0),
+                source,
+            )
+        except Exception as e:
+            log.debug("trade store append failed: %s", e)
+
+# ===================== DETECTION LATENCY =====================
+# Each buy carries a trace dict {"source": ..., stage: unix_ts}. Trackers mark
+# utime (chain), fetch, parse and dedupe; post_buy_message marks render, send
+# and edit. Every stage is observed as "seconds since utime" per source
+# (ston_export / ston_tonapi / dedust / blum).
+TRACE_STAGES = ("fetch", "parse", "dedupe", "render", "send", "edit")
+
+# {source: deque[chain->send seconds]} for /status percentiles and alerts
+LATENCY_SAMPLES: Dict[str, deque] = {}
+LATENCY_ALERTED: Dict[str, float] = {}  # {source: last alert ts}
+
+def new_trace(source: str, utime: Any = None, fetched: Optional[float] = None) -> Dict[str, Any]:
+    tr: Dict[str, Any] = {"source": source}
+    u = safe_int(utime) if utime else 0
+    if u:
+        tr["utime"] = float(u // 1000 if u > 10_000_000_000 else u)
+    if fetched:
+        tr["fetch"] = float(fetched)
+    return tr
+
+def trace_mark(trace: Optional[Dict[str, Any]], stage: str):
+    if trace is not None and stage not in trace:
+        trace[stage] = time.time()
+
+def trace_observe(trace: Optional[Dict[str, Any]], stages: Tuple[str, ...] = TRACE_STAGES):
+    """Record the given stages of a trace (only if it has a chain utime)."""
+    if not trace or not trace.get("utime"):
+        return
+    u = trace["utime"]
+    source = trace.get("source") or "unknown"
+    for st in stages:
+        ts = trace.get(st)
+        if ts is None:
+            continue
+        lat = max(0.0, ts - u)
+        M_DETECT_LATENCY.observe(lat, source=source, stage=st)
+        if st == "send":
+            q = LATENCY_SAMPLES.get(source)
+            if q is None:
+                q = LATENCY_SAMPLES[source] = deque(maxlen=max(10, LATENCY_SAMPLES_MAX))
+            q.append(lat)
+
+def _pct(sorted_vals: List[float], p: float) -> float:
+    i = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+def latency_summary() -> Dict[str, Dict[str, float]]:
+    """{source: {n, p50, p95, max}} of chain->send latency over recent buys."""
+    out: Dict[str, Dict[str, float]] = {}
+    for src, q in LATENCY_SAMPLES.items():
+        vals = sorted(q)
+        if vals:
+            out[src] = {"n": len(vals), "p50": _pct(vals, 50), "p95": _pct(vals, 95), "max": vals[-1]}
+    return out
+
+async def latency_alert_job(context: ContextTypes.DEFAULT_TYPE):
+    """DM the admin when a source's p95 chain->send latency exceeds the threshold."""
+    if LATENCY_P95_ALERT_SECONDS <= 0 or not ADMIN_ID:
+        return
+    now = time.time()
+    for src, st in latency_summary().items():
+        if st["n"] < LATENCY_ALERT_MIN_SAMPLES or st["p95"] <= LATENCY_P95_ALERT_SECONDS:
+            continue
+        if now - LATENCY_ALERTED.get(src, 0.0) < LATENCY_ALERT_COOLDOWN:
+            continue
+        LATENCY_ALERTED[src] = now
+        try:
+            await tg_call("send_message", context.bot.send_message(
+                chat_id=ADMIN_ID,
+                text=(
+                    f"⚠️ Slow alerts from <b>{html.escape(src)}</b>\n"
+                    f"p95 chain→Telegram: <b>{st['p95']:.1f}s</b> (threshold {LATENCY_P95_ALERT_SECONDS:.0f}s)\n"
+                    f"p50 {st['p50']:.1f}s · max {st['max']:.1f}s · last {int(st['n'])} buys"
+                ),
+                parse_mode="HTML",
+            ))
+        except Exception as e:
+            log.warning("latency alert DM failed: %s", e)
+
+
+# ===================== OUTBOX =====================
+# Trackers don't post: enqueue_buy() commits each parsed buy to STATE["outbox"], which is
+# journaled with the cursors (the buy records come first in the same append), and
+# outbox_dispatcher() delivers it. Delivery is at-least-once: an entry leaves the outbox only
+# after every target chat took it or failed for good; chats that failed with a retryable error
+# (flood control, network) are retried alone, with backoff. The key (pool + tx hash) is the
+# idempotency key: a buy already queued or delivered within OUTBOX_DONE_TTL is not queued again,
+# whichever tracker (or restart) sees it.
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "1") == "1"
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "4"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "60"))  # backoff cap, seconds
+OUTBOX_MAX_AGE = int(os.getenv("OUTBOX_MAX_AGE", "3600"))      # undelivered this long: dropped
+OUTBOX_DONE_TTL = int(os.getenv("OUTBOX_DONE_TTL", str(SEEN_TTL_SECONDS)))
+_OUTBOX_WAKE: Optional[asyncio.Event] = None
+
+def outbox_key(pair_id: str, tx_hash: Any) -> str:
+    return f"{pair_id}:{tx_hash}"
+
+def _outbox() -> Tuple[Dict[str, Any], Dict[str, float]]:
+    for kind in ("outbox", "outbox_done"):
+        if not isinstance(STATE.get(kind), dict):
+            STATE[kind] = {}
+    return STATE["outbox"], STATE["outbox_done"]
+
+def prune_outbox_done(now: Optional[float] = None):
+    now = now or time.time()
+    _pending, done = _outbox()
+    for k in [k for k, ts in done.items() if now - float(ts or 0) > OUTBOX_DONE_TTL]:
+        del done[k]
+
+TG_CHAT_PAUSED: Dict[int, float] = {}  # chat id -> unix ts its flood-control wait (RetryAfter) ends
+
+def _tg_pause(chat_id: int, e: RetryAfter):
+    wait = e.retry_after
+    wait = wait.total_seconds() if hasattr(wait, "total_seconds") else float(wait or 1)
+    TG_CHAT_PAUSED[chat_id] = max(TG_CHAT_PAUSED.get(chat_id, 0.0), time.time() + wait)
+
+def _tg_retryable(e: Exception) -> bool:
+    # BadRequest is a NetworkError subclass in PTB, but retrying it can't help
+    return isinstance(e, RetryAfter) or (isinstance(e, NetworkError) and not isinstance(e, BadRequest))
+
+async def enqueue_buy(context: ContextTypes.DEFAULT_TYPE, **buy):
+    """Tracker entry point for a detected buy (same arguments as post_buy_message)."""
+    boot_mark("first_buy")
+    key = outbox_key(buy["pair_id"], buy["tx_hash"])
+    pending, done = _outbox()
+    if key in pending or key in done:
+        M_DEDUPE.inc(source="outbox")
+        return
+    if BUY_LINK is None:
+        # the process that posts keeps the aggregates (in two-process mode: the post process)
+        trace = buy.get("trace")
+        ingest_swap(buy["token_addr"], buy["pair_id"], buy["buyer"], buy["ton_amt"], buy["token_amt"],
+                    ts=(trace or {}).get("utime"), source=buy.get("source_label") or "DEX")
+        HOLDERS.observe(buy["token_addr"], buy["buyer"], (trace or {}).get("utime"))
+        if trace and trace.get("utime") and time.time() - trace["utime"] > CATCHUP_MAX_SECONDS:
+            M_STALE.inc(source=trace.get("source") or "unknown")
+            return  # replayed from before a restart: counts for flow / candles, too old to announce
+    if not OUTBOX_ENABLED:
+        await _deliver_buy(context, buy)
+        return
+    pending[key] = {"buy": buy, "ts": time.time(), "tries": 0, "next": 0.0, "chats": None}  # None: all targets
+    M_QUEUE.set(len(pending), queue="outbox")
+    _outbox_changed()
+
+async def _deliver_buy(context, buy: Dict[str, Any], only_chats: Optional[List[int]] = None) -> List[int]:
+    """One delivery attempt; returns the chats to retry."""
+    if BUY_LINK is not None:
+        # ingest worker: the buy stays in the outbox (and is resent on retry) until
+        # the post process acks its key, after journaling it (_outbox_acked)
+        await BUY_LINK.flush()
+        if not BUY_LINK.pending:
+            await BUY_LINK.send(buy)
+        return [0]
+    return await post_buy_message(context=context, only_chats=only_chats, **buy)
+
+_OUTBOX_DIRTY = False  # outbox changed since the dispatcher last journaled it
+
+def _outbox_changed():
+    global _OUTBOX_DIRTY
+    _OUTBOX_DIRTY = True
+    if _OUTBOX_WAKE is not None:
+        _OUTBOX_WAKE.set()
+
+def _outbox_acked(key: str):
+    """BUY_LINK ack from the post process: the buy is durable there."""
+    pending, done = _outbox()
+    if pending.pop(key, None) is None:
+        return
+    done[key] = time.time()
+    M_OUTBOX.inc(result="delivered")
+    M_QUEUE.set(len(pending), queue="outbox")
+    _outbox_changed()
+
+async def _outbox_deliver(context, key: str, item: Dict[str, Any]):
+    pending, done = _outbox()
+    failed = False
+    try:
+        retry = await _deliver_buy(context, item["buy"], item.get("chats"))
+    except Exception as e:
+        log.exception("outbox delivery of %s failed: %s", key, e)
+        retry, failed = item.get("chats"), True  # None: every target again
+    if key not in pending:
+        return  # acked while we were sending
+    now = time.time()
+    if (failed or retry) and now - item["ts"] < OUTBOX_MAX_AGE:
+        tries = int(item.get("tries") or 0) + 1
+        due = max([now + min(OUTBOX_RETRY_MAX, 2 ** tries)] + [TG_CHAT_PAUSED.get(c, 0.0) for c in retry or ()])
+        # replaced, not mutated, so the journal diff sees the change
+        pending[key] = {**item, "tries": tries, "next": due, "chats": retry}
+        M_OUTBOX.inc(result="unacked" if BUY_LINK is not None else "retry")
+    else:
+        pending.pop(key, None)
+        done[key] = now
+        M_OUTBOX.inc(result="expired" if (failed or retry) else "delivered")
+    M_QUEUE.set(len(pending), queue="outbox")
+    _outbox_changed()
+
+async def outbox_dispatcher(context):
+    """Drain STATE["outbox"] (runs for the life of the loop; up to OUTBOX_CONCURRENCY at once)."""
+    global _OUTBOX_WAKE, _OUTBOX_DIRTY
+    _OUTBOX_WAKE = wake = asyncio.Event()
+    slots = asyncio.Semaphore(max(1, OUTBOX_CONCURRENCY))
+    inflight: set = set()
+    loop = asyncio.get_running_loop()
+
+    def _finished(key: str):
+        inflight.discard(key)
+        slots.release()
+        wake.set()
+
+    while True:
+        wake.clear()
+        if _OUTBOX_DIRTY:
+            _OUTBOX_DIRTY = False
+            save_cursors()  # once per wake for all deliveries / acks since the last one
+        pending, _done = _outbox()
+        now = time.time()
+        next_due = None
+        for key, item in list(pending.items()):  # insertion order = detection order
+            if key in inflight:
+                continue
+            if item.get("next", 0) > now:
+                next_due = min(next_due or item["next"], item["next"])
+                continue
+            if slots.locked():
+                break  # _finished() wakes us up
+            await slots.acquire()
+            inflight.add(key)
+            loop.create_task(_outbox_deliver(context, key, item)).add_done_callback(lambda _t, k=key: _finished(k))
+        try:
+            await asyncio.wait_for(wake.wait(), None if next_due is None else max(0.05, next_due - now))
+        except asyncio.TimeoutError:
+            pass
+
 # ===================== MESSAGE SENDER =====================
 async def post_buy_message(
     context: ContextTypes.DEFAULT_TYPE,
@@ -1921,7 +3186,14 @@ async def post_buy_message(
     token_amt: float,
     pos_txt: str,
     source_label: str = "DEX",
-):
+    trace: Optional[Dict[str, Any]] = None,
+    only_chats: Optional[List[int]] = None,
+) -> List[int]:
+    """Render and send one buy alert to the master channel and the matching group mirrors
+    (only `only_chats` of them on a retry). Returns the chats that failed with a retryable
+    error; the outbox dispatcher retries those."""
+    boot_mark("first_buy")
+
     # Build links early (no network)
     chart_url = f"https://www.geckoterminal.com/ton/tokens/{token_addr}" if token_addr else f"https://dexscreener.com/ton/{pair_id}"
     pools_url = f"https://dexscreener.com/ton/{pair_id}"
@@ -1943,7 +3215,7 @@ async def post_buy_message(
     # Compose function so we can send fast then edit later
     def _compose(ton_usd_val: float, stats: Dict[str, Any], holders_count: Optional[int]) -> Tuple[str, str]:
         usd_val = ton_amt * ton_usd_val if ton_usd_val > 0 and ton_amt > 0 else 0.0
-        usd_part = f" (${usd_val:,.2f})" if usd_val else ""
+        usd_part = f" ({usd_sign}{usd_val:,.2f})" if usd_val else ""
 
         mc_txt = money_fmt(stats.get("marketcap_usd"))
         liq_txt = money_fmt(stats.get("liquidity_usd"))
@@ -2025,7 +3297,7 @@ async def post_buy_message(
             f"🚀 {sym} TOKEN Buy! — {dex_lbl_plain}\n"
             f"✅ LISTED!\n\n"
             f"{'💡'*10}\n\n"
-            f"💰 {ton_amt:.2f} TON ({'$' + usd_group if usd_group else '$0'})\n"
+            f"💰 {ton_amt:.2f} TON ({usd_sign + usd_group if usd_group else '$0'})\n"
             f"📦 {token_amt:,.2f} {sym}\n"
             f"👤 {buyer_group} | {grp_pos}\n"
             f"💵 Price: ${price_txt}\n"
@@ -2035,9 +3307,10 @@ async def post_buy_message(
         return text, group_text
 
     # FAST: send immediately with placeholders, then edit with enriched stats
-    ton_usd = ton_price_cache_value()
+    ton_usd, price_stale = ton_price_quote()
+    usd_sign = "~$" if price_stale else "$"  # "~": last good price, no source is fresh
     stats: Dict[str, Any] = {"marketcap_usd": None, "liquidity_usd": None, "price_usd": None}
-    holders_count: Optional[int] = None
+    holders_count = holders_estimate(token_addr)
 
     if not FAST_POST_MODE:
         # Original (slower) behavior: fetch before sending
@@ -2051,10 +3324,8 @@ async def post_buy_message(
             if stats.get("price_usd") is None:
                 stats["price_usd"] = tstats.get("price_usd")
 
-        if token_addr:
-            holders_count = await _to_thread(fetch_holders_count_tonapi, token_addr)
-
     text, group_text = _compose(ton_usd, stats, holders_count)
+    trace_mark(trace, "render")
 
 
     # Targets: always master channel + any configured group mirrors for this token/pair
@@ -2074,6 +3345,8 @@ async def post_buy_message(
             if (token_addr and taddr and token_addr.strip() == taddr) or (pair_id and pid and pair_id.strip() == pid):
                 if cid not in targets and cid != MASTER_CHANNEL_ID:
                     targets.append(cid)
+    if only_chats is not None:
+        targets = [cid for cid in targets if cid in only_chats]
 
     sent_refs: List[Tuple[int, int, bool]] = []  # (chat_id, message_id, used_photo)
 
@@ -2084,30 +3357,30 @@ async def post_buy_message(
             if file_exists(HEADER_IMAGE_PATH):
                 try:
                     with open(HEADER_IMAGE_PATH, "rb") as img:
-                        msg = await context.bot.send_photo(
+                        msg = await tg_call("send_photo", context.bot.send_photo(
                             chat_id=chat_id,
                             photo=img,
                             caption=text,
                             parse_mode="HTML",
                             reply_markup=buy_alert_keyboard(chart_url, pools_url),
-                        )
+                        ))
                         sent_refs.append((chat_id, msg.message_id, True))
                         return
                 except Exception:
                     pass
 
-            msg = await context.bot.send_message(
+            msg = await tg_call("send_message", context.bot.send_message(
                 chat_id=chat_id,
                 text=text,
                 parse_mode="HTML",
                 reply_markup=buy_alert_keyboard(chart_url, pools_url),
                 disable_web_page_preview=True,
-            )
+            ))
             sent_refs.append((chat_id, msg.message_id, False))
             return
 
                 # GROUPS: one token per group + per-group customization
-        cfg = _ensure_group_cfg(chat_id)
+        cfg = _ensure_group_cfg(chat_id, reload=False)
 
         # Skip if group hasn't configured any token
         if not cfg.get("token_address") or not cfg.get("symbol"):
@@ -2121,18 +3394,16 @@ async def post_buy_message(
         except:
             usd_amt = 0.0
 
-        # Enforce min buy (USD)
-        try:
-            min_buy_usd = float(cfg.get("min_buy_usd") or 0.0)
-        except:
-            min_buy_usd = 0.0
-        # back-compat: if only TON threshold exists
-        try:
-            if (not min_buy_usd) and float(cfg.get("min_buy_ton") or 0.0) > 0 and ton_usd > 0:
-                min_buy_usd = float(cfg.get("min_buy_ton") or 0.0) * float(ton_usd)
-        except:
-            pass
-        if min_buy_usd and usd_amt < min_buy_usd:
+        # Enforce min buy (USD; legacy TON threshold only when no USD one is set)
+        min_buy_usd = safe_float(cfg.get("min_buy_usd"))
+        min_buy_ton = safe_float(cfg.get("min_buy_ton"))
+        if min_buy_usd > 0:
+            if ton_usd <= 0:
+                # no TON price from any source yet: the threshold can't be checked, post rather than drop
+                M_MIN_BUY_UNPRICED.inc()
+            elif usd_amt < min_buy_usd:
+                return
+        elif min_buy_ton > 0 and float(ton_amt or 0.0) < min_buy_ton:
             return
 
         # Apply emoji + custom links line
@@ -2176,13 +3447,13 @@ async def post_buy_message(
         group_msg = (
             f"<b>{sym_g} Buy!</b>\n\n"
             f"{bar_lines}\n\n"
-            f"💧 <b>{ton_amt:.2f} TON</b> ({'$' + usd_group if usd_group else '$0'})\n"
+            f"💧 <b>{ton_amt:.2f} TON</b> ({usd_sign + usd_group if usd_group else '$0'})\n"
             f"💰 <b>{token_amt:,.2f} {sym_g}</b>\n\n"
             f"{wallet_html}: <b>{grp_pos}</b> | {txn_html}\n"
             f"Price: <b>${price_txt}</b>\n"
             f"Liquidity: <b>${liq_group}</b>\n"
             f"MCap: <b>${mc_group}</b>\n"
-            f"TON Price: <b>${ton_usd:.2f}</b>\n\n"
+            f"TON Price: <b>{usd_sign}{ton_usd:.2f}</b>\n\n"
             f"{links_line}"
         )
 
@@ -2192,36 +3463,50 @@ async def post_buy_message(
         # Optional media/logo per group
         if cfg.get("media_file_id"):
             try:
-                msg = await context.bot.send_photo(
+                msg = await tg_call("send_photo", context.bot.send_photo(
                     chat_id=chat_id,
                     photo=cfg["media_file_id"],
                     caption=group_msg,
                     parse_mode="HTML",
                     reply_markup=kb,
-                )
+                ))
                 sent_refs.append((chat_id, msg.message_id, True))
                 return
             except Exception:
                 pass
 
-        msg = await context.bot.send_message(
+        msg = await tg_call("send_message", context.bot.send_message(
             chat_id=chat_id,
             text=group_msg,
             parse_mode="HTML",
             reply_markup=kb,
             disable_web_page_preview=True,
-        )
+        ))
         sent_refs.append((chat_id, msg.message_id, False))
     # Send to master and mirrors
+    failed: List[int] = []
     for chat_id in targets:
+        if TG_CHAT_PAUSED.get(chat_id, 0.0) > time.time():
+            failed.append(chat_id)  # still in flood control; don't spend a request on a 429
+            continue
         try:
             await _send_message(chat_id)
-        except Exception:
+        except Exception as e:
+            if isinstance(e, RetryAfter):
+                _tg_pause(chat_id, e)
+            if _tg_retryable(e):
+                failed.append(chat_id)
             continue
+        if sent_refs:
+            trace_mark(trace, "send")  # first delivered alert
+    if sent_refs:
+        boot_mark("first_alert")
+    trace_observe(trace, ("fetch", "parse", "dedupe", "render", "send"))
 
     # Background enrichment: fetch stats/holders and edit messages
     if FAST_POST_MODE and sent_refs:
         async def _enrich_and_edit():
+            M_QUEUE.inc(queue="enrich_pending")
             try:
                 # Stats (use timeouts so we never block posting)
                 enriched_stats = dict(stats)
@@ -2235,13 +3520,8 @@ async def post_buy_message(
                     except Exception:
                         pass
 
-                # Optional holders (slow; default off)
-                enriched_holders = None
-                if FAST_HOLDERS_ENABLED and token_addr:
-                    try:
-                        enriched_holders = await asyncio.wait_for(_to_thread(fetch_holders_count_tonapi, token_addr), timeout=FAST_STATS_TIMEOUT)
-                    except Exception:
-                        enriched_holders = None
+                # Holders: re-read, holders_job may have counted the token meanwhile
+                enriched_holders = holders_estimate(token_addr)
 
                 # Recompose with enriched data
                 new_text, new_group_text = _compose(ton_usd, enriched_stats, enriched_holders)
@@ -2250,38 +3530,45 @@ async def post_buy_message(
                     try:
                         if cid == MASTER_CHANNEL_ID:
                             if used_photo:
-                                await context.bot.edit_message_caption(
+                                await tg_call("edit_message_caption", context.bot.edit_message_caption(
                                     chat_id=cid,
                                     message_id=mid,
                                     caption=new_text,
                                     parse_mode="HTML",
                                     reply_markup=buy_alert_keyboard(chart_url, pools_url),
-                                )
+                                ))
                             else:
-                                await context.bot.edit_message_text(
+                                await tg_call("edit_message_text", context.bot.edit_message_text(
                                     chat_id=cid,
                                     message_id=mid,
                                     text=new_text,
                                     parse_mode="HTML",
                                     reply_markup=buy_alert_keyboard(chart_url, pools_url),
                                     disable_web_page_preview=True,
-                                )
+                                ))
                         else:
-                            await context.bot.edit_message_text(
+                            await tg_call("edit_message_text", context.bot.edit_message_text(
                                 chat_id=cid,
                                 message_id=mid,
                                 text=new_group_text,
                                 parse_mode="HTML",
                                 disable_web_page_preview=True,
-                            )
+                            ))
                     except Exception:
                         continue
+                trace_mark(trace, "edit")
+                trace_observe(trace, ("edit",))
             except Exception:
                 return
+            finally:
+                M_QUEUE.dec(queue="enrich_pending")
 
         asyncio.create_task(_enrich_and_edit())
+    return failed
 
 # ===================== LEADERBOARD (6H movers) =====================
+# Tokens we already asked DexScreener for a Telegram link (once per process)
+LB_TG_LOOKUP_TRIED: set = set()
 
 async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
     """Auto-updating Top Movers leaderboard (Top 1–10) in Crypton-style format."""
@@ -2310,8 +3597,13 @@ async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
     load_data()
     # Refresh auto ranks from volume
     refresh_auto_ranks(force=True)
-    TF_PRIMARY = "h6"
 
+    # Price change comes from the local 5m candles over the LB window, or the
+    # swap flow where a pool has none (candles off, or another shard's token).
+    # No DexScreener calls. Liquidity / MCap filters use whatever pair stats are already cached.
+    now = time.time()
+    windows = flow_windows(now)
+    lb_bars = max(1, LB_WINDOW_MINUTES // 5)
     items: List[Dict[str, Any]] = []
 
     for pid, rec in DATA.get("pairs", {}).items():
@@ -2321,28 +3613,18 @@ async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
         sym = (rec.get("symbol") or "?").strip().upper()
         token_addr = (rec.get("token_address") or "").strip()
 
-        # Try auto-fetch TG link if missing
-        tg_url = rec.get("telegram")
-        if not tg_url and token_addr:
-            tg_found = fetch_token_telegram_url_from_dexscreener(token_addr)
-            if tg_found:
-                rec["telegram"] = tg_found
-                tg_url = tg_found
-                try:
-                    save_data()
-                except:
-                    pass
-
-        # Fetch price change (fallback to h1 if h6 missing)
-        ch = fetch_pair_change(pid, TF_PRIMARY)
+        w = windows.get(token_addr or pid)
+        if not w or not w.get("buys"):
+            continue
+        ch = CANDLES.change_pct(pid, "5m", lb_bars, now) if CANDLES_ENABLED else None
         if ch is None:
-            ch = fetch_pair_change(pid, "h1")
+            ch = w.get("change_pct")
         if ch is None:
             continue
 
-        stats = fetch_pair_stats(pid)
-        liq = stats.get("liquidity_usd")
-        mc = stats.get("marketcap_usd")
+        cached = PAIR_CACHE.get(pid) or {}
+        liq = cached.get("liquidity_usd")
+        mc = cached.get("marketcap_usd")
 
         # Filters (can be lowered via env vars)
         if liq is not None and liq < LB_MIN_LIQ_USD:
@@ -2353,16 +3635,18 @@ async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
         items.append({
             "pair_id": pid,
             "sym": sym,
+            "token_addr": token_addr,
             "ch": float(ch),
+            "vol": float(w.get("volume_ton") or 0.0),
             "mc": mc,
             "liq": liq,
-            "tg": tg_url,
+            "tg": rec.get("telegram"),
         })
 
     # Dedup by token address if possible
     grouped: Dict[str, List[Dict[str, Any]]] = {}
     for it in items:
-        key = (DATA.get("pairs", {}).get(it["pair_id"], {}).get("token_address") or f"PAIR::{it['pair_id']}").strip()
+        key = (it["token_addr"] or f"PAIR::{it['pair_id']}").strip()
         grouped.setdefault(key, []).append(it)
 
     deduped: List[Dict[str, Any]] = []
@@ -2371,10 +3655,26 @@ async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
         chosen = sorted(arr, key=lambda x: (x["liq"] or 0.0, x["mc"] or 0.0, abs(x["ch"])), reverse=True)[0]
         deduped.append(chosen)
 
-    # Sort by absolute move (so big gainers and losers show)
-    deduped.sort(key=lambda x: abs(x["ch"]), reverse=True)
+    # Sort by absolute move (so big gainers and losers show), volume breaks ties
+    deduped.sort(key=lambda x: (abs(x["ch"]), x["vol"]), reverse=True)
     top = deduped[:10]
 
+    # Try auto-fetch TG link once per token, only for rows we actually show
+    for it in top:
+        if it.get("tg") or not it["token_addr"] or it["token_addr"] in LB_TG_LOOKUP_TRIED:
+            continue
+        LB_TG_LOOKUP_TRIED.add(it["token_addr"])
+        tg_found = await _to_thread(fetch_token_telegram_url_from_dexscreener, it["token_addr"])
+        if tg_found:
+            it["tg"] = tg_found
+            rec = DATA.get("pairs", {}).get(it["pair_id"])
+            if isinstance(rec, dict):
+                rec["telegram"] = tg_found
+                try:
+                    save_data()
+                except:
+                    pass
+
     def fmt_pct(v: float) -> str:
         sign = "+" if v > 0 else ""
         return f"{sign}{v:.0f}%"
@@ -2398,14 +3698,14 @@ async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
                 text += "------------------------------\n"
 
     try:
-        await context.bot.edit_message_text(
+        await tg_call("edit_message_text", context.bot.edit_message_text(
             chat_id=CHANNEL_ID,
             message_id=int(lb_id),
             text=text,
             parse_mode="HTML",
             disable_web_page_preview=True,
             reply_markup=leaderboard_button(),
-        )
+        ))
     except Exception:
         # If the saved message id is wrong (deleted/new pinned), try to recover from pinned message
         try:
@@ -2414,19 +3714,30 @@ async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
                 new_id = chat.pinned_message.message_id
                 STATE["leaderboard_msg_id"] = new_id
                 save_state()
-                await context.bot.edit_message_text(
+                await tg_call("edit_message_text", context.bot.edit_message_text(
                     chat_id=CHANNEL_ID,
                     message_id=int(new_id),
                     text=text,
                     parse_mode="HTML",
                     disable_web_page_preview=True,
                     reply_markup=leaderboard_button(),
-                )
+                ))
         except Exception:
             pass
 
 
 # ===================== JOB: MEMEPAD AUTO-ACTIVATION =====================
+# Tokens that are not listed yet are re-checked less and less often:
+# {token_address: {"misses": n, "next_ts": unix}}
+MEMEPAD_BACKOFF: Dict[str, Dict[str, float]] = {}
+MEMEPAD_BACKOFF_MAX = int(os.getenv("MEMEPAD_BACKOFF_MAX", "1800"))  # seconds
+
+def _memepad_backoff_miss(token_address: str, now: float):
+    b = MEMEPAD_BACKOFF.setdefault(token_address, {"misses": 0, "next_ts": 0.0})
+    b["misses"] = int(b.get("misses", 0)) + 1
+    delay = min(MEMEPAD_BACKOFF_MAX, MEMEPAD_ACTIVATION_INTERVAL * (2 ** min(int(b["misses"]) - 1, 16)))
+    b["next_ts"] = now + delay
+
 async def memepad_activation_job(context: ContextTypes.DEFAULT_TYPE):
     if not MEMEPAD_ACTIVATION_ENABLED:
         return
@@ -2436,83 +3747,121 @@ async def memepad_activation_job(context: ContextTypes.DEFAULT_TYPE):
     if not isinstance(watch, dict) or not watch:
         return
 
-    changed = False
-    to_remove: List[str] = []
-
+    # Group due watch entries by token so each token is looked up once
+    now = time.time()
+    watched: set = set()
+    due: Dict[str, List[str]] = {}
     for watch_id, rec in watch.items():
         if not isinstance(rec, dict):
             continue
-
         token_address = (rec.get("token_address") or "").strip()
-        symbol = (rec.get("symbol") or "?").strip().upper()
-        tg_link = rec.get("telegram")
-        source = rec.get("source") or "memepad"
-
         if not token_address:
             continue
+        watched.add(token_address)
+        b = MEMEPAD_BACKOFF.get(token_address)
+        if b and now < float(b.get("next_ts", 0.0)):
+            continue
+        due.setdefault(token_address, []).append(watch_id)
+
+    # Forget backoff for tokens no longer watched
+    for k in [k for k in MEMEPAD_BACKOFF if k not in watched]:
+        MEMEPAD_BACKOFF.pop(k, None)
+
+    if not due:
+        return
 
-        pair_id = await _to_thread(find_stonfi_ton_pair_for_token, token_address)
-        dex = "stonfi"
-        if not pair_id:
-            pair_id = await _to_thread(find_dedust_ton_pair_for_token, token_address)
-            dex = "dedust"
+    changed = False
+    to_remove: List[str] = []
+    tokens = list(due.keys())
 
-        if not pair_id:
+    for i in range(0, len(tokens), DEX_TOKENS_BATCH):
+        batch = tokens[i:i + DEX_TOKENS_BATCH]
+        pairs_by_token = await _to_thread(fetch_dex_pairs_for_tokens, batch)
+        if pairs_by_token is None:
+            # request failed: not the tokens' fault, retry next run
             continue
 
-        old = DATA["pairs"].get(pair_id, {})
-        meta = await _to_thread(fetch_pair_meta, pair_id)
-        dex_label = None
-        if dex == "dedust":
-            dex_label = "DeDust"
-        elif isinstance(meta, dict):
-            dex_label = dex_label_from_dex_id(meta.get("dex_id") or "")
-        DATA["pairs"][pair_id] = {
-            "symbol": symbol or old.get("symbol", "?"),
-            "token_address": token_address,
-        "token_name": token_name,
-            "telegram": tg_link or old.get("telegram"),
-            "dex": dex,
-            "dex_label": dex_label or old.get("dex_label") or ("DeDust" if dex == "dedust" else "STON.fi"),
-            "buyers": old.get("buyers", {}) if isinstance(old.get("buyers"), dict) else {},
-        }
+        for token_address in batch:
+            if token_address not in pairs_by_token:
+                continue  # its part of a split batch failed; retry next run
+            pairs = pairs_by_token[token_address]
+            best = pick_ton_pair(pairs, "stonfi")
+            dex = "stonfi"
+            if not best:
+                best = pick_ton_pair(pairs, "dedust")
+                dex = "dedust"
+
+            if not best:
+                _memepad_backoff_miss(token_address, now)
+                continue
+            MEMEPAD_BACKOFF.pop(token_address, None)
+
+            pair_id = _dex_pair_id(best)
+            base = best.get("baseToken") or {}
+            quote = best.get("quoteToken") or {}
+            tok_side = quote if (base.get("symbol") or "").upper() == "TON" else base
+            token_name = (tok_side.get("name") or "").strip() or None
 
-        # Keep a dedicated DeDust pools map for older tracker code
-        if dex == "dedust":
-            DATA.setdefault("dedust_pools", {})
-            if isinstance(DATA.get("dedust_pools"), dict):
-                DATA["dedust_pools"][pair_id] = DATA["pairs"][pair_id]
-
-        # Update any group mirrors watching this token
-        mirrors = DATA.get("group_mirrors", {})
-        if isinstance(mirrors, dict):
-            for _cid, cfg in mirrors.items():
-                if not isinstance(cfg, dict):
+            for watch_id in due[token_address]:
+                rec = watch.get(watch_id)
+                if not isinstance(rec, dict):
                     continue
-                if (cfg.get("token_address") or "").strip() == token_address:
-                    cfg["pair_id"] = pair_id
-                    cfg["dex"] = dex
-                    cfg["updated_ts"] = int(time.time())
-        
-        to_remove.append(watch_id)
-        changed = True
 
-        try:
-            await context.bot.send_message(
-                chat_id=ADMIN_ID,
-                text=(
-                    f"✅ Activated {symbol}\n"
-                    f"Source: {source}\n"
-                    f"DEX: {dex}\n"
-                    f"Token: <code>{token_address}</code>\n"
-                    f"Pair/Pool: <code>{pair_id}</code>\n"
-                    f"Now posting buys automatically."
-                ),
-                parse_mode="HTML",
-                disable_web_page_preview=True
-            )
-        except Exception:
-            pass
+                symbol = (rec.get("symbol") or "?").strip().upper()
+                tg_link = rec.get("telegram")
+                source = rec.get("source") or "memepad"
+
+                old = DATA["pairs"].get(pair_id, {})
+                if dex == "dedust":
+                    dex_label = "DeDust"
+                else:
+                    dex_label = dex_label_from_dex_id(best.get("dexId") or "")
+                DATA["pairs"][pair_id] = {
+                    "symbol": symbol or old.get("symbol", "?"),
+                    "token_address": token_address,
+                    "token_name": token_name or old.get("token_name"),
+                    "telegram": tg_link or old.get("telegram"),
+                    "dex": dex,
+                    "dex_label": dex_label or old.get("dex_label") or ("DeDust" if dex == "dedust" else "STON.fi"),
+                    "buyers": old.get("buyers", {}) if isinstance(old.get("buyers"), dict) else {},
+                }
+
+                # Keep a dedicated DeDust pools map for older tracker code
+                if dex == "dedust":
+                    DATA.setdefault("dedust_pools", {})
+                    if isinstance(DATA.get("dedust_pools"), dict):
+                        DATA["dedust_pools"][pair_id] = DATA["pairs"][pair_id]
+
+                # Update any group mirrors watching this token
+                mirrors = DATA.get("group_mirrors", {})
+                if isinstance(mirrors, dict):
+                    for _cid, cfg in mirrors.items():
+                        if not isinstance(cfg, dict):
+                            continue
+                        if (cfg.get("token_address") or "").strip() == token_address:
+                            cfg["pair_id"] = pair_id
+                            cfg["dex"] = dex
+                            cfg["updated_ts"] = int(time.time())
+
+                to_remove.append(watch_id)
+                changed = True
+
+                try:
+                    await context.bot.send_message(
+                        chat_id=ADMIN_ID,
+                        text=(
+                            f"✅ Activated {symbol}\n"
+                            f"Source: {source}\n"
+                            f"DEX: {dex}\n"
+                            f"Token: <code>{token_address}</code>\n"
+                            f"Pair/Pool: <code>{pair_id}</code>\n"
+                            f"Now posting buys automatically."
+                        ),
+                        parse_mode="HTML",
+                        disable_web_page_preview=True
+                    )
+                except Exception:
+                    pass
 
     for k in to_remove:
         watch.pop(k, None)
@@ -2521,6 +3870,9 @@ async def memepad_activation_job(context: ContextTypes.DEFAULT_TYPE):
         save_data()
 
 # ===================== JOB: BLUM EARLY TRACKER (NEW) =====================
+# Last cycle timing (shown in /status)
+BLUM_LAST_CYCLE: Dict[str, Any] = {"duration_ms": None, "tokens": 0, "ts": 0}
+
 async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
     if not BLUM_EARLY_ENABLED:
         return
@@ -2540,8 +3892,10 @@ async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
         STATE["blum_last_lt"] = blum_last_lt
 
     changed = False
+    t0 = time.perf_counter()
 
-    # Scan only approved blum watch entries
+    # Only approved blum watch entries
+    entries: List[Tuple[str, Dict[str, Any], str]] = []
     for wid, rec in watch.items():
         if not isinstance(rec, dict):
             continue
@@ -2551,13 +3905,27 @@ async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
             continue
 
         token_addr = (rec.get("token_address") or "").strip()
-        if not token_addr:
+        if not token_addr or not shard_owns(token_addr):
             continue
+        entries.append((wid, rec, token_addr))
+
+    if not entries:
+        return
+
+    # Fetch every jetton master at once (shared TonAPI budget), paged back to blum_last_lt
+    txs_by_token = await tonapi_account_transactions_many(
+        list(dict.fromkeys(e[2] for e in entries)),
+        BLUM_POLL_LIMIT,
+        BLUM_CONCURRENCY,
+        since_lt=blum_last_lt,
+    )
+    fetched_at = time.time()
 
+    for wid, rec, token_addr in entries:
         sym = (rec.get("symbol") or "?").strip().upper()
         tg_link = rec.get("telegram")
 
-        txs = await _to_thread(tonapi_account_transactions, token_addr, BLUM_POLL_LIMIT)
+        txs = txs_by_token.get(token_addr) or []
         if not txs:
             continue
 
@@ -2591,8 +3959,9 @@ async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
 
             key = f"BLUM:{token_addr}:{h or lt_i}"
             if key in SEEN_TX_BLUM:
+                M_DEDUPE.inc(source="blum")
                 continue
-            SEEN_TX_BLUM[key] = time.time()
+            deduped_at = SEEN_TX_BLUM[key] = time.time()
 
             if BLUM_DEBUG:
                 print(f"[BLUM] jetton={token_addr} lt={lt_i} hash={h}")
@@ -2601,6 +3970,7 @@ async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
             if not buys:
                 newest_seen_lt = max(newest_seen_lt, lt_i)
                 continue
+            parsed_at = time.time()
 
             # buyers tracking under WATCH record
             buyers_map = rec.get("buyers")
@@ -2620,9 +3990,12 @@ async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
                 is_new = buyer not in buyers_map
                 buyers_map[buyer] = int(buyers_map.get(buyer, 0)) + 1
                 pos_txt = "New Holder!" if is_new else "Existing Holder"
+                trace = new_trace("blum", tx.get("utime"), fetched_at)
+                trace["dedupe"] = deduped_at
+                trace["parse"] = parsed_at
 
                 # post (pair_id is token_addr for early mode)
-                await post_buy_message(
+                await enqueue_buy(
                     context=context,
                     sym=sym,
                     token_addr=token_addr,
@@ -2633,6 +4006,7 @@ async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
                     token_amt=token_amt,
                     pos_txt=pos_txt,
                     source_label="Blum",
+                    trace=trace,
                 )
 
                 rec["last_buy_ts"] = int(time.time())
@@ -2640,14 +4014,21 @@ async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
 
             newest_seen_lt = max(newest_seen_lt, lt_i)
 
+        newest_seen_lt = tonapi_cursor(token_addr, newest_seen_lt, last_lt)
         if newest_seen_lt > last_lt:
             blum_last_lt[token_addr] = newest_seen_lt
             STATE["blum_last_lt"] = blum_last_lt
-            save_state()
+            save_cursors()
 
     if changed:
         save_data()
 
+    BLUM_LAST_CYCLE["duration_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    BLUM_LAST_CYCLE["tokens"] = len(entries)
+    BLUM_LAST_CYCLE["ts"] = int(time.time())
+    if BLUM_DEBUG:
+        print(f"[BLUM] cycle tokens={len(entries)} took {BLUM_LAST_CYCLE['duration_ms']} ms")
+
 # ===================== COMMANDS =====================
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -2805,17 +4186,21 @@ async def _require_group_admin(update: Update, context: ContextTypes.DEFAULT_TYP
     except:
         return False
 
-def _ensure_group_cfg(cid: int) -> Dict[str, Any]:
+def _ensure_group_cfg(cid: int, reload: bool = True) -> Dict[str, Any]:
     """
     Creates default config structure for the group if missing.
     Stored in DATA['group_mirrors'][cid] (single token + settings).
+    reload=False trusts the in-memory DATA (posting path, already loaded);
+    data.json is only rewritten when defaults were actually added.
     """
-    load_data()
+    if reload:
+        load_data()
     DATA.setdefault("group_mirrors", {})
     cfg = DATA["group_mirrors"].get(str(cid))
     if not isinstance(cfg, dict):
         cfg = {}
         DATA["group_mirrors"][str(cid)] = cfg
+    n_keys = len(cfg)
 
     # Defaults
     cfg.setdefault("symbol", None)
@@ -2835,7 +4220,8 @@ def _ensure_group_cfg(cid: int) -> Dict[str, Any]:
     cfg.setdefault("media_file_id", None)    # optional photo file_id
     cfg.setdefault("media_type", "photo")
 
-    save_data()
+    if len(cfg) != n_keys:
+        save_data()
     return cfg
 
 def _group_dtrade_url(token_addr: Optional[str]) -> str:
@@ -3359,8 +4745,8 @@ def set_forced_rank(symbol: str, rank: int):
 
 
 def refresh_auto_ranks(force: bool = False) -> Dict[str, int]:
-    """Compute ranks from 6H USD volume across all tracked pairs.
-    Rank 1 = highest volume.
+    """Compute ranks from TON volume over LB_WINDOW_MINUTES across all tracked pairs.
+    Rank 1 = highest volume. Uses local swap flow (no network).
     Cached for AUTO_RANK_TTL seconds.
     """
     global AUTO_RANKS, AUTO_RANK_TS
@@ -3369,8 +4755,13 @@ def refresh_auto_ranks(force: bool = False) -> Dict[str, int]:
     if (not force) and AUTO_RANKS and (now - AUTO_RANK_TS < AUTO_RANK_TTL):
         return AUTO_RANKS
 
+    if not is_leader():
+        return AUTO_RANKS  # the leader's ranks, pulled by shard_heartbeat_job
+
     load_data()
+    windows = flow_windows(now)
     vol_by_sym: Dict[str, float] = {}
+    counted: set = set()
 
     for pid, rec in DATA.get("pairs", {}).items():
         if not isinstance(rec, dict):
@@ -3378,11 +4769,15 @@ def refresh_auto_ranks(force: bool = False) -> Dict[str, int]:
         sym = (rec.get("symbol") or "").strip().upper()
         if not sym:
             continue
-        stats = fetch_pair_stats(pid)
-        v = safe_float(stats.get("volume_h6_usd"))
-        if v is None or v <= 0:
+        key = (rec.get("token_address") or "").strip() or pid
+        if key in counted:
+            continue  # several pools of one token share the same flow
+        counted.add(key)
+        w = windows.get(key)
+        v = float(w.get("volume_ton") or 0.0) if w else 0.0
+        if v <= 0:
             continue
-        vol_by_sym[sym] = vol_by_sym.get(sym, 0.0) + float(v)
+        vol_by_sym[sym] = vol_by_sym.get(sym, 0.0) + v
 
     ranked = sorted(vol_by_sym.items(), key=lambda x: x[1], reverse=True)
     AUTO_RANKS = {sym: i + 1 for i, (sym, _v) in enumerate(ranked)}
@@ -3466,12 +4861,21 @@ async def ranks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not _is_admin(update):
         return
     fr = list_forced_ranks()
-    if not fr:
+    auto = refresh_auto_ranks(force=False)
+    if not fr and not auto:
         await update.message.reply_text("No forced ranks set.")
         return
-    lines = ["📌 Forced Trend Ranks (SpyTON Trending):\n"]
-    for sym, rk in sorted(fr.items(), key=lambda x: int(x[1]) if str(x[1]).isdigit() else 9999):
-        lines.append(f"✅ {sym} = #{rk}")
+    lines = []
+    if fr:
+        lines.append("📌 Forced Trend Ranks (SpyTON Trending):\n")
+        for sym, rk in sorted(fr.items(), key=lambda x: int(x[1]) if str(x[1]).isdigit() else 9999):
+            lines.append(f"✅ {sym} = #{rk}")
+    else:
+        lines.append("No forced ranks set.")
+    if auto:
+        lines.append(f"\n📊 Auto Ranks (TON volume, last {LB_WINDOW_MINUTES // 60}h):")
+        for sym, rk in sorted(auto.items(), key=lambda x: x[1])[:10]:
+            lines.append(f"#{rk} {sym}")
     await update.message.reply_text("\n".join(lines))
 
 async def addtoken(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -3853,6 +5257,100 @@ async def listpairs(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text += f"   tg: {tg}\n"
     await update.message.reply_text(text, parse_mode="HTML", disable_web_page_preview=True)
 
+async def flow_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/flow <SYMBOL or TOKEN_ADDRESS> [HOURS]  - volume + top buyers from trade history"""
+    if not context.args:
+        await update.message.reply_text("Usage: /flow <SYMBOL or TOKEN_ADDRESS> [HOURS]")
+        return
+    store = get_trade_store()
+    if store is None:
+        await update.message.reply_text("Trade history is disabled.")
+        return
+
+    key = context.args[0].strip()
+    try:
+        hours = max(0.1, min(float(context.args[1]), 24 * 30)) if len(context.args) > 1 else 6.0
+    except ValueError:
+        hours = 6.0
+
+    load_data()
+    token = key
+    sym = key.upper().replace("$", "")
+    if not TON_ADDR_RE.match(key):
+        for _pid, rec in DATA.get("pairs", {}).items():
+            if isinstance(rec, dict) and (rec.get("symbol") or "").strip().upper() == sym and rec.get("token_address"):
+                token = rec["token_address"].strip()
+                break
+
+    since = time.time() - hours * 3600
+    vol = await _to_thread(store.token_volume, token, since)
+    top = await _to_thread(store.top_buyers, token, since, None, 5)
+
+    lines = [
+        f"📊 <b>{html.escape(sym)}</b> last {hours:g}h",
+        f"Volume: <b>{vol['ton']:,.2f} TON</b>",
+        f"Buys: <b>{vol['buys']}</b> | Buyers: <b>{vol['buyers']}</b>",
+    ]
+    if top:
+        lines.append("\nTop buyers:")
+        for i, (b, t) in enumerate(top, 1):
+            lines.append(f"{i}. <a href='https://tonviewer.com/{b}'>{short(b)}</a> — {t:,.2f} TON")
+    await update.message.reply_text("\n".join(lines), parse_mode="HTML", disable_web_page_preview=True)
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def _sparkline(vals: List[float]) -> str:
+    if not vals:
+        return ""
+    lo, hi = min(vals), max(vals)
+    if hi <= lo:
+        return SPARK_CHARS[3] * len(vals)
+    k = (len(SPARK_CHARS) - 1) / (hi - lo)
+    return "".join(SPARK_CHARS[int((v - lo) * k)] for v in vals)
+
+async def chart_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/chart <SYMBOL or POOL> [1m|5m|1h]  - recent candles built from detected buys"""
+    if not context.args:
+        await update.message.reply_text("Usage: /chart <SYMBOL or POOL> [1m|5m|1h]")
+        return
+    key = context.args[0].strip()
+    tf = (context.args[1].strip().lower() if len(context.args) > 1 else "5m")
+    if tf not in TIMEFRAMES:
+        tf = "5m"
+
+    load_data()
+    pool = key
+    sym = key.upper().replace("$", "")
+    if key not in DATA.get("pairs", {}):
+        for pid, rec in DATA.get("pairs", {}).items():
+            if isinstance(rec, dict) and (rec.get("symbol") or "").strip().upper() == sym:
+                pool = pid
+                break
+    else:
+        sym = (DATA["pairs"][key].get("symbol") or "?").upper()
+
+    bars = CANDLES.last(pool, tf, 24)
+    if not bars:
+        await update.message.reply_text(f"No {tf} candles for {sym} yet.")
+        return
+
+    _t, o, h, l, c, v, n = bars[-1]
+    ch = CANDLES.change_pct(pool, tf, 24)
+    if ch is None:
+        first_close = bars[0][4]
+        ch = (c / first_close - 1.0) * 100.0 if first_close else 0.0
+    ton_usd = ton_price_cache_value()
+    usd_part = f" (${c * ton_usd:.8f})" if ton_usd > 0 else ""
+    await update.message.reply_text(
+        f"📈 <b>{html.escape(sym)}</b> {tf} · last {len(bars)} bars\n"
+        f"<code>{_sparkline([b[4] for b in bars])}</code>\n\n"
+        f"O {o:.10g}  H {h:.10g}\nL {l:.10g}  C {c:.10g} TON{usd_part}\n"
+        f"Bar: {n} buys, {v:,.2f} TON\n"
+        f"Change (24×{tf}): {ch:+.1f}%",
+        parse_mode="HTML",
+        disable_web_page_preview=True,
+    )
+
 async def setleaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     load_state()
     msg = await context.bot.send_message(
@@ -3877,19 +5375,81 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if isinstance(r, dict) and (r.get("source") == "blum") and r.get("approved_early"):
                 approved_blum += 1
 
+    if SHARD is not None:
+        pairs_all = [(pid, rec) for pid, rec in DATA.get("pairs", {}).items() if isinstance(rec, dict)]
+        owned = sum(1 for pid, rec in pairs_all if shard_owns(pid, rec.get("token_address") or ""))
+        shard_line = (
+            f"Shard: {SHARD_ID} ({'leader' if is_leader() else 'follower'}) · "
+            f"{len(SHARD.members)} members · owns {owned}/{len(pairs_all)} pairs · "
+            f"rebalances {SHARD.rebalances}\n"
+        )
+    else:
+        shard_line = ""
+
+    jobs = job_summary()
+    fmt_s = lambda v: "—" if v is None else ("inf" if v == float("inf") else f"{v:g}s")
+    job_lines = "".join(
+        f"  {name}: drift p95 ≤{fmt_s(st['drift_p95'])} · run p95 ≤{fmt_s(st['run_p95'])} · "
+        f"skips {int(st['skips'])} · timeouts {int(st['timeouts'])}\n"
+        for name, st in sorted(jobs.items())
+    ) or "  not scheduled\n"
+
+    lat = latency_summary()
+    lat_lines = "".join(
+        f"  {src}: p50 {st['p50']:.1f}s · p95 {st['p95']:.1f}s · max {st['max']:.1f}s (n={int(st['n'])})\n"
+        for src, st in sorted(lat.items())
+    ) or "  no traced buys yet\n"
+
+    writes_full, writes_journal = M_STATE_WRITES.get(kind="full"), M_STATE_WRITES.get(kind="journal")
+    writes_line = (
+        f"State writes: {int(writes_full)} full · {int(writes_journal)} journal "
+        f"({(writes_full + writes_journal) / max(1.0, time.perf_counter() - _BOOT_T0):.2f}/s since start)\n"
+    )
+
+    price = TON_PRICE.status()
+    fresh = [name for name, src in price["sources"].items() if src["usd"] is not None]
+    price_age = "" if price["age"] is None else f" · {price['age']:.0f}s old"
+    price_line = (
+        f"TON price: ${price['usd']:.4f}{' (STALE)' if price['stale'] else ''} · "
+        f"{', '.join(fresh) or 'no fresh source'}{price_age}\n"
+    )
+
+    boot = boot_summary()
+    boot_line = (
+        f"Boot: first poll {fmt_s(boot['first_poll'] and round(boot['first_poll'], 2))} · "
+        f"first alert {fmt_s(boot['first_alert'] and round(boot['first_alert'], 2))}\n"
+    )
+
     await update.message.reply_text(
         f"Tracked pairs: {len(DATA.get('pairs',{}))}\n"
+        f"{shard_line}"
+        f"{boot_line}"
         f"Watchlist: {watch_count}\n"
         f"Blum approved: {approved_blum}\n"
         f"Leaderboard: {'SET' if STATE.get('leaderboard_msg_id') else 'NOT SET'}\n"
         f"STON last block: {STATE.get('ston_last_block') if STATE.get('ston_last_block') is not None else 'NOT SET'}\n"
         f"Events pulled last: {LAST_EVENTS_COUNT}\n"
         f"HTTP: {LAST_HTTP_INFO}\n"
+        f"TonAPI gaps recovered: {TONAPI_PAGING_STATS['gaps_recovered']}/{TONAPI_PAGING_STATS['gaps_detected']} "
+        f"(extra pages {TONAPI_PAGING_STATS['extra_pages']}, budget hit {TONAPI_PAGING_STATS['budget_hit']}, "
+        f"failed pages {TONAPI_PAGING_STATS['page_failed']}, "
+        f"past catch-up window {TONAPI_PAGING_STATS['catchup_horizon']})\n"
+        f"{writes_line}"
+        f"Outbox: {len(STATE.get('outbox') or {})} pending · {int(M_OUTBOX.get(result='delivered'))} delivered · "
+        f"{int(M_OUTBOX.get(result='retry'))} retries · {int(M_OUTBOX.get(result='expired'))} expired · "
+        f"{int(M_OUTBOX.get(result='unacked'))} unacked\n"
+        f"{price_line}"
         f"Header image: {'FOUND' if file_exists(HEADER_IMAGE_PATH) else 'MISSING'} ({HEADER_IMAGE_PATH})\n"
         f"TONAPI_KEY: {'SET' if TONAPI_KEY else 'NOT SET'}\n"
         f"DeDust enabled: {'YES' if DEDUST_ENABLED else 'NO'}\n"
         f"DeDust pools tracked: {sum(1 for _pid, rec in DATA.get('pairs', {}).items() if str(rec.get('dex','')).lower()=='dedust')}\n"
         f"Blum early enabled: {'YES' if BLUM_EARLY_ENABLED else 'NO'}\n"
+        f"Blum last cycle: {BLUM_LAST_CYCLE['duration_ms'] if BLUM_LAST_CYCLE['duration_ms'] is not None else '—'} ms "
+        f"({BLUM_LAST_CYCLE['tokens']} tokens)\n"
+        f"\nChain → Telegram latency:\n"
+        f"{lat_lines}"
+        f"\nJobs:\n"
+        f"{job_lines}"
         f"\nLeaderboard filters:\n"
         f"LB_MIN_LIQ_USD: {LB_MIN_LIQ_USD}\n"
         f"LB_MIN_MC_USD: {LB_MIN_MC_USD}\n"
@@ -3902,31 +5462,50 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ===================== JOBS =====================
 async def ton_price_cache_job(context: ContextTypes.DEFAULT_TYPE):
-    """Keep TON USD price cached so buy posts don't wait on external API."""
-    if not TON_PRICE_API:
+    """Poll the HTTP TON price sources so buy posts don't wait on an external API."""
+    if not TON_PRICE_URLS:
         return
     try:
         await _to_thread(refresh_ton_price_cache)
     except Exception:
         return
 
+async def holders_job(context: ContextTypes.DEFAULT_TYPE):
+    """Reconcile a few holder baselines with TonAPI (tokens never counted first).
+
+    The lookups share TONAPI_FETCH_SEM with the trackers' TonAPI polls."""
+    if not FAST_HOLDERS_ENABLED:
+        return
+    tokens = {
+        (rec.get("token_address") or "").strip()
+        for pid, rec in (DATA.get("pairs") or {}).items()
+        if isinstance(rec, dict) and shard_owns(pid, (rec.get("token_address") or "").strip())
+    }
+    tokens.discard("")
+    now = time.time()
+    HOLDERS.prune(tokens, now)
+    for token in HOLDERS.due(tokens | set(HOLDERS.active), now, HOLDERS_RECONCILE_BATCH):
+        async with TONAPI_FETCH_SEM:
+            t0 = time.time()
+            v = await _to_thread(fetch_holders_count_tonapi, token)
+        if v is None:
+            HOLDERS.fail(token, t0)
+        else:
+            HOLDERS.reconcile(token, v, t0)
+
 async def auto_ranks_job(context: ContextTypes.DEFAULT_TYPE):
     try:
-        await _to_thread(refresh_auto_ranks, True)
+        # in-memory now (swap flow); keep it on the loop thread
+        refresh_auto_ranks(True)
     except Exception:
         pass
 
 async def ston_tracker_job(context: ContextTypes.DEFAULT_TYPE):
-    """Poll STON exported events feed and post BUY-ONLY swaps for tracked STON pairs."""
+    """Poll STON exported events feed and post BUY-ONLY swaps for tracked STON pairs.
 
-    # FAST PATH: TonAPI pool tx polling (lower latency than export feed)
-    if TONAPI_KEY:
-        try:
-            await ston_tracker_job_fast(context)
-            # continue to export-feed poll as fallback (seen.json dedupes)
-
-        except Exception as e:
-            log.exception("ston_tracker_job_fast failed, falling back: %s", e)
+    Fallback for the TonAPI fast path, which runs as its own job
+    (ston_tracker_job_fast); seen.json dedupes buys both of them see.
+    """
     try:
         cleanup_seen()
         load_data()
@@ -3940,40 +5519,54 @@ async def ston_tracker_job(context: ContextTypes.DEFAULT_TYPE):
         if not isinstance(last, int) or last <= 0:
             # First run: start near tip so we don't spam old history
             STATE["ston_last_block"] = max(0, int(latest) - 2)
-            save_state()
+            save_cursors()
             return
 
         from_block = int(last) + 1
         to_block = int(latest)
 
-        # Avoid huge ranges
-        if to_block - from_block > 50:
-            from_block = to_block - 50
+        # Catch up on missed blocks (restart / scale-to-zero) in STON_EVENTS_CHUNK ranges,
+        # at most STON_CATCHUP_MAX_BLOCKS back; stale events are not posted (enqueue_buy)
+        if to_block - from_block + 1 > STON_CATCHUP_MAX_BLOCKS:
+            log.warning("ston export: skipping %d blocks beyond the catch-up window",
+                        to_block - STON_CATCHUP_MAX_BLOCKS + 1 - from_block)
+            from_block = to_block - STON_CATCHUP_MAX_BLOCKS + 1
 
-        evs = await _to_thread(ston_events, from_block, to_block)
-        STATE["ston_last_block"] = to_block
-        save_state()
-
-        if not evs:
-            return
+        evs = []
+        for lo in range(from_block, to_block + 1, STON_EVENTS_CHUNK):
+            evs.extend(await _to_thread(ston_events, lo, min(to_block, lo + STON_EVENTS_CHUNK - 1)))
+        fetched_at = time.time()
 
         for ev in evs:
             if not isinstance(ev, dict):
                 continue
 
+            pool = ev.get("pairId")
+            if pool in TON_PRICE_POOLS and (ev.get("eventType") or "").lower() == "swap":
+                leg = _TON_PRICE_POOL_LEG[pool] if pool in _TON_PRICE_POOL_LEG else await _to_thread(ton_price_pool_leg, pool)
+                if leg is not None:
+                    observe_ston_price_event(ev, leg)
+
             buy = extract_buy_from_ston_event(ev)
             if not buy:
                 continue
+            trace = new_trace("ston_export", ston_event_utime(ev), fetched_at)
+            trace_mark(trace, "parse")
 
             tx = buy.get("tx") or ""
             key_plain = f"ston:{tx}"
-            if not tx or tx in SEEN_TX_STON or key_plain in SEEN_TX_STON:
+            if not tx:
+                continue
+            if tx in SEEN_TX_STON or key_plain in SEEN_TX_STON:
+                M_DEDUPE.inc(source="ston_export")
                 continue
 
             pair_id = buy["pair_id"]
             rec = DATA["pairs"].get(pair_id, {})
             sym = (rec.get("symbol") or "?").strip().upper()
             token_addr = (rec.get("token_address") or "").strip()
+            if not shard_owns(pair_id, token_addr):
+                continue
 
             buyer = buy.get("buyer") or ""
             ton_amt = safe_float(buy.get("ton"))
@@ -3993,9 +5586,10 @@ async def ston_tracker_job(context: ContextTypes.DEFAULT_TYPE):
             _ts = time.time()
             SEEN_TX_STON[tx] = _ts
             SEEN_TX_STON[key_plain] = _ts
+            trace["dedupe"] = _ts
 
             # Post message with header
-            await post_buy_message(
+            await enqueue_buy(
                 context=context,
                 sym=sym,
                 token_addr=token_addr,
@@ -4006,7 +5600,12 @@ async def ston_tracker_job(context: ContextTypes.DEFAULT_TYPE):
                 token_amt=token_amt,
                 pos_txt=pos_txt,
                 source_label=(rec.get("dex_label") or "STON.fi"),
+                trace=trace,
             )
+
+        # past the range only once its buys are in the outbox (same journal append)
+        STATE["ston_last_block"] = to_block
+        save_cursors()
     except Exception as e:
         log.exception("ston_tracker_job error: %s", e)
 
@@ -4022,127 +5621,368 @@ async def dedust_tracker_job(context: ContextTypes.DEFAULT_TYPE):
       - No backfill on first run per pool (prevents old tx repost)
       - Persistent dedupe across restarts (STATE['dedust_seen'])
       - Cursor uses LT per pool (STATE['dedust_last_lt'])
+    Single-flight: scheduled under DEDUST_POLL_LOCK (see supervised_job).
     """
     global LAST_HTTP_INFO, LAST_EVENTS_COUNT
 
     if not DEDUST_ENABLED:
         return
-    if DEDUST_POLL_LOCK.locked():
-        return
+    try:
+        pools = DATA.get("dedust_pools") or {}
+        if not isinstance(pools, dict):
+            pools = {}
 
-    async with DEDUST_POLL_LOCK:
-        try:
-            pools = DATA.get("dedust_pools") or {}
-            if not isinstance(pools, dict):
-                pools = {}
-
-            # Back-compat: older configs store DeDust pools inside DATA["pairs"]
-            if not pools:
-                pairs = DATA.get("pairs") or {}
-                if isinstance(pairs, dict):
-                    for pool_addr, rec in pairs.items():
-                        if isinstance(rec, dict) and str(rec.get("dex", "")).lower() == "dedust":
-                            pools[pool_addr] = rec
-
-            if not pools:
-                return
+        # Back-compat: older configs store DeDust pools inside DATA["pairs"]
+        if not pools:
+            pairs = DATA.get("pairs") or {}
+            if isinstance(pairs, dict):
+                for pool_addr, rec in pairs.items():
+                    if isinstance(rec, dict) and str(rec.get("dex", "")).lower() == "dedust":
+                        pools[pool_addr] = rec
+
+        pools = {
+            p: rec for p, rec in pools.items()
+            if shard_owns(p, str((rec.get("token") or rec.get("token_address") or "") if isinstance(rec, dict) else ""))
+        }
+        if not pools:
+            return
 
-            # state maps
-            if not isinstance(STATE.get("dedust_last_lt"), dict):
-                STATE["dedust_last_lt"] = {}
-            last_lt_map: Dict[str, int] = STATE.get("dedust_last_lt", {})
+        # state maps
+        if not isinstance(STATE.get("dedust_last_lt"), dict):
+            STATE["dedust_last_lt"] = {}
+        last_lt_map: Dict[str, int] = STATE.get("dedust_last_lt", {})
 
-            if not isinstance(STATE.get("dedust_seen"), dict):
-                STATE["dedust_seen"] = {}
-            seen_persist: Dict[str, float] = STATE.get("dedust_seen", {})
+        if not isinstance(STATE.get("dedust_seen"), dict):
+            STATE["dedust_seen"] = {}
+        seen_persist: Dict[str, float] = STATE.get("dedust_seen", {})
 
-            now = time.time()
-            # prune old
-            for k in list(seen_persist.keys()):
-                try:
-                    if now - float(seen_persist.get(k, 0.0)) > SEEN_TTL_SECONDS:
-                        seen_persist.pop(k, None)
-                except Exception:
+        now = time.time()
+        # prune old
+        for k in list(seen_persist.keys()):
+            try:
+                if now - float(seen_persist.get(k, 0.0)) > SEEN_TTL_SECONDS:
                     seen_persist.pop(k, None)
+            except Exception:
+                seen_persist.pop(k, None)
 
-            total_new = 0
+        total_new = 0
 
-            for pool, rec in pools.items():
-                if not pool:
-                    continue
-                token_addr = None
-                sym = None
-                pair_id = pool
-                if isinstance(rec, dict):
-                    token_addr = rec.get("token") or rec.get("token_address") or rec.get("jetton_master")
-                    sym = rec.get("symbol") or rec.get("sym")
-                token_addr = str(token_addr or "").strip()
-                sym = str(sym or "").strip() or "TOKEN"
-
-                txs = tonapi_account_transactions(pool, limit=DEDUST_POLL_LIMIT)
-                if not txs:
-                    continue
+        # Fetch every pool concurrently (in worker threads) before parsing,
+        # so a slow pool never blocks the event loop or the other pools.
+        txs_by_pool = await tonapi_account_transactions_many(
+            [p for p in pools.keys() if p], DEDUST_POLL_LIMIT, DEDUST_CONCURRENCY, since_lt=last_lt_map
+        )
+        fetched_at = time.time()
+
+        for pool, rec in pools.items():
+            if not pool:
+                continue
+            token_addr = None
+            sym = None
+            pair_id = pool
+            if isinstance(rec, dict):
+                token_addr = rec.get("token") or rec.get("token_address") or rec.get("jetton_master")
+                sym = rec.get("symbol") or rec.get("sym")
+            token_addr = str(token_addr or "").strip()
+            sym = str(sym or "").strip() or "TOKEN"
+
+            txs = txs_by_pool.get(pool) or []
+            if not txs:
+                continue
 
-                txs_sorted = sorted(txs, key=lambda t: _tx_lt(t))
-                newest_lt = _tx_lt(txs_sorted[-1])
-                last_lt = int(last_lt_map.get(pool) or 0)
+            txs_sorted = sorted(txs, key=lambda t: _tx_lt(t))
+            newest_lt = _tx_lt(txs_sorted[-1])
+            last_lt = int(last_lt_map.get(pool) or 0)
 
-                # First run: set cursor and DO NOT post old
-                if last_lt == 0 and newest_lt > 0:
-                    last_lt_map[pool] = newest_lt
+            # First run: set cursor and DO NOT post old
+            if last_lt == 0 and newest_lt > 0:
+                last_lt_map[pool] = newest_lt
+                continue
+
+            for tx in txs_sorted:
+                lt = _tx_lt(tx)
+                if lt <= last_lt:
                     continue
 
-                for tx in txs_sorted:
-                    lt = _tx_lt(tx)
-                    if lt <= last_lt:
-                        continue
+                buys = dedust_extract_buys_from_tonapi_tx(tx, pool)
+                if not buys:
+                    continue
+                parsed_at = time.time()
 
-                    buys = dedust_extract_buys_from_tonapi_tx(tx, pool)
-                    if not buys:
+                for b in buys:
+                    txh = str(b.get("tx") or "")
+                    dedupe_key = f"{pool}:{txh}"
+                    if txh and dedupe_key in seen_persist:
+                        M_DEDUPE.inc(source="dedust")
                         continue
+                    if txh:
+                        seen_persist[dedupe_key] = time.time()
+                    trace = new_trace("dedust", tx.get("utime"), fetched_at)
+                    trace["parse"] = parsed_at
+                    trace_mark(trace, "dedupe")
 
-                    for b in buys:
-                        txh = str(b.get("tx") or "")
-                        dedupe_key = f"{pool}:{txh}"
-                        if txh and dedupe_key in seen_persist:
-                            continue
-                        if txh:
-                            seen_persist[dedupe_key] = time.time()
-
-                        await post_buy_message(
-                            context=context,
-                            sym=sym,
-                            token_addr=token_addr,
-                            pair_id=pair_id,
-                            buyer=b.get("buyer") or "Unknown",
-                            tx_hash=txh or "",
-                            ton_amt=float(b.get("ton") or 0.0),
-                            token_amt=float(b.get("token_amt") or 0.0),
-                            pos_txt="",
-                            source_label="DeDust",
-                        )
-                        total_new += 1
-
-                    if lt > last_lt:
-                        last_lt = lt
-                        last_lt_map[pool] = last_lt
-
-            STATE["dedust_last_lt"] = last_lt_map
-            STATE["dedust_seen"] = seen_persist
-            save_state()
-
-            LAST_EVENTS_COUNT = total_new
-            LAST_HTTP_INFO = f"DeDust TonAPI OK new={total_new}"
+                    await enqueue_buy(
+                        context=context,
+                        sym=sym,
+                        token_addr=token_addr,
+                        pair_id=pair_id,
+                        buyer=b.get("buyer") or "Unknown",
+                        tx_hash=txh or "",
+                        ton_amt=float(b.get("ton") or 0.0),
+                        token_amt=float(b.get("token_amt") or 0.0),
+                        pos_txt="",
+                        source_label="DeDust",
+                        trace=trace,
+                    )
+                    total_new += 1
 
-        except Exception as e:
-            log.exception("dedust_tracker_job error: %s", e)
+                if lt > last_lt and pool not in TONAPI_GAPS:
+                    last_lt = lt
+                    last_lt_map[pool] = last_lt
+
+        STATE["dedust_last_lt"] = last_lt_map
+        STATE["dedust_seen"] = seen_persist
+        save_cursors()
+
+        LAST_EVENTS_COUNT = total_new
+        LAST_HTTP_INFO = f"DeDust TonAPI OK new={total_new}"
+
+    except Exception as e:
+        log.exception("dedust_tracker_job error: %s", e)
+
+
+
+# ===================== WARM START SNAPSHOT =====================
+# fly.toml stops idle machines (min_machines_running = 0), so the bot cold-starts often.
+# Caches that only fill up over time are saved every SNAPSHOT_INTERVAL seconds and at
+# exit, and restored at boot before the first job runs (cursors are in STATE_FILE + journal).
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1") == "1"
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "")  # default: <STATE_FILE>.snapshot.json (per process)
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "60"))
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", str(7 * 24 * 3600)))  # older snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+def named_caches() -> List[Tuple[str, Dict[str, Any]]]:
+    return [
+        ("pair_stats", PAIR_CACHE), ("token_stats", TOKEN_STATS_CACHE), ("pair_meta", PAIR_META_CACHE),
+        ("jetton_decimals", JETTON_DECIMALS_CACHE), ("holders", HOLDERS.baselines),
+        ("seen_ston", SEEN_TX_STON), ("seen_dedust", SEEN_TX_DEDUST), ("seen_blum", SEEN_TX_BLUM),
+    ]
+
+def snapshot_path() -> str:
+    if SNAPSHOT_FILE:
+        return SNAPSHOT_FILE
+    root, _ext = os.path.splitext(STATE_FILE)
+    return f"{root}.snapshot.json"
+
+def save_snapshot():
+    """Blocking (worker thread / atexit). Shallow copies, so the trackers can keep going."""
+    snap = {
+        "v": SNAPSHOT_VERSION,
+        "ts": time.time(),
+        "ton_price": dict(_TON_PRICE_CACHE),
+        "caches": {name: dict(cache) for name, cache in named_caches()},
+        "swap_flow": SWAP_FLOW.snapshot(),
+    }
+    try:
+        _atomic_write(snapshot_path(), json_dumps(snap, default=str))
+    except Exception as e:
+        log.warning("snapshot write failed: %s", e)
+    if CANDLES_ENABLED:
+        CANDLES.flush()
 
+def restore_snapshot():
+    """Fill empty caches from the last snapshot (entries keep their own timestamps / TTLs)."""
+    path = snapshot_path()
+    try:
+        snap = read_json(path)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        log.warning("snapshot %s unreadable: %s", path, e)
+        return
+    if not isinstance(snap, dict) or snap.get("v") != SNAPSHOT_VERSION:
+        return
+    age = time.time() - float(snap.get("ts") or 0)
+    if age > SNAPSHOT_MAX_AGE:
+        log.warning("snapshot %s is %.0fh old; cold start", path, age / 3600)
+        return
+
+    saved = snap.get("caches") or {}
+    n = 0
+    for name, cache in named_caches():
+        for k, v in (saved.get(name) or {}).items():
+            if k not in cache:
+                cache[k] = tuple(v) if name == "holders" and isinstance(v, list) else v
+                n += 1
+    price = snap.get("ton_price") or {}
+    if not _TON_PRICE_CACHE.get("v") and safe_float(price.get("v")) > 0:
+        _TON_PRICE_CACHE["v"] = safe_float(price.get("v"))
+        _TON_PRICE_CACHE["ts"] = safe_float(price.get("ts"))
+    SWAP_FLOW.restore(snap.get("swap_flow") or {})
+    cleanup_seen()
+    log.warning(
+        "Warm start from %s (%.0fs old): %d cache entries, %d flow tokens, TON $%.3f",
+        path, age, n, len(SWAP_FLOW.tokens), ton_price_cache_value(),
+    )
 
+def init_snapshot():
+    if CANDLES_ENABLED:
+        atexit.register(CANDLES.flush)  # open bars, even with snapshots off
+    if not SNAPSHOT_ENABLED:
+        return
+    restore_snapshot()
+    atexit.register(save_snapshot)
+
+async def snapshot_job(context: ContextTypes.DEFAULT_TYPE):
+    await _to_thread(save_snapshot)
+
+async def _post_init(app):
+    boot_mark("telegram_ready")
+    _schedule_boot_report(asyncio.get_running_loop())
+    app.create_task(loop_lag_monitor())
+    ctx = SimpleNamespace(bot=app.bot, application=app)
+    if OUTBOX_ENABLED:
+        app.create_task(outbox_dispatcher(ctx))
+    if PROCESS_ROLE == "post":
+        async def _post_linked(rec: Dict[str, Any]):
+            await enqueue_buy(ctx, **rec)
+
+        async def _commit_linked():
+            save_cursors()  # on the loop: the journal diff isn't thread-safe
+            if CURSOR_JOURNAL is not None:
+                await _to_thread(CURSOR_JOURNAL.sync)  # on disk before the worker forgets the buys
+
+        _server, consumer = await serve_buys(
+            BUY_LINK_SOCKET,
+            _post_linked,
+            queue_max=BUY_LINK_QUEUE_MAX,
+            on_depth=lambda n: M_QUEUE.set(n, queue="buy_link"),
+            key=lambda rec: outbox_key(rec["pair_id"], rec["tx_hash"]),
+            commit=_commit_linked,
+        )
+        app.create_task(consumer)
+        log.warning("Post process: receiving buys on %s", BUY_LINK_SOCKET)
+
+async def _post_shutdown(app):
+    pass  # the web server outlives the app (see main)
+
+# ===================== INGEST WORKER (PROCESS_ROLE=ingest) =====================
+BUY_LINK: Optional[BuySender] = None
+
+def ingest_jobs() -> List[Tuple[Any, float, float, Optional[asyncio.Lock]]]:
+    """(job, interval, first, lock) for the trackers; shared by both process layouts."""
+    return [
+        (ston_tracker_job_fast, STON_FAST_POLL_INTERVAL, 0.5, STON_POLL_LOCK),
+        (ston_tracker_job, STON_POLL_INTERVAL, 1, None),
+        (dedust_tracker_job, DEDUST_POLL_INTERVAL, 1.5, DEDUST_POLL_LOCK),
+        (blum_early_tracker_job, BLUM_POLL_INTERVAL, 3, BLUM_POLL_LOCK),
+    ]
+
+TRACKER_JOBS = tuple(fn.__name__ for fn, *_ in ingest_jobs())
+
+def _schedule_boot_report(loop: asyncio.AbstractEventLoop):
+    if PROFILE_STARTUP:
+        loop.call_later(PROFILE_STARTUP_TIMEOUT, print_boot_report)
+
+async def _repeat_job(fn, interval: float, first: float, lock: Optional[asyncio.Lock]):
+    """Fixed-rate loop standing in for JobQueue.run_repeating (no PTB in the worker):
+    same supervisor, jitter, drift and coalescing of missed ticks."""
+    name = fn.__name__
+    job = supervised_job(fn, interval, lock)
+    ctx = SimpleNamespace(bot=None, application=None, job=SimpleNamespace(job=SimpleNamespace(id=name)))
+    loop = asyncio.get_running_loop()
+    due = loop.time() + first
+    while True:
+        start = due + random.uniform(0, interval * JOB_JITTER)
+        JOB_DUE[name] = time.time() + (start - loop.time())
+        await asyncio.sleep(max(0.0, start - loop.time()))
+        loop.create_task(job(ctx))  # overlap is handled by the job's single-flight lock
+        due += interval
+        while due <= loop.time():
+            due += interval
+            M_JOB_SKIPS.inc(job=name)
+
+async def _run_ingest():
+    global BUY_LINK
+    BUY_LINK = BuySender(BUY_LINK_SOCKET, BUY_LINK_QUEUE_MAX, on_ack=_outbox_acked)
+    loop = asyncio.get_running_loop()
+    _schedule_boot_report(loop)
+    loop.create_task(loop_lag_monitor())
+    if INGEST_WEB_PORT:
+        await start_web(INGEST_WEB_PORT)
+    if OUTBOX_ENABLED:
+        loop.create_task(outbox_dispatcher(SimpleNamespace(bot=None, application=None)))
+    for fn, interval, first, lock in ingest_jobs():
+        loop.create_task(_repeat_job(fn, interval, first, lock))
+    if SNAPSHOT_ENABLED:
+        loop.create_task(_repeat_job(snapshot_job, SNAPSHOT_INTERVAL, SNAPSHOT_INTERVAL, None))
+    if JOURNAL_ENABLED:
+        loop.create_task(_repeat_job(journal_job, JOURNAL_FSYNC_INTERVAL, JOURNAL_FSYNC_INTERVAL, None))
+    while True:
+        # retry buffered records while the post process is down / restarting
+        await asyncio.sleep(1.0)
+        if BUY_LINK.pending:
+            await BUY_LINK.flush()
+        M_QUEUE.set(len(BUY_LINK.pending), queue="buy_link_pending")
+        M_QUEUE.set(BUY_LINK.dropped, queue="buy_link_dropped")
+
+def init_process_role():
+    """The post process keeps its own state file (leaderboard id); cursors belong to the worker."""
+    global STATE_FILE
+    if PROCESS_ROLE == "post":
+        root, ext = os.path.splitext(STATE_FILE)
+        STATE_FILE = f"{root}.post{ext}"
+
+def run_ingest():
+    """PROCESS_ROLE=ingest: poll STON / DeDust / Blum and ship buys to the post process."""
+    init_http_capture()
+    load_data()
+    load_state()
+    init_snapshot()
+    boot_mark("state_loaded")
+    print(f"🟢 SpyTON ingest worker running… (buys → {BUY_LINK_SOCKET})")
+    asyncio.run(_run_ingest())
+
+async def _run_sharded(app):
+    """Sharded mode runner: jobs start on every instance, update polling is
+    started / stopped by shard_heartbeat_job as leadership moves."""
+    import signal
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    async with app:
+        await _post_init(app)
+        await app.start()
+        try:
+            await stop.wait()
+        finally:
+            if app.updater is not None and app.updater.running:
+                await app.updater.stop()
+            await app.stop()
+            await _post_shutdown(app)
+            SHARD.leave()
 
 def main():
+    if PROCESS_ROLE not in ("all", "ingest", "post"):
+        raise RuntimeError(f"PROCESS_ROLE must be all, ingest or post (got {PROCESS_ROLE!r})")
+    if PROCESS_ROLE != "all" and SHARD_DB:
+        raise RuntimeError("PROCESS_ROLE=ingest/post can't be combined with SHARD_DB")
+    if PROCESS_ROLE == "ingest":
+        return run_ingest()
     if not BOT_TOKEN:
         raise RuntimeError("Missing BOT_TOKEN")
 
+    init_http_capture()
+    init_sharding()
+    init_process_role()
+    init_snapshot()
+
     # CHANNEL_ID and ADMIN_ID are optional for the multi-group setup:
     # - If CHANNEL_ID is 0, the bot will only work in groups (no master channel posting).
     # - If ADMIN_ID is 0, super-admin-only commands are disabled, but group-admin flows still work.
@@ -4151,52 +5991,36 @@ def main():
     if ADMIN_ID == 0:
         log.warning("ADMIN_ID not set (0). Super-admin-only commands are disabled.")
 
-    # Start web server once (for UptimeRobot / Replit public URL)
-    global _WEB_STARTED
-    try:
-        _WEB_STARTED
-    except NameError:
-        _WEB_STARTED = False
-
-    if not _WEB_STARTED:
-        try:
-            t = threading.Thread(target=run_web, daemon=True)
-            t.start()
-            _WEB_STARTED = True
-        except Exception as e:
-            log.exception("Failed to start web server: %s", e)
+    # Optional self-ping of the public URL, once per process
+    start_self_ping_once()
 
-    # Keep-alive self ping (helps Replit stay awake)
-    global _PING_STARTED
+    # One loop for the whole process: the web endpoints bind before Telegram
+    # initializes and keep serving while the runner below restarts the app
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(start_web(PORT))
     try:
-        _PING_STARTED
-    except NameError:
-        _PING_STARTED = False
-
-    PUBLIC_URL = os.getenv("PUBLIC_URL", "").strip()
-    if PUBLIC_URL and not _PING_STARTED:
-        def _self_ping_loop():
-            # ping both endpoints for reliability
-            base = PUBLIC_URL.rstrip("/")
-            urls = [base + "/uptimerobot", base + "/health"]
-            while True:
-                for url in urls:
-                    try:
-                        requests.get(url, timeout=10)
-                    except Exception:
-                        pass
-                time.sleep(240)  # 4 minutes
+        _run_resilient(loop)
+    finally:
+        loop.run_until_complete(stop_web())
+        loop.close()
 
-        threading.Thread(target=_self_ping_loop, daemon=True).start()
-        _PING_STARTED = True
-
-    # Resilient runner: if anything crashes, restart polling
+def _run_resilient(loop: asyncio.AbstractEventLoop):
+    """Build and run the PTB app on `loop`; if anything crashes, restart it."""
     while True:
         try:
             load_data()
             load_state()
-
-            bot = ApplicationBuilder().token(BOT_TOKEN).build()
+            boot_mark("state_loaded")
+
+            bot = (
+                ApplicationBuilder()
+                .token(BOT_TOKEN)
+                .base_url(TELEGRAM_BASE_URL)
+                .post_init(_post_init)
+                .post_shutdown(_post_shutdown)
+                .build()
+            )
 
             # Railway note: Application.job_queue is only available when
             # python-telegram-bot is installed with the [job-queue] extra.
@@ -4229,31 +6053,64 @@ def main():
             bot.add_handler(CommandHandler("listpairs", listpairs))
             bot.add_handler(CommandHandler("setleaderboard", setleaderboard))
             bot.add_handler(CommandHandler("status", status))
+            bot.add_handler(CommandHandler("flow", flow_cmd))
+            bot.add_handler(CommandHandler("chart", chart_cmd))
+
+            # Count ticks APScheduler drops because the previous run is still going,
+            # and stash each tick's intended start for the drift histogram
+            from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_SUBMITTED
+            global _SCHEDULER
+            _SCHEDULER = bot.job_queue.scheduler
+            _SCHEDULER.add_listener(_on_job_max_instances, EVENT_JOB_MAX_INSTANCES)
+            _SCHEDULER.add_listener(_on_job_submitted, EVENT_JOB_SUBMITTED)
+            jq = bot.job_queue
+
+            # Singletons run on the shard leader only (always, when not sharded);
+            # followers get TON price / auto ranks through shard_heartbeat_job
+            if SHARD is not None:
+                schedule_job(jq, shard_heartbeat_job, SHARD_HEARTBEAT_INTERVAL, first=0.5)
 
             # Warm TON price cache (so posts are instant)
-            bot.job_queue.run_repeating(ton_price_cache_job, interval=60, first=1)
+            schedule_job(jq, ton_price_cache_job, 60, first=1, leader_only=True)
+
+            # Holder baselines (alerts never look holders up themselves)
+            schedule_job(jq, holders_job, HOLDERS_JOB_INTERVAL, first=2)
 
             # Auto ranks (volume-based)
-            bot.job_queue.run_repeating(auto_ranks_job, interval=AUTO_RANK_INTERVAL, first=3)
+            schedule_job(jq, auto_ranks_job, AUTO_RANK_INTERVAL, first=3, leader_only=True)
 
             # Leaderboard auto-update
-            bot.job_queue.run_repeating(update_leaderboard, interval=LB_UPDATE_INTERVAL, first=10)
+            schedule_job(jq, update_leaderboard, LB_UPDATE_INTERVAL, first=10, leader_only=True)
+
+            # Trackers (each single-flight); in two-process mode they run in the ingest worker
+            if PROCESS_ROLE == "all":
+                for fn, interval, first, lock in ingest_jobs():
+                    schedule_job(jq, fn, interval, first=first, lock=lock)
+            schedule_job(jq, memepad_activation_job, MEMEPAD_ACTIVATION_INTERVAL, first=10, leader_only=True)
+
+            # Detection latency watchdog (admin DM on slow p95)
+            schedule_job(jq, latency_alert_job, 60, first=120)
 
-            # Trackers
-            bot.job_queue.run_repeating(ston_tracker_job_fast, interval=STON_FAST_POLL_INTERVAL, first=2)
-            bot.job_queue.run_repeating(ston_tracker_job, interval=STON_POLL_INTERVAL, first=4)
-            bot.job_queue.run_repeating(dedust_tracker_job, interval=DEDUST_POLL_INTERVAL, first=5)
-            bot.job_queue.run_repeating(memepad_activation_job, interval=MEMEPAD_ACTIVATION_INTERVAL, first=10)
-            bot.job_queue.run_repeating(blum_early_tracker_job, interval=BLUM_POLL_INTERVAL, first=12)
+            if SNAPSHOT_ENABLED:
+                schedule_job(jq, snapshot_job, SNAPSHOT_INTERVAL, first=SNAPSHOT_INTERVAL)
 
+            if JOURNAL_ENABLED:
+                schedule_job(jq, journal_job, JOURNAL_FSYNC_INTERVAL, first=JOURNAL_FSYNC_INTERVAL)
+
+            boot_mark("app_built")
             print("🟢 SpyTON Detector running…")
-            bot.run_polling()
+            if SHARD is not None:
+                loop.run_until_complete(_run_sharded(bot))
+            else:
+                bot.run_polling(close_loop=False)
             break
         except KeyboardInterrupt:
             raise
         except Exception as e:
             log.exception("Bot crashed, restarting in 5s: %s", e)
-            time.sleep(5)
+            loop.run_until_complete(asyncio.sleep(5))  # web endpoints keep answering meanwhile
             continue
+boot_mark("module")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""Tiny Prometheus-style metrics registry (counters, gauges, histograms).
+
+No external dependency: metrics are plain dicts guarded by one lock, and
+render() produces the Prometheus text exposition format (0.0.4) for the
+/metrics endpoint. Safe to update from the event loop and worker threads.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import abc
+import threading
+
+_LOCK = threading.Lock()
+
+# Default latency buckets (seconds)
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS: Tuple[float, ...] = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        REGISTRY.append(self)
+
+    @abc.abstractmethod
+    def _lines(self) -> List[str]:
+        ...
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._lines()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, n: float = 1.0, **labels):
+        k = _key(labels)
+        with _LOCK:
+            self.values[k] = self.values.get(k, 0.0) + n
+
+    def get(self, **labels) -> float:
+        return self.values.get(_key(labels), 0.0)
+
+    def _lines(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(k)} {v:g}" for k, v in sorted(self.values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.values: Dict[Tuple, float] = {}
+
+    def set(self, v: float, **labels):
+        with _LOCK:
+            self.values[_key(labels)] = float(v)
+
+    def inc(self, n: float = 1.0, **labels):
+        k = _key(labels)
+        with _LOCK:
+            self.values[k] = self.values.get(k, 0.0) + n
+
+    def dec(self, n: float = 1.0, **labels):
+        self.inc(-n, **labels)
+
+    def get(self, **labels) -> float:
+        return self.values.get(_key(labels), 0.0)
+
+    def _lines(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(k)} {v:g}" for k, v in sorted(self.values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, v: float, **labels):
+        k = _key(labels)
+        with _LOCK:
+            row = self.values.get(k)
+            if row is None:
+                row = self.values[k] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if v <= b:
+                    row[i] += 1
+                    break
+            else:
+                row[len(self.buckets)] += 1
+            row[-1] += v
+
+    def count(self, **labels) -> int:
+        row = self.values.get(_key(labels))
+        return int(sum(row[:-1])) if row else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Bucket upper bound containing quantile q (coarse, like histogram_quantile)."""
+        row = self.values.get(_key(labels))
+        if not row:
+            return None
+        total = sum(row[:-1])
+        if not total:
+            return None
+        acc = 0.0
+        for i, b in enumerate(self.buckets):
+            acc += row[i]
+            if acc >= q * total:
+                return b
+        return float("inf")
+
+    def _lines(self) -> List[str]:
+        out = []
+        for k, row in sorted(self.values.items()):
+            acc = 0.0
+            for i, b in enumerate(self.buckets):
+                acc += row[i]
+                out.append(f"{self.name}_bucket{_fmt_labels(k, ('le', f'{b:g}'))} {acc:g}")
+            acc += row[len(self.buckets)]
+            out.append(f"{self.name}_bucket{_fmt_labels(k, ('le', '+Inf'))} {acc:g}")
+            out.append(f"{self.name}_sum{_fmt_labels(k)} {row[-1]:g}")
+            out.append(f"{self.name}_count{_fmt_labels(k)} {acc:g}")
+        return out
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    with _LOCK:
+        lines: List[str] = []
+        for m in REGISTRY:
+            lines.extend(m.render())
+    return "\n".join(lines) + "\n"
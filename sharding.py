@@ -0,0 +1,210 @@
+"""Sharded mode: several bot instances split the tracked pools between them.
+
+Coordination goes through one SQLite file that every instance can reach
+(same host / shared volume); SQLite's file locking is the only lock.
+
+  members   instance id, first / last heartbeat; a member whose heartbeat
+            is older than `ttl` is gone
+  leader    single-row lease (holder, expires); renewed by its holder on
+            every heartbeat, taken over by anyone once it expires
+  cursors   (kind, key) -> lt, upserted with max() so a cursor never moves
+            back; the next owner of a pool resumes from here
+  kv        small JSON blobs (leader outputs, per-instance aggregates)
+
+Keys are placed on a consistent-hash ring (`vnodes` points per member),
+so a join / leave only moves ~1/N of the keys. Handover is gap-free rather
+than overlap-free: a new member counts for releasing keys `settle` seconds
+after it joined but only starts owning them one heartbeat later, so no key
+is polled by two instances at once; the gap is caught up from the shared
+cursor.
+"""
+
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import hashlib
+import sqlite3
+import threading
+import time
+
+from jsoncodec import json_dumps, json_loads
+
+
+def _h(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes: Sequence[str], vnodes: int = 64):
+        self.nodes = tuple(sorted(nodes))
+        points = sorted((_h(f"{n}#{i}"), n) for n in self.nodes for i in range(vnodes))
+        self._keys = [p[0] for p in points]
+        self._nodes = [p[1] for p in points]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect_right(self._keys, _h(key)) % len(self._keys)
+        return self._nodes[i]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (id TEXT PRIMARY KEY, joined REAL NOT NULL, heartbeat REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leader (one INTEGER PRIMARY KEY CHECK (one = 1), id TEXT NOT NULL, expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS cursors (kind TEXT NOT NULL, key TEXT NOT NULL, lt INTEGER NOT NULL, PRIMARY KEY (kind, key));
+CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, ts REAL NOT NULL);
+"""
+
+
+class Coordinator:
+    def __init__(
+        self,
+        path: str,
+        instance_id: str,
+        ttl: float = 20.0,
+        heartbeat_interval: float = 5.0,
+        settle: Optional[float] = None,
+        vnodes: int = 64,
+    ):
+        self.path = path
+        self.id = instance_id
+        self.ttl = float(ttl)
+        self.interval = float(heartbeat_interval)
+        self.settle = float(settle if settle is not None else 2 * heartbeat_interval)
+        self.vnodes = int(vnodes)
+        self.members: List[str] = []
+        self.is_leader = False
+        self.leader_id: Optional[str] = None
+        self.rebalances = 0
+        self._lease_until = 0.0
+        self._member_until = 0.0  # others drop us from the ring after this
+        self._release = HashRing([], vnodes)  # members that took effect (keys leave their old owner)
+        self._acquire = HashRing([], vnodes)  # ... one heartbeat later (keys arrive at the new owner)
+        self._owner: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    # ---- membership / leadership ----
+    def heartbeat(self, now: Optional[float] = None) -> bool:
+        """Refresh our membership + leader lease and rebuild the rings. True if ownership changed."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT INTO members (id, joined, heartbeat) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                    (self.id, now, now),
+                )
+                db.execute("DELETE FROM members WHERE heartbeat < ?", (now - self.ttl,))
+                rows = db.execute("SELECT id, joined FROM members").fetchall()
+                lead = db.execute("SELECT id, expires FROM leader WHERE one = 1").fetchone()
+                if lead is None or lead[1] < now or lead[0] == self.id:
+                    db.execute(
+                        "INSERT INTO leader (one, id, expires) VALUES (1, ?, ?) "
+                        "ON CONFLICT(one) DO UPDATE SET id = excluded.id, expires = excluded.expires",
+                        (self.id, now + self.ttl),
+                    )
+                    lead = (self.id, now + self.ttl)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+            self._member_until = now + self.ttl
+            self.leader_id = lead[0]
+            self._lease_until = lead[1] if lead[0] == self.id else 0.0
+            self.is_leader = lead[0] == self.id
+            self.members = sorted(r[0] for r in rows)
+
+            # a fresh instance owns nothing for settle + one heartbeat (cursors cover the gap);
+            # a restart under the same id within `ttl` keeps its original join time
+            release = sorted(r[0] for r in rows if r[1] <= now - self.settle)
+            acquire = sorted(r[0] for r in rows if r[1] <= now - self.settle - self.interval)
+            changed = release != list(self._release.nodes) or acquire != list(self._acquire.nodes)
+            if changed:
+                self._release = HashRing(release, self.vnodes)
+                self._acquire = HashRing(acquire, self.vnodes)
+                self._owner = {}
+                self.rebalances += 1
+            return changed
+
+    def leader(self) -> bool:
+        """Leader only while the lease we last wrote is still valid (stale heartbeats demote us)."""
+        return self.is_leader and time.time() < self._lease_until
+
+    def owns(self, key: str) -> bool:
+        """Ours on both rings, and only while our membership is fresh (like leader())."""
+        if time.time() >= self._member_until:
+            return False
+        v = self._owner.get(key)
+        if v is None:
+            v = self._owner[key] = (
+                self._release.node_for(key) == self.id and self._acquire.node_for(key) == self.id
+            )
+        return v
+
+    def leave(self):
+        """Graceful exit: drop membership and the lease so others take over immediately."""
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM members WHERE id = ?", (self.id,))
+                self._db.execute("DELETE FROM leader WHERE one = 1 AND id = ?", (self.id,))
+            except sqlite3.Error:
+                pass
+            self.is_leader = False
+            self._member_until = 0.0
+
+    # ---- cursors ----
+    def put_cursors(self, kind: str, cursors: Dict[str, int]):
+        if not cursors:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT INTO cursors (kind, key, lt) VALUES (?, ?, ?) "
+                    "ON CONFLICT(kind, key) DO UPDATE SET lt = max(lt, excluded.lt)",
+                    [(kind, k, int(v)) for k, v in cursors.items()],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def get_cursors(self, kind: str, keys: Iterable[str]) -> Dict[str, int]:
+        keys = list(keys)
+        out: Dict[str, int] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                q = f"SELECT key, lt FROM cursors WHERE kind = ? AND key IN ({','.join('?' * len(chunk))})"
+                for k, lt in self._db.execute(q, [kind, *chunk]):
+                    out[k] = int(lt)
+        return out
+
+    # ---- kv ----
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO kv (key, value, ts) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, ts = excluded.ts",
+                (key, json_dumps(value).decode("utf-8"), time.time()),
+            )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        try:
+            return json_loads(row[0])
+        except ValueError:
+            return default
+
+    def close(self):
+        with self._lock:
+            self._db.close()
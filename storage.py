@@ -1,33 +1,108 @@
-import json
+import atexit
 import os
+import threading
+import time
+
+from jsoncodec import json_dumps_pretty, read_json
 
 TOKENS_FILE = "tokens.json"
 HEADERS_FILE = "headers.json"
 SEEN_FILE = "seen.json"
+SEEN_FLUSH_INTERVAL = float(os.getenv("SEEN_FLUSH_INTERVAL", "10"))  # seconds between seen.json writes
+
+
+class KVFile:
+    """A JSON object file kept in memory. set() only marks it dirty; it is written
+    (atomically) at most every `interval` seconds, by a timer armed on the first
+    change after a write, on flush() and at exit."""
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self._data = None
+        self._dirty = False
+        self._flushed = time.monotonic()
+        self._timer = None
+        self._lock = threading.Lock()
+        self.writes = 0
+
+    def _load(self) -> dict:
+        if self._data is None:
+            self._data = read_json(self.path) if os.path.exists(self.path) else {}
+        return self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._load().get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            d = self._load()
+            if d.get(key) == value:
+                return
+            d[key] = value
+            self._dirty = True
+            wait = self.interval - (time.monotonic() - self._flushed)
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                tmp = self.path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(json_dumps_pretty(self._data))
+                os.replace(tmp, self.path)
+                self._dirty = False
+                self.writes += 1
+            self._flushed = time.monotonic()
+
+
+SEEN = KVFile(SEEN_FILE, SEEN_FLUSH_INTERVAL)
+atexit.register(SEEN.flush)
 
 
 def load_tokens():
     if not os.path.exists(TOKENS_FILE):
         return {}
-    with open(TOKENS_FILE, "r") as f:
-        return json.load(f)
+    return read_json(TOKENS_FILE)
 
 
 def save_tokens(tokens: dict):
-    with open(TOKENS_FILE, "w") as f:
-        json.dump(tokens, f, indent=2)
+    with open(TOKENS_FILE, "wb") as f:
+        f.write(json_dumps_pretty(tokens))
+
+
+def tracked_tokens() -> dict:
+    """{address: symbol} from tokens.json (address-keyed {"symbol"} and symbol-keyed {"address"} entries)."""
+    out = {}
+    for key, rec in load_tokens().items():
+        if not isinstance(rec, dict):
+            continue
+        if rec.get("address"):
+            out.setdefault(rec["address"], key.upper())
+        elif rec.get("symbol"):
+            out.setdefault(key, str(rec["symbol"]).upper())
+    return out
 
 
 def _load_headers():
     if not os.path.exists(HEADERS_FILE):
         return {}
-    with open(HEADERS_FILE, "r") as f:
-        return json.load(f)
+    return read_json(HEADERS_FILE)
 
 
 def _save_headers(h: dict):
-    with open(HEADERS_FILE, "w") as f:
-        json.dump(h, f, indent=2)
+    with open(HEADERS_FILE, "wb") as f:
+        f.write(json_dumps_pretty(h))
 
 
 def set_header_file_id(symbol: str, file_id: str):
@@ -41,18 +116,6 @@ def get_header_file_id(symbol: str):
     return h.get(symbol.upper())
 
 
-def _load_seen():
-    if not os.path.exists(SEEN_FILE):
-        return {}
-    with open(SEEN_FILE, "r") as f:
-        return json.load(f)
-
-
-def _save_seen(s: dict):
-    with open(SEEN_FILE, "w") as f:
-        json.dump(s, f, indent=2)
-
-
 def is_new_buy(symbol: str, volume_usd: float) -> bool:
     """
     Your original logic used volume as the key.
@@ -60,13 +123,8 @@ def is_new_buy(symbol: str, volume_usd: float) -> bool:
     but store it persistently so restarts don’t repeat.
     """
     symbol = symbol.upper()
-    seen = _load_seen()
-    last = seen.get(symbol)
-
     key = f"{float(volume_usd):.6f}"
-    if last == key:
+    if SEEN.get(symbol) == key:
         return False
-
-    seen[symbol] = key
-    _save_seen(seen)
-    return True
\ No newline at end of file
+    SEEN.set(symbol, key)
+    return True
@@ -0,0 +1,164 @@
+"""Rolling per-token swap aggregates, fed by the buy trackers.
+
+Each token keeps one minute bucket per slot in fixed-size ring buffers
+(array-backed, so a token costs the same memory however busy it is):
+
+  vol[i]       TON volume in that minute
+  buys[i]      number of buys
+  first_px[i]  first execution price seen (TON per token)
+  last_px[i]   last execution price seen
+
+Unique buyers are tracked as {buyer: last_minute_seen}.
+
+Everything is in-memory and O(window) per token, so the leaderboard and
+auto ranks never need DexScreener for volume / price change.
+"""
+
+from array import array
+from typing import Any, Dict, Optional
+import time
+
+
+class TokenFlow:
+    __slots__ = ("size", "head", "vol", "buys", "first_px", "last_px", "buyers")
+
+    def __init__(self, size: int = 360):
+        self.size = int(size)
+        self.head = 0  # minute index (unix // 60) of the newest bucket
+        self.vol = array("d", [0.0]) * self.size
+        self.buys = array("I", [0]) * self.size
+        self.first_px = array("d", [0.0]) * self.size
+        self.last_px = array("d", [0.0]) * self.size
+        self.buyers: Dict[str, int] = {}
+
+    def _clear(self, i: int):
+        self.vol[i] = 0.0
+        self.buys[i] = 0
+        self.first_px[i] = 0.0
+        self.last_px[i] = 0.0
+
+    def advance(self, minute: int):
+        """Move the head forward to `minute`, zeroing the buckets that roll out."""
+        if not self.head:
+            self.head = minute
+            return
+        if minute <= self.head:
+            return
+        if minute - self.head >= self.size:
+            for i in range(self.size):
+                self._clear(i)
+        else:
+            for m in range(self.head + 1, minute + 1):
+                self._clear(m % self.size)
+        self.head = minute
+
+        oldest = minute - self.size + 1
+        if self.buyers and len(self.buyers) > 64:
+            for b in [b for b, m in self.buyers.items() if m < oldest]:
+                self.buyers.pop(b, None)
+
+    def add(self, ts: float, ton: float, token_amt: float, buyer: str = ""):
+        minute = int(ts // 60)
+        self.advance(minute)
+        if minute <= self.head - self.size:
+            return  # older than the ring
+        i = minute % self.size
+        self.vol[i] += float(ton or 0.0)
+        self.buys[i] += 1
+        if ton and token_amt and ton > 0 and token_amt > 0:
+            px = float(ton) / float(token_amt)
+            if not self.first_px[i]:
+                self.first_px[i] = px
+            self.last_px[i] = px
+        if buyer:
+            if self.buyers.get(buyer, 0) < minute:
+                self.buyers[buyer] = minute
+
+    def window(self, minutes: int, now: Optional[float] = None) -> Dict[str, Any]:
+        """Aggregate the last `minutes` minutes (capped at the ring size)."""
+        cur = int((now if now is not None else time.time()) // 60)
+        self.advance(cur)
+        minutes = max(1, min(int(minutes), self.size))
+        start = cur - minutes + 1
+
+        vol = 0.0
+        buys = 0
+        first = 0.0
+        last = 0.0
+        for m in range(start, cur + 1):
+            i = m % self.size
+            if not self.buys[i]:
+                continue
+            vol += self.vol[i]
+            buys += self.buys[i]
+            if not first and self.first_px[i]:
+                first = self.first_px[i]
+            if self.last_px[i]:
+                last = self.last_px[i]
+
+        uniq = sum(1 for m in self.buyers.values() if m >= start)
+        change = ((last / first) - 1.0) * 100.0 if first and last else None
+        return {
+            "volume_ton": vol,
+            "buys": buys,
+            "unique_buyers": uniq,
+            "first_price": first or None,
+            "last_price": last or None,
+            "change_pct": change,
+        }
+
+
+class SwapFlow:
+    """Registry of TokenFlow rings keyed by token address (or pool id)."""
+
+    def __init__(self, size: int = 360):
+        self.size = int(size)
+        self.tokens: Dict[str, TokenFlow] = {}
+
+    def record(self, key: str, ts: float, ton: float, token_amt: float, buyer: str = ""):
+        if not key:
+            return
+        tf = self.tokens.get(key)
+        if tf is None:
+            tf = self.tokens[key] = TokenFlow(self.size)
+        tf.add(ts, ton, token_amt, buyer)
+
+    def window(self, key: str, minutes: int, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        tf = self.tokens.get(key)
+        if tf is None:
+            return None
+        return tf.window(minutes, now)
+
+    def windows(self, minutes: int, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        now = now if now is not None else time.time()
+        return {k: tf.window(minutes, now) for k, tf in self.tokens.items()}
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """JSON-able copy of the non-empty buckets (for the warm-start snapshot)."""
+        cur = int((now if now is not None else time.time()) // 60)
+        out: Dict[str, Any] = {}
+        for k, tf in list(self.tokens.items()):
+            if not tf.head or tf.head <= cur - tf.size:
+                continue  # nothing left inside the window
+            rows = [
+                [tf.head - (tf.head - i) % tf.size, tf.vol[i], tf.buys[i], tf.first_px[i], tf.last_px[i]]
+                for i, n in enumerate(tf.buys) if n
+            ]
+            if rows:
+                out[k] = {"head": tf.head, "rows": rows, "buyers": dict(tf.buyers)}
+        return out
+
+    def restore(self, snap: Dict[str, Any]):
+        """Load snapshot() output; tokens already seen in this process are kept as they are."""
+        for k, d in (snap or {}).items():
+            if k in self.tokens or not isinstance(d, dict):
+                continue
+            tf = TokenFlow(self.size)
+            tf.head = int(d.get("head") or 0)
+            for m, vol, buys, first, last in d.get("rows") or []:
+                if int(m) <= tf.head - tf.size:
+                    continue
+                i = int(m) % tf.size
+                tf.vol[i], tf.buys[i], tf.first_px[i], tf.last_px[i] = float(vol), int(buys), float(first), float(last)
+            tf.buyers = {str(b): int(m) for b, m in (d.get("buyers") or {}).items()}
+            self.tokens[k] = tf
@@ -0,0 +1,30 @@
+"""Canonical form of TON addresses, for matching addresses from different sources.
+
+The same account shows up raw ("0:83df…") and user-friendly (48 base64 /
+base64url characters, bounceable "EQ…" or non-bounceable "UQ…", testnet
+flag). normalize_address() maps all of them to the raw "<wc>:<hex>" form;
+anything it can't parse is returned stripped, so it still matches itself.
+"""
+
+import base64
+import binascii
+import re
+
+_RAW_RE = re.compile(r"^(-?\d+):([0-9a-fA-F]{64})$")
+
+
+def normalize_address(addr: str) -> str:
+    s = (addr or "").strip()
+    m = _RAW_RE.match(s)
+    if m:
+        return f"{int(m.group(1))}:{m.group(2).lower()}"
+    if len(s) != 48:
+        return s
+    try:
+        raw = base64.b64decode(s.replace("-", "+").replace("_", "/"), validate=True)
+    except (binascii.Error, ValueError):
+        return s
+    if len(raw) != 36 or binascii.crc_hqx(raw[:34], 0) != int.from_bytes(raw[34:], "big"):
+        return s
+    wc = raw[1] - 256 if raw[1] > 127 else raw[1]
+    return f"{wc}:{raw[2:34].hex()}"
@@ -0,0 +1,94 @@
+"""TON/USD reference price: median over several sources, with staleness.
+
+Sources are named by the caller, e.g.
+
+  pool:<address>   swaps in a USD-stablecoin / TON pool seen by the trackers
+                   (one sample per swap: stablecoin amount / TON amount)
+  dexscreener      priceUsd / priceNative of TON-quoted pairs in DexScreener
+                   responses that were fetched anyway
+  api:<host>       optional HTTP price APIs
+
+A source's value is the median of its samples from the last `window`
+seconds, so one odd swap (slippage, a sandwich leg) doesn't move it. The
+price is the median over the sources whose newest sample is younger than
+`max_age`; value() is 0.0 while no source is fresh, and the last price
+stays available as `last` / in status() for callers that accept it stale.
+
+Samples also arrive from worker threads (HTTP fetches), hence the lock.
+"""
+
+from collections import deque
+from statistics import median
+from typing import Any, Deque, Dict, Optional, Tuple
+import math
+import threading
+import time
+
+
+class PriceBook:
+    def __init__(self, max_age: float = 300.0, window: float = 120.0, max_samples: int = 64):
+        self.max_age = float(max_age)
+        self.window = float(window)
+        self.max_samples = int(max_samples)
+        self.sources: Dict[str, Deque[Tuple[float, float]]] = {}  # name -> (ts, price), oldest first
+        self.last = 0.0     # last non-zero value()
+        self.last_ts = 0.0  # newest sample behind it
+        self._lock = threading.Lock()
+
+    def observe(self, source: str, price: float, ts: Optional[float] = None):
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return
+        if not price > 0 or math.isinf(price):
+            return
+        ts = float(ts) if ts else time.time()
+        with self._lock:
+            q = self.sources.get(source)
+            if q is None:
+                q = self.sources[source] = deque(maxlen=self.max_samples)
+            if q and ts < q[-1][0]:
+                return  # out of order (a catch-up replay); the newer samples win
+            q.append((ts, price))
+
+    def _source_value(self, q: Deque[Tuple[float, float]], now: float) -> Optional[float]:
+        if not q or now - q[-1][0] > self.max_age:
+            return None
+        newest = q[-1][0]
+        return median(p for ts, p in q if newest - ts <= self.window)
+
+    def value(self, now: Optional[float] = None) -> float:
+        now = now or time.time()
+        vals = []
+        newest = 0.0
+        with self._lock:
+            for q in self.sources.values():
+                v = self._source_value(q, now)
+                if v is not None:
+                    vals.append(v)
+                    newest = max(newest, q[-1][0])
+        if not vals:
+            return 0.0
+        self.last = median(vals)
+        self.last_ts = newest
+        return self.last
+
+    def status(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now or time.time()
+        price = self.value(now)
+        with self._lock:
+            sources = {
+                name: {
+                    "usd": self._source_value(q, now),
+                    "age": round(now - q[-1][0], 1),
+                    "samples": len(q),
+                }
+                for name, q in sorted(self.sources.items())
+                if q
+            }
+        return {
+            "usd": price or self.last,
+            "stale": not price,
+            "age": round(now - self.last_ts, 1) if self.last_ts else None,
+            "sources": sources,
+        }
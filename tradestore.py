@@ -0,0 +1,311 @@
+"""Append-only columnar store of every detected swap.
+
+Layout (one directory per UTC day, one file per column):
+
+  trades/
+    pools.txt  tokens.txt  buyers.txt  sources.txt   # string -> id (line number)
+    2026-01-28/
+      ts.u32  pool.u32  token.u32  buyer.u32  ton.i64  jet.f64  src.u16  seen.u32
+
+Columns are raw little-endian arrays, so a day is read back with mmap and a
+zero-copy memoryview cast. A row lands in the partition of its chain time
+(`ts`), but rows arrive out of `ts` order (catch-up after downtime, several
+sources), so `ts` can't be bisected. `seen` is the ingest time, kept
+non-decreasing per partition and never below `ts`: a window query bisects
+`seen` for the first row that can match and filters on `ts` from there.
+Partitions written before `seen` existed are scanned whole, and get the
+column backfilled (running max of `ts`) when next opened for writing.
+If a crash leaves columns with different lengths, they are truncated to the
+shortest one when the partition is opened for writing.
+
+NumPy (requirements.txt) is used for the scans; plain Python if it's missing.
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+import mmap
+import os
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # optional
+    np = None
+
+# column name -> array typecode
+COLUMNS: Dict[str, str] = {
+    "ts": "I",      # unix seconds
+    "pool": "I",    # pools.txt id
+    "token": "I",   # tokens.txt id
+    "buyer": "I",   # buyers.txt id
+    "ton": "q",     # TON spent, nanotons
+    "jet": "d",     # jetton amount (human units)
+    "src": "H",     # sources.txt id
+    "seen": "I",    # ingest time, unix seconds (see module docstring)
+}
+_EXT = {"I": "u32", "q": "i64", "d": "f64", "H": "u16"}
+
+DICTS = ("pools", "tokens", "buyers", "sources")
+
+
+def _col_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.{_EXT[COLUMNS[name]]}")
+
+
+def _col_rows(path: str, name: str) -> int:
+    fp = _col_path(path, name)
+    return (os.path.getsize(fp) if os.path.isfile(fp) else 0) // array(COLUMNS[name]).itemsize
+
+
+def _day(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+class _StringDict:
+    """Append-only string <-> id mapping backed by a text file (one per line)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    name = line.rstrip("\n")
+                    self.ids.setdefault(name, len(self.names))
+                    self.names.append(name)
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def get_id(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            i = len(self.names)
+            self.ids[name] = i
+            self.names.append(name)
+            self._fh.write(name.replace("\n", " ") + "\n")
+            self._fh.flush()
+        return i
+
+    def lookup(self, name: str) -> Optional[int]:
+        return self.ids.get(name)
+
+    def name(self, i: int) -> str:
+        return self.names[i] if 0 <= i < len(self.names) else ""
+
+    def close(self):
+        self._fh.close()
+
+
+class _DayView:
+    """Read-only mmap view of one day partition."""
+
+    def __init__(self, path: str):
+        self._maps: List[mmap.mmap] = []
+        self.cols: Dict[str, Any] = {}
+        rows = None
+        seen = 0
+        for name, code in COLUMNS.items():
+            n = _col_rows(path, name)
+            if name == "seen":
+                seen = n
+            else:
+                rows = n if rows is None else min(rows, n)
+            if not n:
+                self.cols[name] = memoryview(b"").cast(code)
+                continue
+            with open(_col_path(path, name), "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(mm)
+            self.cols[name] = memoryview(mm).cast(code)
+        self.rows = rows or 0
+        self.indexed = seen >= self.rows  # False: legacy partition, no usable `seen`
+
+    def close(self):
+        try:
+            for mv in self.cols.values():
+                mv.release()
+            for mm in self._maps:
+                mm.close()
+        except BufferError:
+            pass  # a caller still holds a view (e.g. numpy); GC unmaps later
+
+
+class TradeStore:
+    def __init__(self, root: str = "trades"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.dicts = {d: _StringDict(os.path.join(root, f"{d}.txt")) for d in DICTS}
+        self._lock = threading.Lock()
+        self._day: Optional[str] = None
+        self._fhs: Dict[str, Any] = {}
+        self._last_seen = 0
+        self.rows_appended = 0
+
+    # ---------- write ----------
+    def _repair(self, path: str) -> int:
+        """Align the columns of a partition after a crash; returns its last `seen`."""
+        rows = min(_col_rows(path, n) for n in COLUMNS if n != "seen")
+        for name in COLUMNS:
+            fp = _col_path(path, name)
+            if os.path.isfile(fp) and _col_rows(path, name) > rows:
+                os.truncate(fp, rows * array(COLUMNS[name]).itemsize)
+        seen = array("I")
+        have = _col_rows(path, "seen")
+        if have:
+            with open(_col_path(path, "seen"), "rb") as f:
+                f.seek((have - 1) * seen.itemsize)
+                seen.frombytes(f.read(seen.itemsize))
+        last = seen[-1] if seen else 0
+        if have < rows:  # legacy partition: backfill with the running max of ts
+            ts = array("I")
+            with open(_col_path(path, "ts"), "rb") as f:
+                f.seek(have * ts.itemsize)
+                ts.frombytes(f.read((rows - have) * ts.itemsize))
+            fill = array("I")
+            for t in ts:
+                last = max(last, t)
+                fill.append(last)
+            with open(_col_path(path, "seen"), "ab") as f:
+                f.write(fill.tobytes())
+        return last
+
+    def _open_day(self, day: str):
+        for fh in self._fhs.values():
+            fh.close()
+        path = os.path.join(self.root, day)
+        os.makedirs(path, exist_ok=True)
+        self._last_seen = self._repair(path)
+        self._fhs = {name: open(_col_path(path, name), "ab") for name in COLUMNS}
+        self._day = day
+
+    def append(
+        self,
+        ts: float,
+        pool: str,
+        token: str,
+        buyer: str,
+        ton_nanos: int,
+        jetton_amount: float,
+        source: str = "",
+    ):
+        row = {
+            "ts": int(ts),
+            "pool": self.dicts["pools"].get_id(pool or ""),
+            "token": self.dicts["tokens"].get_id(token or ""),
+            "buyer": self.dicts["buyers"].get_id(buyer or ""),
+            "ton": int(ton_nanos),
+            "jet": float(jetton_amount or 0.0),
+            "src": self.dicts["sources"].get_id(source or ""),
+        }
+        with self._lock:
+            day = _day(ts)
+            if day != self._day:
+                self._open_day(day)
+            self._last_seen = row["seen"] = max(self._last_seen, row["ts"], int(time.time()))
+            for name, code in COLUMNS.items():
+                self._fhs[name].write(array(code, [row[name]]).tobytes())
+            for fh in self._fhs.values():
+                fh.flush()
+            self.rows_appended += 1
+
+    def close(self):
+        with self._lock:
+            for fh in self._fhs.values():
+                fh.close()
+            self._fhs = {}
+            self._day = None
+        for d in self.dicts.values():
+            d.close()
+
+    # ---------- read ----------
+    def _days(self, since: float, until: float) -> List[str]:
+        first, last = _day(since), _day(until)
+        out = []
+        for name in sorted(os.listdir(self.root)):
+            if len(name) == 10 and name[4] == "-" and first <= name <= last:
+                out.append(name)
+        return out
+
+    def _scan(self, since: float, until: float):
+        """Yield (view, lo, hi) row ranges holding every row with since <= ts <= until.
+
+        Rows in a range can still fall outside the window; callers filter on ts.
+        """
+        for day in self._days(since, until):
+            view = _DayView(os.path.join(self.root, day))
+            try:
+                lo, hi = 0, view.rows
+                if view.indexed:
+                    seen = view.cols["seen"][:hi]
+                    lo = bisect_left(seen, int(since))  # seen >= ts, so nothing earlier matches
+                    seen.release()
+                if hi > lo:
+                    yield view, lo, hi
+            finally:
+                view.close()
+
+    @staticmethod
+    def _np_mask(c: Dict[str, Any], lo: int, hi: int, tid: int, t0: int, t1: int):
+        tok = np.frombuffer(c["token"], dtype=np.uint32, count=hi - lo, offset=lo * 4)
+        ts = np.frombuffer(c["ts"], dtype=np.uint32, count=hi - lo, offset=lo * 4)
+        return (tok == tid) & (ts >= t0) & (ts <= t1)
+
+    def token_volume(self, token: str, since: float, until: Optional[float] = None) -> Dict[str, Any]:
+        """TON volume, buy count and unique buyers for one token in [since, until]."""
+        out = {"ton": 0.0, "buys": 0, "buyers": 0}
+        tid = self.dicts["tokens"].lookup(token)
+        if tid is None:
+            return out
+        until = until if until is not None else time.time()
+        t0, t1 = int(since), int(until)
+        nanos = 0
+        buyers: set = set()
+        for view, lo, hi in self._scan(since, until):
+            c = view.cols
+            if np is not None:
+                m = self._np_mask(c, lo, hi, tid, t0, t1)
+                nanos += int(np.frombuffer(c["ton"], dtype=np.int64, count=hi - lo, offset=lo * 8)[m].sum())
+                out["buys"] += int(m.sum())
+                buyers.update(np.frombuffer(c["buyer"], dtype=np.uint32, count=hi - lo, offset=lo * 4)[m].tolist())
+            else:
+                tok, ts, ton, buy = c["token"][lo:hi], c["ts"][lo:hi], c["ton"][lo:hi], c["buyer"][lo:hi]
+                for i in range(hi - lo):
+                    if tok[i] == tid and t0 <= ts[i] <= t1:
+                        nanos += ton[i]
+                        out["buys"] += 1
+                        buyers.add(buy[i])
+                tok.release(); ts.release(); ton.release(); buy.release()
+        out["ton"] = nanos / 1e9
+        out["buyers"] = len(buyers)
+        return out
+
+    def top_buyers(self, token: str, since: float, until: Optional[float] = None, limit: int = 10) -> List[Tuple[str, float]]:
+        """[(buyer_address, ton_spent)] for one token in [since, until], biggest first."""
+        tid = self.dicts["tokens"].lookup(token)
+        if tid is None:
+            return []
+        until = until if until is not None else time.time()
+        t0, t1 = int(since), int(until)
+        by_buyer: Dict[int, int] = {}
+        for view, lo, hi in self._scan(since, until):
+            c = view.cols
+            if np is not None:
+                m = self._np_mask(c, lo, hi, tid, t0, t1)
+                b = np.frombuffer(c["buyer"], dtype=np.uint32, count=hi - lo, offset=lo * 4)[m]
+                t = np.frombuffer(c["ton"], dtype=np.int64, count=hi - lo, offset=lo * 8)[m]
+                if b.size:
+                    ids, inv = np.unique(b, return_inverse=True)
+                    sums = np.bincount(inv, weights=t)
+                    for i, s in zip(ids.tolist(), sums.tolist()):
+                        by_buyer[i] = by_buyer.get(i, 0) + int(s)
+            else:
+                tok, ts, ton, buy = c["token"][lo:hi], c["ts"][lo:hi], c["ton"][lo:hi], c["buyer"][lo:hi]
+                for i in range(hi - lo):
+                    if tok[i] == tid and t0 <= ts[i] <= t1:
+                        by_buyer[buy[i]] = by_buyer.get(buy[i], 0) + ton[i]
+                tok.release(); ts.release(); ton.release(); buy.release()
+        ranked = sorted(by_buyer.items(), key=lambda x: x[1], reverse=True)[: max(1, int(limit))]
+        names = self.dicts["buyers"]
+        return [(names.name(i), n / 1e9) for i, n in ranked]
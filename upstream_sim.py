@@ -0,0 +1,386 @@
+"""Local stand-in for every upstream the bot polls, for load testing.
+
+Serves (base-agnostic paths, so point each *_BASE at this server):
+
+  TonAPI       /v2/blockchain/accounts/{id}/transactions   (limit, before_lt)
+               /v2/jettons/{id}    /v2/jettons/{id}/holders
+  STON export  /export/dexscreener/v1/latest-block   /events (fromBlock, toBlock)
+  DeDust API   /v2/pools/{id}/trades
+  DexScreener  /latest/dex/pairs/ton/{pair}   /latest/dex/tokens/{a,b,...}
+  TON price    /ton-price                     (coingecko-style)
+  stats        /_sim/stats
+
+A background thread produces buys at --swap-rate per second over random
+pools (one STON "block" per second). Every response can be delayed by a
+lognormal latency and answered with 429 during periodic bursts or at a base
+error rate. Accounts the bot asks for that the simulator does not know yet
+are added on first request, so any data.json works; --write-data writes a
+matching data.json for N pools.
+
+Run the bot against it:
+
+  python upstream_sim.py --pools 10000 --swap-rate 50 --write-data data.json
+  TONAPI_BASE=http://127.0.0.1:8090 STON_BASE=http://127.0.0.1:8090 \\
+  DEDUST_API_BASE=http://127.0.0.1:8090 DEXSCREENER_BASE=http://127.0.0.1:8090 \\
+  TON_PRICE_API=http://127.0.0.1:8090/ton-price python main.py
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+
+DECIMALS = 9
+HISTORY = 60  # transactions kept per account
+TON_USD = 5.0
+
+_RE_TXS = re.compile(r"^/v2/blockchain/accounts/([^/]+)/transactions$")
+_RE_HOLDERS = re.compile(r"^/v2/jettons/([^/]+)/holders$")
+_RE_JETTON = re.compile(r"^/v2/jettons/([^/]+)$")
+_RE_TRADES = re.compile(r"^/v2/pools/([^/]+)/trades$")
+_RE_PAIR = re.compile(r"^/latest/dex/pairs/ton/([^/]+)$")
+_RE_TOKENS = re.compile(r"^/latest/dex/tokens/([^/]+)$")
+DEX_TOKENS_PAIR_CAP = 30  # DexScreener's tokens endpoint returns at most this many pairs
+
+
+class Market:
+    """Pools, their transaction history and the payloads derived from it."""
+
+    def __init__(self, n_pools: int = 0, dedust_share: float = 0.5, seed: int = 7, prefix: str = "EQ"):
+        self.rng = random.Random(seed)
+        self.pools: Dict[str, str] = {}   # pool -> dex ("stonfi" / "dedust")
+        self.tokens: Dict[str, str] = {}  # pool -> jetton master
+        self.txs: Dict[str, List[Dict[str, Any]]] = {}  # pool -> newest first
+        self.volume: Dict[str, float] = {}  # pool -> USD bought since start (DexScreener volume.h24)
+        self.events: Dict[int, List[Dict[str, Any]]] = {}  # STON block -> events
+        self.block = 50_000_000
+        self.lt = 40_000_000_000_000
+        self.swaps = 0
+        self.buyers = [f"{prefix}buyer{i:05d}" for i in range(5000)]
+        self._lock = threading.RLock()
+        n_dedust = int(round(n_pools * dedust_share))
+        for i in range(n_pools):
+            dex = "dedust" if i < n_dedust else "stonfi"
+            self.add_pool(f"{prefix}{dex[:2].upper()}pool{i:06d}", dex, f"{prefix}token{i:06d}")
+
+    def add_pool(self, pool: str, dex: str = "stonfi", token: Optional[str] = None, history: bool = True):
+        with self._lock:
+            if pool in self.pools:
+                return
+            self.pools[pool] = dex
+            self.tokens[pool] = token or f"{pool}-jetton"
+            self.txs[pool] = []
+            if history:  # one old trade so cursors have something to start from
+                self.trade(pool, int(time.time()) - 3600)
+
+    def trade(self, pool: str, now: Optional[int] = None) -> Dict[str, Any]:
+        """Append one TON -> jetton buy to `pool`; returns the STON export event for it."""
+        now = int(now if now is not None else time.time())
+        with self._lock:
+            self.lt += 1000
+            self.swaps += 1
+            dex = self.pools[pool]
+            ton = self.rng.uniform(0.5, 80.0)
+            self.volume[pool] = self.volume.get(pool, 0.0) + ton * TON_USD
+            jet = ton * self.rng.uniform(1e3, 1e6)
+            buyer = self.rng.choice(self.buyers)
+            h = f"{self.lt:x}{pool[-6:]}"
+            tx = {
+                "hash": h,
+                "lt": self.lt,
+                "utime": now,
+                "success": True,
+                "actions": [{
+                    "type": "JettonSwap",
+                    "status": "ok",
+                    "dex": {"name": dex},
+                    "user": buyer,
+                    "ton_in": str(int(ton * 1e9)),
+                    "jetton_out": str(int(jet * 10 ** DECIMALS)),
+                    "jetton_master": self.tokens[pool],
+                }],
+            }
+            hist = self.txs[pool]
+            hist.insert(0, tx)
+            del hist[HISTORY:]
+            ev = {
+                "block": {"blockNumber": self.block, "blockTimestamp": now},
+                "eventType": "swap",
+                "txnId": h,
+                "txnIndex": 0,
+                "eventIndex": 0,
+                "maker": buyer,
+                "pairId": pool,
+                "amount0In": "0",
+                "amount1In": f"{ton:.9f}",
+                "amount0Out": f"{jet:.9f}",
+                "amount1Out": "0",
+                "priceNative": f"{ton / jet:.12f}",
+            }
+            if dex == "stonfi":
+                self.events.setdefault(self.block, []).append(ev)
+            return ev
+
+    def next_block(self):
+        with self._lock:
+            self.block += 1
+            for b in [b for b in self.events if b < self.block - 600]:
+                self.events.pop(b, None)
+
+    def newest_lt(self, pool: str) -> int:
+        hist = self.txs.get(pool) or []
+        return hist[0]["lt"] if hist else 0
+
+    def pair(self, pool: str) -> Dict[str, Any]:
+        return {
+            "chainId": "ton",
+            "dexId": self.pools.get(pool, "stonfi"),
+            "pairAddress": pool,
+            "baseToken": {"address": self.tokens[pool], "symbol": "SIM", "name": "Simulated"},
+            "quoteToken": {"address": "EQ_TON", "symbol": "TON", "name": "Toncoin"},
+            "priceUsd": "0.0001",
+            "priceNative": f"{0.0001 / TON_USD:.8f}",
+            "liquidity": {"usd": 50_000},
+            "marketCap": 250_000,
+            "fdv": 250_000,
+            "volume": {"h6": {"usd": 12_000}, "h24": round(self.volume.get(pool, 0.0), 2)},
+            "priceChange": {"h6": 4.2},
+        }
+
+    def route(self, path: str, params: Dict[str, Any]) -> Tuple[int, Any]:
+        """(status, json-able body) for one GET."""
+        m = _RE_TXS.match(path)
+        if m:
+            pool = m.group(1)
+            self.add_pool(pool)
+            before = int(params.get("before_lt") or 0)
+            limit = int(params.get("limit") or 10)
+            with self._lock:
+                page = [t for t in self.txs[pool] if not before or t["lt"] < before][:limit]
+            return 200, {"transactions": page}
+        m = _RE_HOLDERS.match(path)
+        if m:
+            return 200, {"total": 1000 + sum(map(ord, m.group(1))) % 5000, "addresses": []}
+        m = _RE_JETTON.match(path)
+        if m:
+            return 200, {
+                "metadata": {"address": m.group(1), "symbol": "SIM", "name": "Simulated", "decimals": str(DECIMALS)},
+                "holders_count": 1000 + sum(map(ord, m.group(1))) % 5000,
+            }
+        if path.endswith("/export/dexscreener/v1/latest-block"):
+            return 200, {"block": {"blockNumber": self.block, "blockTimestamp": int(time.time())}}
+        if path.endswith("/export/dexscreener/v1/events"):
+            lo, hi = int(params.get("fromBlock") or 0), int(params.get("toBlock") or 0)
+            with self._lock:
+                evs = [e for b in range(lo, hi + 1) for e in self.events.get(b, [])]
+            return 200, {"events": evs}
+        m = _RE_TRADES.match(path)
+        if m:
+            pool = m.group(1)
+            self.add_pool(pool, "dedust")
+            with self._lock:
+                hist = list(self.txs[pool])
+            after = int(params.get("after_lt") or 0)
+            out = []
+            for tx in hist:
+                if after and tx["lt"] <= after:
+                    continue
+                a = tx["actions"][0]
+                out.append({
+                    "sender": a["user"],
+                    "assetIn": {"type": "native"},
+                    "assetOut": {"type": "jetton", "address": a["jetton_master"]},
+                    "amountIn": a["ton_in"],
+                    "amountOut": a["jetton_out"],
+                    "lt": str(tx["lt"]),
+                    "hash": tx["hash"],
+                    "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(tx["utime"])),
+                })
+            return 200, out[: int(params.get("limit") or params.get("page_size") or 25)]
+        m = _RE_PAIR.match(path)
+        if m:
+            pool = m.group(1)
+            return 200, {"pairs": [self.pair(pool)] if pool in self.pools else []}
+        m = _RE_TOKENS.match(path)
+        if m:
+            wanted = set(m.group(1).split(","))
+            pairs = [self.pair(p) for p, t in self.tokens.items() if t in wanted]
+            return 200, {"pairs": pairs[:DEX_TOKENS_PAIR_CAP]}  # truncated like the real endpoint
+        if path == "/ton-price":
+            return 200, {"the-open-network": {"usd": TON_USD}}
+        return 404, {"error": "not found"}
+
+    def data_json(self) -> Dict[str, Any]:
+        """A bot data.json tracking every simulated pool."""
+        return {
+            "pairs": {
+                p: {"dex": d, "symbol": "SIM", "token_address": self.tokens[p], "token": self.tokens[p]}
+                for p, d in self.pools.items()
+            },
+            "watch": {},
+            "forced_ranks": {},
+            "group_mirrors": {},
+        }
+
+
+def route_name(path: str) -> str:
+    for rx, name in ((_RE_TXS, "tonapi_txs"), (_RE_HOLDERS, "tonapi_holders"), (_RE_JETTON, "tonapi_jetton"),
+                     (_RE_TRADES, "dedust_trades"), (_RE_PAIR, "dex_pairs"), (_RE_TOKENS, "dex_tokens")):
+        if rx.match(path):
+            return name
+    if path.endswith("/latest-block"):
+        return "ston_latest_block"
+    if path.endswith("/events"):
+        return "ston_events"
+    if path == "/ton-price":
+        return "ton_price"
+    return "other"
+
+
+class Faults:
+    """Latency distribution + 429 bursts."""
+
+    def __init__(self, latency_ms: float = 0.0, sigma: float = 0.5, error_rate: float = 0.0,
+                 burst_every: float = 0.0, burst_len: float = 0.0, burst_prob: float = 1.0, seed: int = 11):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_len = burst_len
+        self.burst_prob = burst_prob
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.t0 = time.monotonic()
+
+    def delay(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        with self._lock:
+            return self.latency_ms / 1000.0 * math.exp(self.rng.gauss(0.0, self.sigma))
+
+    def throttled(self) -> bool:
+        with self._lock:
+            r = self.rng.random()
+        if self.burst_every > 0 and (time.monotonic() - self.t0) % self.burst_every < self.burst_len:
+            return r < self.burst_prob
+        return r < self.error_rate
+
+
+class SimServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, market: Market, faults: Faults):
+        super().__init__(addr, _Handler)
+        self.market = market
+        self.faults = faults
+        self.stats: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers + body are two writes; avoid the 40ms delayed-ACK stall
+
+    def log_message(self, *_args):
+        pass
+
+    def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        srv: SimServer = self.server  # type: ignore[assignment]
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip("/") or "/"
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        if path == "/_sim/stats":
+            with srv._stats_lock:
+                stats = dict(srv.stats)
+            return self._send(200, {"pools": len(srv.market.pools), "swaps": srv.market.swaps,
+                                    "block": srv.market.block, "requests": stats})
+        d = srv.faults.delay()
+        if d:
+            time.sleep(d)
+        route = route_name(path)
+        if srv.faults.throttled():
+            srv.count(f"{route}:429")
+            return self._send(429, {"error": "rate limit exceeded"}, {"Retry-After": "1"})
+        status, body = srv.market.route(path, params)
+        srv.count(f"{route}:{status}")
+        self._send(status, body)
+
+
+def _swap_loop(market: Market, rate: float, stop: threading.Event, tick: float = 0.1):
+    rng = random.Random(23)
+    last_block = time.monotonic()
+    while not stop.is_set():
+        pools = list(market.pools)
+        if pools and rate > 0:
+            # Poisson arrivals for this tick
+            n, acc, lam = 0, rng.expovariate(rate), tick
+            while acc < lam:
+                n += 1
+                acc += rng.expovariate(rate)
+            for _ in range(n):
+                market.trade(rng.choice(pools))
+        if time.monotonic() - last_block >= 1.0:
+            market.next_block()
+            last_block = time.monotonic()
+        stop.wait(tick)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local TonAPI / STON / DeDust / DexScreener simulator")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--pools", type=int, default=1000)
+    ap.add_argument("--dedust-share", type=float, default=0.5, help="fraction of pools that are DeDust")
+    ap.add_argument("--swap-rate", type=float, default=20.0, help="buys per second across all pools")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="median response latency")
+    ap.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma of the latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="base probability of a 429")
+    ap.add_argument("--burst-every", type=float, default=0.0, help="seconds between 429 bursts (0 = none)")
+    ap.add_argument("--burst-len", type=float, default=5.0, help="burst length in seconds")
+    ap.add_argument("--burst-prob", type=float, default=0.9, help="429 probability inside a burst")
+    ap.add_argument("--write-data", default="", help="write a bot data.json tracking all pools")
+    args = ap.parse_args()
+
+    market = Market(args.pools, args.dedust_share)
+    if args.write_data:
+        with open(args.write_data, "w", encoding="utf-8") as f:
+            json.dump(market.data_json(), f)
+        print(f"wrote {args.write_data} ({args.pools} pools)")
+    faults = Faults(args.latency_ms, args.latency_sigma, args.error_rate,
+                    args.burst_every, args.burst_len, args.burst_prob)
+    srv = SimServer((args.host, args.port), market, faults)
+    stop = threading.Event()
+    threading.Thread(target=_swap_loop, args=(market, args.swap_rate, stop), daemon=True).start()
+    print(f"upstream simulator on http://{args.host}:{srv.server_address[1]} "
+          f"pools={args.pools} swap_rate={args.swap_rate}/s latency={args.latency_ms}ms")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()